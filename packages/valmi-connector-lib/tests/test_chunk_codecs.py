@@ -0,0 +1,139 @@
+from decimal import Decimal
+import io
+import json
+import sys
+
+import pytest
+
+from valmi_connector_lib.common.chunk_codecs import (
+    CHUNK_HEADER_MAGIC,
+    ChunkCodecFactory,
+    JsonlChunkCodec,
+    MsgpackZstdChunkCodec,
+)
+
+RECORDS = [
+    {
+        "type": "RECORD",
+        "record": {
+            "stream": "users",
+            "data": {"id": i, "name": "user %d" % i, "score": i / 4, "tags": ["a", None], "active": i % 2 == 0},
+        },
+    }
+    for i in range(10)
+]
+
+
+def write_chunk(codec, records):
+    f = io.BytesIO()
+    codec.write_header(f)
+    codec.write(f, records)
+    f.seek(0)
+    return f
+
+
+def read_chunk(f):
+    codec = ChunkCodecFactory.detect_codec(f)
+    return codec, [json.loads(line) for line in codec.read_lines(f)]
+
+
+def test_jsonl_round_trip():
+    codec, records = read_chunk(write_chunk(JsonlChunkCodec(), RECORDS))
+    assert isinstance(codec, JsonlChunkCodec)
+    assert records == RECORDS
+
+
+def test_jsonl_chunks_are_written_without_a_header():
+    f = write_chunk(JsonlChunkCodec(), RECORDS)
+    assert f.getvalue() == "".join(json.dumps(record) + "\n" for record in RECORDS).encode("utf-8")
+
+
+def test_detect_codec_falls_back_to_jsonl_for_chunks_without_a_header():
+    # chunks written by older source wrappers
+    f = io.BytesIO("".join(json.dumps(record) + "\n" for record in RECORDS).encode("utf-8"))
+    codec = ChunkCodecFactory.detect_codec(f)
+    assert isinstance(codec, JsonlChunkCodec)
+    assert f.tell() == 0
+    assert [json.loads(line) for line in codec.read_lines(f)] == RECORDS
+
+
+def test_detect_codec_of_an_empty_chunk():
+    codec, records = read_chunk(io.BytesIO())
+    assert isinstance(codec, JsonlChunkCodec)
+    assert records == []
+
+
+def test_stream_writer_writes_the_same_chunk_as_write():
+    codec = JsonlChunkCodec()
+    f = io.BytesIO()
+    codec.write_header(f)
+    stream_writer = codec.stream_writer(f)
+    for record in RECORDS:
+        stream_writer.write(record)
+    stream_writer.close()
+    assert f.getvalue() == write_chunk(codec, RECORDS).getvalue()
+
+
+def test_msgpack_zstd_round_trip():
+    pytest.importorskip("msgpack")
+    pytest.importorskip("zstandard")
+    f = write_chunk(MsgpackZstdChunkCodec(), RECORDS)
+    assert f.getvalue().startswith(CHUNK_HEADER_MAGIC)
+
+    codec, records = read_chunk(f)
+    assert isinstance(codec, MsgpackZstdChunkCodec)
+    assert records == RECORDS
+
+
+def test_msgpack_zstd_without_its_dependencies_fails_fast(monkeypatch):
+    monkeypatch.setitem(sys.modules, "msgpack", None)
+    with pytest.raises(Exception, match="requires msgpack and zstandard"):
+        ChunkCodecFactory.get_codec_from_store_config({"local": {"chunk_format": "msgpack+zstd"}})
+
+
+def test_codec_from_store_config_defaults_to_jsonl():
+    assert isinstance(ChunkCodecFactory.get_codec_from_store_config({"local": {}}), JsonlChunkCodec)
+
+
+def test_unknown_chunk_format():
+    with pytest.raises(Exception, match="not supported"):
+        ChunkCodecFactory.get_codec("csv")
+
+
+def arrow_codec():
+    pytest.importorskip("pyarrow")
+    # the codec adds the event meta of the valmi protocol
+    pytest.importorskip("airbyte_cdk")
+    return ChunkCodecFactory.get_codec("arrow")
+
+
+def test_arrow_batches_of_differing_schemas_are_unified():
+    codec = arrow_codec()
+    import pyarrow
+
+    batches = [
+        pyarrow.record_batch({"id": pyarrow.array([1, 2]), "note": pyarrow.array([None, None])}),
+        pyarrow.record_batch({"id": pyarrow.array([3]), "note": pyarrow.array(["x"])}),
+    ]
+    f = io.BytesIO()
+    codec.write_header(f)
+    codec.write_batches(f, "users", batches)
+    f.seek(0)
+    codec, lines = read_chunk(f)
+    assert codec.name == "arrow"
+    records = [line["record"] for line in lines]
+    assert [(r["stream"], r["data"]) for r in records] == [
+        ("users", {"id": 1, "note": None}),
+        ("users", {"id": 2, "note": None}),
+        ("users", {"id": 3, "note": "x"}),
+    ]
+
+    tables = [
+        pyarrow.table({"amount": pyarrow.array([Decimal("1.25")], pyarrow.decimal128(10, 2))}),
+        pyarrow.table({"amount": pyarrow.array([Decimal("2.125")], pyarrow.decimal128(12, 3))}),
+    ]
+    try:
+        table = codec.concat_tables(tables)
+    except pyarrow.ArrowInvalid:
+        pytest.skip("pyarrow < 14 does not promote decimals")
+    assert table.column("amount").to_pylist() == [Decimal("1.250"), Decimal("2.125")]
@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+
+from valmi_connector_lib.common.chunk_manifest import (
+    CHUNK_MANIFEST_FILE,
+    ChunkManifestReader,
+    ChunkManifestWriter,
+    InotifyDirectoryWatcher,
+)
+
+
+def test_reader_is_not_available_without_a_writer(tmp_path):
+    assert not ChunkManifestReader(str(tmp_path)).available()
+
+
+def test_writer_creates_an_empty_manifest(tmp_path):
+    ChunkManifestWriter(str(tmp_path))
+    reader = ChunkManifestReader(str(tmp_path))
+    assert reader.available()
+    assert reader.new_chunk_files() == []
+
+
+def test_chunk_files_are_read_once_in_order(tmp_path):
+    writer = ChunkManifestWriter(str(tmp_path))
+    reader = ChunkManifestReader(str(tmp_path))
+    writer.append("1.vald")
+    writer.append("2.vald")
+    assert reader.new_chunk_files() == ["1.vald", "2.vald"]
+    assert reader.new_chunk_files() == []
+
+    writer.append("3.vald")
+    assert reader.new_chunk_files() == ["3.vald"]
+
+
+def test_partial_lines_are_not_consumed(tmp_path):
+    writer = ChunkManifestWriter(str(tmp_path))
+    reader = ChunkManifestReader(str(tmp_path))
+    writer.append("1.vald")
+    with open(tmp_path / CHUNK_MANIFEST_FILE, "a") as f:
+        f.write("2.va")
+    assert reader.new_chunk_files() == ["1.vald"]
+    assert reader.new_chunk_files() == []
+
+    with open(tmp_path / CHUNK_MANIFEST_FILE, "a") as f:
+        f.write("ld\n")
+    assert reader.new_chunk_files() == ["2.vald"]
+
+
+def test_wait_returns_when_a_chunk_is_appended(tmp_path):
+    writer = ChunkManifestWriter(str(tmp_path))
+    reader = ChunkManifestReader(str(tmp_path))
+    if not isinstance(reader.watcher, InotifyDirectoryWatcher):
+        pytest.skip("inotify is not available, polling waits for the whole timeout")
+
+    threading.Timer(0.1, writer.append, args=("1.vald",)).start()
+    start = time.monotonic()
+    reader.wait(10)
+    assert time.monotonic() - start < 5
+    assert reader.new_chunk_files() == ["1.vald"]
@@ -0,0 +1,58 @@
+import hashlib
+
+from valmi_connector_lib.common.identifier_hashing import IdentifierHasher, sha256_hex
+
+
+def normalize_email(value):
+    return value.strip().lower()
+
+
+def counting(fn, calls):
+    def wrapper(value):
+        calls.append(value)
+        return fn(value)
+    return wrapper
+
+
+def test_values_are_normalized_and_hashed():
+    hashes = IdentifierHasher().hash_column("email", [" A@x.com", None, "b@x.com"], normalize=normalize_email)
+    assert hashes == [hashlib.sha256(b"a@x.com").hexdigest(), None, sha256_hex("b@x.com")]
+
+
+def test_distinct_values_are_normalized_once():
+    hasher = IdentifierHasher()
+    calls = []
+    normalize = counting(normalize_email, calls)
+    first = hasher.hash_column("email", ["a@x.com", "b@x.com", "a@x.com"], normalize=normalize)
+    second = hasher.hash_column("email", ["b@x.com", "a@x.com"], normalize=normalize)
+    assert calls == ["a@x.com", "b@x.com"]
+    assert second == [first[1], first[0]]
+
+    # the cache is kept per column
+    hasher.hash_column("phone", ["a@x.com"], normalize=normalize)
+    assert calls == ["a@x.com", "b@x.com", "a@x.com"]
+
+
+def test_cache_is_cleared_past_its_size():
+    hasher = IdentifierHasher(cache_size=2)
+    calls = []
+    normalize = counting(normalize_email, calls)
+    hasher.hash_column("email", ["a", "b", "c"], normalize=normalize)
+    hasher.hash_column("email", ["a"], normalize=normalize)
+    assert calls == ["a", "b", "c", "a"]
+    assert hasher.caches["email"] == {"a": sha256_hex("a")}
+
+
+def test_rows_are_hashed_column_by_column():
+    rows = [[" A@x.com", "US", "1"], [None, " ca ", "2"]]
+    hashed = IdentifierHasher().hash_columns(
+        ["email", "country", "id"],
+        rows,
+        normalizers={"email": normalize_email, "country": normalize_email},
+        unhashed_columns=("country",),
+    )
+    assert hashed == [[sha256_hex("a@x.com"), "us", sha256_hex("1")], [None, "ca", sha256_hex("2")]]
+
+
+def test_no_rows():
+    assert IdentifierHasher().hash_columns(["email"], []) == []
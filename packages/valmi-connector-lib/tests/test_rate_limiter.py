@@ -0,0 +1,119 @@
+from email.utils import format_datetime
+from datetime import datetime, timezone
+
+import pytest
+
+from valmi_connector_lib.common import rate_limiter
+from valmi_connector_lib.common.rate_limiter import RateLimiter, TokenBucket
+
+NOW = 1700000000.0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return NOW + self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+
+def test_burst_is_served_right_away(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+    bucket.acquire()
+    assert clock.sleeps == [0.5]
+
+
+def test_tokens_are_refilled_up_to_the_burst(clock):
+    bucket = TokenBucket(rate=2, burst=2)
+    bucket.acquire(2)
+    clock.now += 10
+    assert bucket.reserve(2) == 0
+    assert bucket.reserve() == 0.5
+
+
+def test_concurrent_callers_wait_in_order(clock):
+    bucket = TokenBucket(rate=1, burst=1)
+    assert [bucket.reserve() for _ in range(4)] == [0, 1, 2, 3]
+
+
+def test_more_tokens_than_the_burst_waits_longer(clock):
+    bucket = TokenBucket(rate=2, burst=1)
+    assert bucket.reserve(5) == 2
+
+
+def test_pause_holds_off_the_refill(clock):
+    bucket = TokenBucket(rate=1, burst=5)
+    bucket.pause(10)
+    assert bucket.reserve() == 11
+
+    clock.now += 20
+    assert bucket.reserve() == 0
+
+
+def test_endpoints_are_limited_on_their_own(clock):
+    limiter = RateLimiter(rate=1, burst=1, endpoint_limits={"search": (1, 1)})
+    limiter.acquire()
+    limiter.acquire("search")
+    assert clock.sleeps == []
+
+    limiter.acquire("search")
+    assert clock.sleeps == [1]
+    # unknown endpoints share the default bucket, refilled while the search waited
+    limiter.acquire("unknown")
+    limiter.acquire()
+    assert clock.sleeps == [1, 1]
+
+
+def test_limiters_do_not_share_endpoint_buckets(clock):
+    first = RateLimiter(rate=1)
+    second = RateLimiter(rate=1, endpoint_limits={"search": (1, 1)})
+    assert first.buckets == {}
+    assert first.bucket("search") is first.default_bucket
+    assert second.bucket("search") is not second.default_bucket
+
+
+def test_retry_after_seconds_pauses_the_limiter(clock):
+    limiter = RateLimiter(rate=1, burst=1, endpoint_limits={"search": (1, 1)})
+    assert limiter.update_from_headers({"Retry-After": "30"}, "search") == 30
+    assert limiter.bucket("search").reserve() == 31
+    assert limiter.bucket().reserve() == 0
+
+
+def test_retry_after_http_date_pauses_the_limiter(clock):
+    retry_at = datetime.fromtimestamp(NOW + 60, tz=timezone.utc)
+    limiter = RateLimiter(rate=1)
+    assert limiter.update_from_headers({"Retry-After": format_datetime(retry_at, usegmt=True)}) == 60
+
+
+def test_exhausted_limit_pauses_until_the_reset(clock):
+    limiter = RateLimiter(rate=1)
+    assert limiter.update_from_headers({"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "15"}) == 15
+    assert limiter.update_from_headers({"RateLimit-Remaining": "0", "RateLimit-Reset": str(NOW + 40)}) == 40
+
+
+def test_headers_that_leave_the_limiter_as_is(clock):
+    limiter = RateLimiter(rate=1)
+    assert limiter.update_from_headers(None) == 0
+    assert limiter.update_from_headers({}) == 0
+    assert limiter.update_from_headers({"X-RateLimit-Remaining": "10", "X-RateLimit-Reset": "15"}) == 0
+    assert limiter.update_from_headers({"Retry-After": "not a date"}) == 0
+    assert limiter.bucket().reserve() == 0
@@ -0,0 +1,77 @@
+'''
+Copyright (c) 2023 valmi.io <https://github.com/valmi-io>
+
+Created Date: Wednesday, October 18th 2023, 9:47:22 pm
+Author: Rajashekar Varkala @ valmi.io
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import json
+import os
+from os.path import join
+
+from valmi_connector_lib.common.chunk_codecs import ArrowChunkCodec
+
+# Key of the STATE message data with which a source connector hands an arrow chunk over to the source wrapper.
+ARROW_CHUNK_STATE_KEY = "valmi_arrow_chunk"
+
+
+def arrow_chunks_supported(store_config_str: str) -> bool:
+    '''
+    The destination wrappers need pyarrow to read arrow chunks, which is not a dependency of this library.
+    Sources only write them when the store config declares, with "arrow_chunks", that the readers ship it.
+    '''
+    store_config = json.loads(store_config_str)
+    return store_config["provider"] == "local" and store_config["local"].get("arrow_chunks", False) is True
+
+
+class ArrowChunkWriter:
+    '''
+    Used by source connectors to write record batches straight into the intermediate store.
+    Chunks are written to a temporary file in the run directory, the source wrapper renames them into
+    the data directory when the STATE message returned by state_data() reaches it, so chunk numbering,
+    metrics and checkpoints stay with the wrapper.
+    '''
+
+    def __init__(self, store_config_str: str, run_id: str, stream: str):
+        store_config = json.loads(store_config_str)
+        if store_config["provider"] != "local":
+            raise Exception("Arrow chunks are only supported with the local intermediate store!")
+        self.path_name = join(store_config["local"]["directory"], run_id)
+        os.makedirs(self.path_name, exist_ok=True)
+        self.stream = stream
+        self.codec = ArrowChunkCodec()
+
+    def concat_tables(self, tables):
+        return self.codec.concat_tables(tables)
+
+    def write_chunk(self, chunk_id, batches) -> dict:
+        file_name = f"chunk.{chunk_id}.arrow.tmp"
+        num_records = 0
+        with open(join(self.path_name, file_name), "wb") as f:
+            self.codec.write_header(f)
+            self.codec.write_batches(f, self.stream, batches)
+            num_records = sum(batch.num_rows for batch in batches)
+            f.flush()
+            os.fsync(f.fileno())
+        return self.state_data(chunk_id, file_name, num_records)
+
+    def state_data(self, chunk_id, file_name, num_records) -> dict:
+        return {"chunk_id": chunk_id, ARROW_CHUNK_STATE_KEY: {"file": file_name, "records": num_records}}
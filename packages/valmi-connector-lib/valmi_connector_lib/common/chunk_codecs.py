@@ -0,0 +1,246 @@
+'''
+Copyright (c) 2023 valmi.io <https://github.com/valmi-io>
+
+Created Date: Wednesday, October 18th 2023, 10:12:41 am
+Author: Rajashekar Varkala @ valmi.io
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from abc import abstractmethod
+from datetime import date, datetime, time
+from decimal import Decimal
+import json
+
+# Binary chunk files start with this magic, followed by one byte holding the length of the codec name
+# and the codec name itself. JSONL chunks are written without a header, so that destination wrappers
+# built with older versions of this library can still read them.
+CHUNK_HEADER_MAGIC = b"\x00VALMI\x00C"
+DEFAULT_CHUNK_FORMAT = "jsonl"
+
+
+class ChunkCodec:
+    name = None
+    # the chunk payload is already the json lines the destination connector reads from its stdin
+    passthrough = False
+
+    def write_header(self, f):
+        name = self.name.encode("ascii")
+        f.write(CHUNK_HEADER_MAGIC)
+        f.write(bytes([len(name)]))
+        f.write(name)
+
+    def write(self, f, records):
+        stream_writer = self.stream_writer(f)
+        for record in records:
+            stream_writer.write(record)
+        stream_writer.close()
+
+    @abstractmethod
+    def stream_writer(self, f):
+        '''
+        Returns a writer that encodes records into the binary file object one at a time.
+        close() must be called on it before the file is closed.
+        '''
+        pass
+
+    @abstractmethod
+    def read_lines(self, f):
+        '''
+        Lazily decodes the chunk positioned after the header and yields every record
+        as a json line, which is what the destination connector expects on its stdin.
+        '''
+        pass
+
+
+class JsonlChunkStreamWriter:
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, record):
+        self.f.write(json.dumps(record).encode("utf-8"))
+        self.f.write(b"\n")
+
+    def close(self):
+        pass
+
+
+class JsonlChunkCodec(ChunkCodec):
+    name = "jsonl"
+    passthrough = True
+
+    def write_header(self, f):
+        pass
+
+    def stream_writer(self, f):
+        return JsonlChunkStreamWriter(f)
+
+    def read_lines(self, f):
+        for line in f:
+            yield line.decode("utf-8")
+
+
+class MsgpackZstdChunkStreamWriter:
+    def __init__(self, f, packer, compressor):
+        self.packer = packer
+        self.writer = compressor.stream_writer(f, closefd=False)
+
+    def write(self, record):
+        self.writer.write(self.packer.pack(record))
+
+    def close(self):
+        # ends the zstd frame
+        self.writer.close()
+
+
+class MsgpackZstdChunkCodec(ChunkCodec):
+    name = "msgpack+zstd"
+
+    def __init__(self, compression_level=3):
+        # optional dependencies, only required when the store is configured with this chunk format.
+        # the wrappers create the codec when they start, so a missing dependency fails the sync right away
+        try:
+            import msgpack
+            import zstandard
+        except ImportError:
+            raise Exception("Chunk format %s requires msgpack and zstandard, "
+                            "it must only be configured when the connectors ship them!" % self.name)
+        self.msgpack = msgpack
+        self.zstandard = zstandard
+        self.compression_level = compression_level
+
+    def stream_writer(self, f):
+        return MsgpackZstdChunkStreamWriter(f,
+                                            self.msgpack.Packer(),
+                                            self.zstandard.ZstdCompressor(level=self.compression_level))
+
+    def read_lines(self, f):
+        reader = self.zstandard.ZstdDecompressor().stream_reader(f, closefd=False)
+        for record in self.msgpack.Unpacker(reader, raw=False):
+            yield json.dumps(record) + "\n"
+
+
+def json_default(val):
+    # values of arrow columns that json does not know about
+    if isinstance(val, (datetime, date, time)):
+        return val.isoformat()
+    if isinstance(val, Decimal):
+        return float(val)
+    if isinstance(val, bytes):
+        return val.decode("utf-8", "replace")
+    return str(val)
+
+
+class ArrowChunkCodec(ChunkCodec):
+    '''
+    Columnar chunks written by source connectors straight from the record batches of the warehouse.
+    The chunk is an arrow IPC stream, the stream name of the records is kept in the schema metadata.
+    '''
+    name = "arrow"
+    stream_metadata_key = b"valmi_stream"
+
+    def __init__(self):
+        # optional dependency, only required when the store config enables arrow_chunks
+        try:
+            import pyarrow
+            import pyarrow.ipc
+        except ImportError:
+            raise Exception("Arrow chunks require pyarrow, "
+                            "arrow_chunks must only be enabled when the connectors ship it!")
+        self.pyarrow = pyarrow
+        from valmi_connector_lib.valmi_protocol import add_event_meta
+        self.add_event_meta = add_event_meta
+
+    def unify_schema(self, schemas):
+        # warehouses return batches of differing schemas, like a null typed column in an all null batch
+        # or decimals of differing precision
+        try:
+            return self.pyarrow.unify_schemas(schemas, promote_options="permissive")
+        except TypeError:
+            # pyarrow < 14 only unifies null typed fields
+            return self.pyarrow.unify_schemas(schemas)
+
+    def concat_tables(self, tables):
+        schema = self.unify_schema([table.schema for table in tables])
+        return self.pyarrow.concat_tables([table.cast(schema) for table in tables])
+
+    def write_batches(self, f, stream, batches):
+        if not batches:
+            return
+        schema = self.unify_schema([batch.schema for batch in batches])
+        schema = schema.with_metadata({self.stream_metadata_key: stream.encode("utf-8")})
+        with self.pyarrow.ipc.new_stream(f, schema) as writer:
+            for batch in batches:
+                writer.write_table(self.pyarrow.Table.from_batches([batch]).cast(schema))
+
+    def stream_writer(self, f):
+        raise Exception("Arrow chunks are written by the source connectors, not by the wrapper!")
+
+    def read_lines(self, f):
+        reader = self.pyarrow.ipc.open_stream(f)
+        stream = reader.schema.metadata[self.stream_metadata_key].decode("utf-8")
+        emitted_at = int(datetime.now().timestamp()) * 1000
+        for batch in reader:
+            column_names = batch.schema.names
+            for row in batch.to_pylist():
+                data = {}
+                for name in column_names:
+                    if name.lower().startswith("_valmi"):
+                        self.add_event_meta(data, name.lower(), row[name])
+                    else:
+                        data[name] = row[name]
+                record = {
+                    "type": "RECORD",
+                    "record": {
+                        "stream": stream,
+                        "data": data,
+                        "emitted_at": emitted_at,
+                        "metric_type": "success",
+                        "rejected": False,
+                    },
+                }
+                yield json.dumps(record, default=json_default) + "\n"
+
+
+class ChunkCodecFactory(object):
+    codecs = {
+        JsonlChunkCodec.name: JsonlChunkCodec,
+        MsgpackZstdChunkCodec.name: MsgpackZstdChunkCodec,
+        ArrowChunkCodec.name: ArrowChunkCodec,
+    }
+
+    @staticmethod
+    def get_codec(name: str) -> ChunkCodec:
+        if name not in ChunkCodecFactory.codecs:
+            raise Exception("Chunk format %s not supported!" % name)
+        return ChunkCodecFactory.codecs[name]()
+
+    @staticmethod
+    def get_codec_from_store_config(store_config: dict) -> ChunkCodec:
+        return ChunkCodecFactory.get_codec(store_config["local"].get("chunk_format", DEFAULT_CHUNK_FORMAT))
+
+    @staticmethod
+    def detect_codec(f) -> ChunkCodec:
+        # leaves the binary file object positioned at the first byte of the chunk payload
+        magic = f.read(len(CHUNK_HEADER_MAGIC))
+        if magic != CHUNK_HEADER_MAGIC:
+            f.seek(0)
+            return ChunkCodecFactory.get_codec(DEFAULT_CHUNK_FORMAT)
+        name_len = f.read(1)[0]
+        return ChunkCodecFactory.get_codec(f.read(name_len).decode("ascii"))
@@ -0,0 +1,143 @@
+'''
+Copyright (c) 2023 valmi.io <https://github.com/valmi-io>
+
+Created Date: Wednesday, October 18th 2023, 4:05:17 pm
+Author: Rajashekar Varkala @ valmi.io
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import ctypes
+import ctypes.util
+import os
+from os.path import join
+import select
+import struct
+import time
+
+# The source wrapper appends the name of every completely written chunk to this file.
+# The destination wrapper tails it instead of listing the data directory. It lives in the run directory,
+# next to the data directory, because older destination wrappers expect only chunk files in there.
+CHUNK_MANIFEST_FILE = "chunks.manifest"
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+# struct inotify_event {int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[];}
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+
+class ChunkManifestWriter:
+    def __init__(self, path_name):
+        self.file_path = join(path_name, CHUNK_MANIFEST_FILE)
+        # an empty manifest tells the reader that chunks are announced here
+        with open(self.file_path, "a"):
+            pass
+
+    def append(self, chunk_file_name):
+        with open(self.file_path, "a") as f:
+            f.write(chunk_file_name)
+            f.write("\n")
+
+
+class ChunkManifestReader:
+    def __init__(self, path_name):
+        self.file_path = join(path_name, CHUNK_MANIFEST_FILE)
+        self.offset = 0
+        self.watcher = DirectoryWatcherFactory.get_watcher(path_name, CHUNK_MANIFEST_FILE)
+
+    def available(self):
+        return os.path.exists(self.file_path)
+
+    def new_chunk_files(self):
+        with open(self.file_path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+
+        # only consume complete lines, the writer may be in the middle of appending one
+        end = data.rfind(b"\n")
+        if end < 0:
+            return []
+        self.offset += end + 1
+        return [fn for fn in data[:end].decode("utf-8").split("\n") if fn]
+
+    def wait(self, timeout):
+        self.watcher.wait(timeout)
+
+
+class DirectoryWatcher:
+    def __init__(self, path_name, file_name):
+        self.path_name = path_name
+        self.file_name = file_name
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+
+
+class InotifyDirectoryWatcher(DirectoryWatcher):
+    def __init__(self, *args, **kwargs):
+        super(InotifyDirectoryWatcher, self).__init__(*args, **kwargs)
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # the directory is watched, because the file may not have been created yet
+        wd = libc.inotify_add_watch(self.fd, self.path_name.encode("utf-8"),
+                                    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if readable and self.file_name in self.read_event_names():
+                return
+
+    def read_event_names(self):
+        names = set()
+        try:
+            while True:
+                buf = os.read(self.fd, 4096)
+                if not buf:
+                    break
+                offset = 0
+                while offset + INOTIFY_EVENT_HEADER.size <= len(buf):
+                    _, _, _, name_len = INOTIFY_EVENT_HEADER.unpack_from(buf, offset)
+                    offset += INOTIFY_EVENT_HEADER.size
+                    names.add(buf[offset:offset + name_len].rstrip(b"\0").decode("utf-8", "replace"))
+                    offset += name_len
+        except BlockingIOError:
+            pass
+        return names
+
+
+class DirectoryWatcherFactory(object):
+    @staticmethod
+    def get_watcher(path_name: str, file_name: str) -> DirectoryWatcher:
+        try:
+            return InotifyDirectoryWatcher(path_name, file_name)
+        except Exception:
+            # not on linux or inotify limits exhausted, fall back to polling
+            return DirectoryWatcher(path_name, file_name)
@@ -0,0 +1,85 @@
+'''
+Copyright (c) 2023 valmi.io <https://github.com/valmi-io>
+
+Created Date: Thursday, October 19th 2023, 7:21:05 pm
+Author: Rajashekar Varkala @ valmi.io
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import hashlib
+
+# hashes kept per identifier column, across the chunks of a sync
+HASH_CACHE_SIZE = 1000000
+
+
+def sha256_hex(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class IdentifierHasher:
+    '''
+    Normalizes and hashes the identifiers of audience uploads a column at a time.
+
+    Every distinct value of a column is normalized and hashed once, the hashes of a column are cached
+    across batches, because audience syncs keep sending the same identifiers.
+    '''
+
+    def __init__(self, cache_size=HASH_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.caches = {}
+
+    def hash_column(self, column, values, normalize=None, hash_fn=sha256_hex):
+        '''
+        Returns the hashes of the values of an identifier column, None for None values.
+        The cache is keyed on the column, so the normalization and hash_fn must not change for a column.
+        '''
+        cache = self.caches.get(column)
+        if cache is None:
+            cache = self.caches[column] = {}
+        elif len(cache) > self.cache_size:
+            cache.clear()
+
+        hashes = []
+        for value in values:
+            if value is None:
+                hashes.append(None)
+                continue
+            hashed = cache.get(value)
+            if hashed is None:
+                hashed = hash_fn(normalize(value) if normalize else value)
+                cache[value] = hashed
+            hashes.append(hashed)
+        return hashes
+
+    def hash_columns(self, columns, rows, normalizers=None, hash_fn=sha256_hex, unhashed_columns=()):
+        '''
+        Hashes the rows, given as lists of values in the order of the columns, column by column.
+        Values of unhashed_columns are only normalized.
+        '''
+        normalizers = normalizers or {}
+        hashed_columns = []
+        for idx, column in enumerate(columns):
+            normalize = normalizers.get(column)
+            values = [row[idx] for row in rows]
+            if column in unhashed_columns:
+                hashed_columns.append([normalize(v) if normalize and v is not None else v for v in values])
+            else:
+                hashed_columns.append(self.hash_column(column, values, normalize=normalize, hash_fn=hash_fn))
+        return [list(row) for row in zip(*hashed_columns)] if rows else []
@@ -30,6 +30,10 @@ import time
 import os
 from .constants import MAGIC_DELIM
 
+# sidecar index of the log segments of a connector, one json entry per flush
+LOG_INDEX_FILE = "segments.index"
+DEFAULT_GROUP_COMMIT_INTERVAL = 1  # seconds
+
 
 class LogWriter:
 
@@ -44,7 +48,20 @@ class LogWriter:
         self.run_id = run_id
         self.connector = connector
 
+        # none | flush | group | roll_over
+        self.fsync_policy = self.store_config['local'].get('log_fsync', 'none')
+        # with the group policy, the flushes within the interval share one fsync
+        self.group_commit_interval = self.store_config['local'].get('log_group_commit_interval',
+                                                                    DEFAULT_GROUP_COMMIT_INTERVAL)
+        self.last_fsync = time.monotonic()
+        self.segment_file = None
+        self.segment_file_name = None
+        self.segment_lines = 0
+        self.segment_bytes = 0
+        self.index_file = None
+
     def reset(self):
+        self.close_segment()
         self.lines.clear()
         self.flush_policy.reset()
 
@@ -65,16 +82,69 @@ class LogWriter:
     def flush(self):
         if len(self.lines) > 0:
             # TODO: do cloud push for aws, s3 when we do k8s
-            file_path = join(self.store_config['local']['directory'],
-                             self.run_id, "logs", self.connector, self.flush_policy.get_current_file_name())
-            dir_name = os.path.dirname(file_path)
-            os.makedirs(dir_name, exist_ok=True)
-            with open(file_path, "w") as f:
-                for line in self.lines:
-                    f.write(f"{line[0]}")
-                    f.write(MAGIC_DELIM)
-                    f.write(line[1])
-                    f.write("\n")
+            if self.segment_file is None:
+                self.open_segment()
+
+            # only the lines buffered since the last flush are appended
+            data = "".join(f"{line[0]}{MAGIC_DELIM}{line[1]}\n" for line in self.lines).encode("utf-8")
+            self.segment_file.write(data)
+            self.segment_file.flush()
+            if self.fsync_policy == 'flush' or (self.fsync_policy == 'group'
+                                                and time.monotonic() - self.last_fsync >= self.group_commit_interval):
+                self.fsync_segment()
+
+            self.segment_lines += len(self.lines)
+            self.segment_bytes += len(data)
+            self.write_index_entry(last_line_time=self.lines[-1][0])
+            self.lines.clear()
+            # the next lines are buffered until the next flush window ends
+            self.flush_policy.flushed()
+
+    def close(self):
+        # the last segment is never rolled over, so the buffered lines, the segment and the index are closed at exit
+        self.flush()
+        self.close_segment()
+        if self.index_file is not None:
+            if self.fsync_policy in ['flush', 'group', 'roll_over']:
+                os.fsync(self.index_file.fileno())
+            self.index_file.close()
+            self.index_file = None
+
+    def fsync_segment(self):
+        os.fsync(self.segment_file.fileno())
+        self.last_fsync = time.monotonic()
+
+    def get_log_dir(self):
+        return join(self.store_config['local']['directory'], self.run_id, "logs", self.connector)
+
+    def open_segment(self):
+        dir_name = self.get_log_dir()
+        os.makedirs(dir_name, exist_ok=True)
+        self.segment_file_name = self.flush_policy.get_current_file_name()
+        self.segment_file = open(join(dir_name, self.segment_file_name), "ab")
+        self.segment_lines = 0
+        self.segment_bytes = 0
+        if self.index_file is None:
+            self.index_file = open(join(dir_name, LOG_INDEX_FILE), "a")
+
+    def close_segment(self):
+        if self.segment_file is not None:
+            if self.fsync_policy in ['flush', 'group', 'roll_over']:
+                self.fsync_segment()
+            self.segment_file.close()
+            self.segment_file = None
+
+    def write_index_entry(self, last_line_time):
+        # append-only sidecar index, the last entry of a segment describes it completely
+        self.index_file.write(json.dumps({
+            "segment": self.segment_file_name,
+            "first": int(self.segment_file_name[:-5]),
+            "last": last_line_time,
+            "lines": self.segment_lines,
+            "bytes": self.segment_bytes,
+        }))
+        self.index_file.write("\n")
+        self.index_file.flush()
 
     def data_chunk_flush_callback(self):
         self.flush_policy.set_data_chunk_flushed()
@@ -97,6 +167,10 @@ class FlushPolicy:
     def roll_over_file_required(self):
         pass
 
+    @abstractmethod
+    def flushed(self):
+        pass
+
     @abstractmethod
     def reset(self):
         pass
@@ -112,9 +186,10 @@ class TimeAndChunkEndFlushPolicy(FlushPolicy):
         self.reset()
 
     def flush_required(self):
-        if (self.first_line_time is not None
+        flush_interval = self.store_config['local']['log_flush_interval'] * 1000000
+        if (self.window_start_time is not None
                 and self.timestamp_changed
-                and self.last_line_time - self.first_line_time > self.store_config['local']['log_flush_interval'] * 1000000) \
+                and self.last_line_time - self.window_start_time > flush_interval) \
                 or self.data_chunk_flushed:
             return True
         return False
@@ -129,6 +204,8 @@ class TimeAndChunkEndFlushPolicy(FlushPolicy):
         current_time = int(time.time() * 1000000)  # microseconds
         if self.first_line_time is None:
             self.first_line_time = current_time
+        if self.window_start_time is None:
+            self.window_start_time = current_time
 
         if self.last_line_time is not None and current_time != self.last_line_time:
             self.timestamp_changed = True
@@ -141,8 +218,14 @@ class TimeAndChunkEndFlushPolicy(FlushPolicy):
     def set_data_chunk_flushed(self):
         self.data_chunk_flushed = True
 
+    def flushed(self):
+        # starts the next flush window, the segment goes on
+        self.window_start_time = None
+        self.data_chunk_flushed = False
+
     def reset(self):
         self.first_line_time = None
+        self.window_start_time = None
         self.last_line_time = None
         self.timestamp_changed = False
         self.data_chunk_flushed = False
@@ -173,6 +256,11 @@ class SingletonLogWriter(LogWriter):
             return cls._instance
         return None
 
+    @classmethod
+    def close_instance(cls):
+        if hasattr(cls, "_instance"):
+            cls._instance.close()
+
 
 def main():
     store_config_str = "{\"provider\": \"local\", \"local\": {\"directory\": \"/tmp/shared_dir/test_logs\", \"max_lines_per_file_hint\" : 100, \"log_flush_interval\": 5}}"
@@ -1,3 +1,11 @@
+from collections import OrderedDict
+import logging
+import threading
+
+METRICS_FLUSH_INTERVAL = 5  # seconds
+MAX_PENDING_METRIC_CHUNKS = 50
+
+
 def get_metric_type(sync_op: str):
     """
     Returns the metric type for the given sync operation.
@@ -8,3 +16,83 @@ def get_metric_type(sync_op: str):
         return f"{sync_op}"
     else:
         return f"{sync_op}d"
+
+
+class MetricsShipper(threading.Thread):
+    '''
+    Coalesces the metrics posted by a connector wrapper and ships them to the engine in bulk.
+
+    Metrics of a chunk are cumulative, so only the latest value of every metric type of a chunk is kept.
+    Pending metrics are shipped in the background on a time/size policy, and synchronously
+    (with retries) at commit points, which are the chunk ends and the end of the sync.
+    '''
+
+    def __init__(self, engine_url, session_with_retries, session_without_retries, http_timeout) -> None:
+        threading.Thread.__init__(self, daemon=True)
+        self.name = "MetricsShipperThread"
+        self.engine_url = engine_url
+        self.session_with_retries = session_with_retries
+        self.session_without_retries = session_without_retries
+        self.http_timeout = http_timeout
+
+        self.pending = OrderedDict()
+        self.pending_lock = threading.Lock()
+        # only one request in flight, so that an older snapshot of a chunk never lands after a newer one
+        self.send_lock = threading.Lock()
+        self.wakeup_event = threading.Event()
+
+    def add(self, payload, commit=False):
+        with self.pending_lock:
+            key = (payload["connector_id"], payload["chunk_id"])
+            if key in self.pending:
+                self.pending[key]["metrics"].update(payload["metrics"])
+                self.pending[key]["commit"] = self.pending[key]["commit"] or payload["commit"]
+            else:
+                self.pending[key] = {**payload, "metrics": dict(payload["metrics"])}
+            num_pending = len(self.pending)
+
+        if commit:
+            self.flush(commit=True)
+        elif num_pending >= MAX_PENDING_METRIC_CHUNKS:
+            self.wakeup_event.set()
+
+    def flush(self, commit=False):
+        with self.send_lock:
+            with self.pending_lock:
+                batch = list(self.pending.values())
+                self.pending.clear()
+            if not batch:
+                return
+
+            try:
+                self.send(batch, self.session_with_retries if commit else self.session_without_retries)
+            except Exception as e:
+                self.requeue(batch)
+                if commit:
+                    raise
+                logging.warning("Failed to ship metrics, retrying with the next flush: %s", e)
+
+    def requeue(self, batch):
+        # metrics added while the batch was in flight are newer, so they win over the batch
+        with self.pending_lock:
+            newer = self.pending
+            self.pending = OrderedDict()
+            for payload in batch:
+                self.pending[(payload["connector_id"], payload["chunk_id"])] = payload
+            for key, payload in newer.items():
+                if key in self.pending:
+                    older = self.pending[key]
+                    older["metrics"].update(payload["metrics"])
+                    older["commit"] = older["commit"] or payload["commit"]
+                else:
+                    self.pending[key] = payload
+
+    def send(self, batch, session):
+        r = session.post(f"{self.engine_url}/metrics/bulk", timeout=self.http_timeout, json={"metrics": batch})
+        r.raise_for_status()
+
+    def run(self) -> None:
+        while True:
+            self.wakeup_event.wait(METRICS_FLUSH_INTERVAL)
+            self.wakeup_event.clear()
+            self.flush(commit=False)
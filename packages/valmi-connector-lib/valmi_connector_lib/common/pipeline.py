@@ -0,0 +1,135 @@
+'''
+Copyright (c) 2023 valmi.io <https://github.com/valmi-io>
+
+Created Date: Thursday, October 19th 2023, 11:03:48 am
+Author: Rajashekar Varkala @ valmi.io
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import json
+import queue
+import re
+import threading
+
+try:
+    # optional, a faster decoder for the connector's stdout when it is installed in the image
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# lines or jobs buffered between two stages before the producing stage blocks
+PIPELINE_QUEUE_SIZE = 1000
+
+# airbyte messages are serialized with the type as their first key
+TYPE_PREFIX_PATTERN = re.compile(r'^\s*\{\s*"type"\s*:\s*"([A-Z_]+)"')
+TYPE_PREFIX_PATTERN_BYTES = re.compile(rb'^\s*\{\s*"type"\s*:\s*"([A-Z_]+)"')
+
+
+def sniff_type(line):
+    '''
+    Returns the type of a serialized airbyte message without decoding it,
+    or None when the line is not in the usual shape and has to be decoded to find out.
+    '''
+    if isinstance(line, bytes):
+        match = TYPE_PREFIX_PATTERN_BYTES.match(line)
+        return match.group(1).decode("ascii") if match else None
+    match = TYPE_PREFIX_PATTERN.match(line)
+    return match.group(1) if match else None
+
+
+def dispatch_line(handlers, line):
+    '''
+    Hands the line to the handler of its type. Handlers decode the line only if they need the payload.
+    '''
+    record_type = sniff_type(line)
+    if record_type is None:
+        json_record = json_loads(line)
+        return handlers.get(json_record["type"], handlers["default"]).handle(json_record)
+    return handlers.get(record_type, handlers["default"]).handle_raw(line)
+
+
+def decode_line(line) -> str:
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    return line.rstrip("\n")
+
+
+class PipeReaderThread(threading.Thread):
+    '''
+    Frames the lines of a binary pipe on its own thread, so that the process writing into the pipe
+    is not stalled while the consumer is busy. Iterating over the thread yields the raw lines.
+    '''
+
+    def __init__(self, pipe, queue_size=PIPELINE_QUEUE_SIZE) -> None:
+        threading.Thread.__init__(self, daemon=True)
+        self.name = "PipeReaderThread"
+        self.pipe = pipe
+        self.lines = queue.Queue(maxsize=queue_size)
+
+    def run(self) -> None:
+        try:
+            for line in self.pipe:
+                self.lines.put(line)
+        finally:
+            self.lines.put(None)
+
+    def __iter__(self):
+        while True:
+            line = self.lines.get()
+            if line is None:
+                return
+            yield line
+
+
+class PipelineStage(threading.Thread):
+    '''
+    Runs the submitted jobs in order on its own thread. The bounded queue applies backpressure to the submitter.
+    The first error stops the stage and is raised to the submitter on the next submit() or drain().
+    '''
+
+    def __init__(self, name, queue_size=PIPELINE_QUEUE_SIZE) -> None:
+        threading.Thread.__init__(self, daemon=True)
+        self.name = name
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.error = None
+
+    def submit(self, fn, *args, **kwargs):
+        self.raise_error()
+        self.jobs.put((fn, args, kwargs))
+
+    def drain(self):
+        self.jobs.join()
+        self.raise_error()
+
+    def raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def run(self) -> None:
+        while True:
+            fn, args, kwargs = self.jobs.get()
+            try:
+                if self.error is None:
+                    fn(*args, **kwargs)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.jobs.task_done()
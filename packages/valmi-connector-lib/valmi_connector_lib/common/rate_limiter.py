@@ -0,0 +1,146 @@
+'''
+Copyright (c) 2023 valmi.io <https://github.com/valmi-io>
+
+Created Date: Thursday, October 19th 2023, 4:37:12 pm
+Author: Rajashekar Varkala @ valmi.io
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from email.utils import parsedate_to_datetime
+import threading
+import time
+
+# Provider limits reset at an epoch timestamp or after a number of seconds, anything larger than this is a timestamp
+MAX_RESET_SECONDS = 10 * 365 * 24 * 3600
+
+RETRY_AFTER_HEADER = "retry-after"
+REMAINING_HEADERS = ["x-ratelimit-remaining", "ratelimit-remaining", "x-rate-limit-remaining"]
+RESET_HEADERS = ["x-ratelimit-reset", "ratelimit-reset", "x-rate-limit-reset"]
+
+
+class TokenBucket:
+    '''
+    Allows rate requests per second with bursts of up to burst requests.
+
+    A caller takes its tokens right away and sleeps until they are refilled, so concurrent callers
+    are served in the order they asked, and a request for more tokens than the burst just waits longer.
+    '''
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        # last is in the future while the bucket is paused
+        if now > self.last:
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+    def reserve(self, tokens=1) -> float:
+        # returns the seconds to wait before the tokens can be used
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+            self.tokens -= tokens
+            ready_at = self.last + max(0, -self.tokens) / self.rate
+            return max(0, ready_at - now)
+
+    def acquire(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        # the provider asked to hold off, nothing is refilled until the pause is over
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+            self.tokens = min(self.tokens, 0)
+            self.last = max(self.last, now + seconds)
+
+
+class RateLimiter:
+    '''
+    Rate limits the requests of a destination connector. A connector declares the limits of the
+    provider, with separate buckets for the endpoints that are limited on their own, and feeds the
+    response headers back so that Retry-After and rate limit headers pause the limiter.
+    '''
+
+    def __init__(self, rate: float, burst: int = 1, endpoint_limits: dict = None):
+        self.default_bucket = TokenBucket(rate, burst)
+        self.buckets = {endpoint: TokenBucket(*limit) for endpoint, limit in (endpoint_limits or {}).items()}
+
+    def bucket(self, endpoint=None) -> TokenBucket:
+        return self.buckets.get(endpoint, self.default_bucket)
+
+    def acquire(self, endpoint=None, tokens=1):
+        self.bucket(endpoint).acquire(tokens)
+
+    def update_from_headers(self, headers, endpoint=None):
+        '''
+        Returns the seconds the limiter is paused for, 0 when the headers leave the limiter as is.
+        '''
+        if not headers:
+            return 0
+        headers = {k.lower(): v for k, v in headers.items()}
+        seconds = parse_retry_after(headers.get(RETRY_AFTER_HEADER))
+        if seconds is None:
+            remaining = first_header(headers, REMAINING_HEADERS)
+            reset = first_header(headers, RESET_HEADERS)
+            if remaining is not None and reset is not None and int(float(remaining)) <= 0:
+                seconds = parse_reset(reset)
+        if not seconds or seconds <= 0:
+            return 0
+        self.bucket(endpoint).pause(seconds)
+        return seconds
+
+
+def first_header(headers, names):
+    for name in names:
+        if name in headers:
+            return headers[name]
+    return None
+
+
+def parse_retry_after(value):
+    # seconds or an http date
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_reset(value):
+    try:
+        reset = float(value)
+    except ValueError:
+        return None
+    if reset > MAX_RESET_SECONDS:
+        return reset - time.time()
+    return reset
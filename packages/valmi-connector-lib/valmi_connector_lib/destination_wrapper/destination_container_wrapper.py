@@ -23,14 +23,18 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import atexit
+import errno
 import json
 import os
+import shutil
 import sys
 import subprocess
 import io
 from typing import Any, Dict
 
 from valmi_connector_lib.common.logs import SingletonLogWriter, TimeAndChunkEndFlushPolicy
+from valmi_connector_lib.common.pipeline import dispatch_line
 from valmi_connector_lib.common.samples import SampleWriter
 from valmi_connector_lib.destination_wrapper.engine import CONNECTOR_STRING
 
@@ -98,6 +102,42 @@ def populate_run_time_args(airbyte_command, engine, config_file_path):
 state_file_path = None
 loaded_state = None
 
+FORWARD_BUFFER_SIZE = 1024 * 1024
+
+
+def forward_chunk(f, pipe):
+    '''
+    Copies the rest of the chunk file into the pipe without going through python objects,
+    with sendfile where the kernel supports it and with large buffered writes otherwise.
+    '''
+    pipe.flush()
+    offset = f.tell()
+    remaining = os.fstat(f.fileno()).st_size - offset
+    try:
+        while remaining > 0:
+            sent = os.sendfile(pipe.fileno(), f.fileno(), offset, remaining)
+            if sent == 0:
+                break
+            offset += sent
+            remaining -= sent
+    except OSError as e:
+        if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+            raise
+        f.seek(offset)
+        shutil.copyfileobj(f, pipe, FORWARD_BUFFER_SIZE)
+        pipe.flush()
+
+
+def handle_chunk_lines(lines, proc):
+    for line in lines:
+        if line.strip() == "":
+            continue
+        # RECORD lines are forwarded without being decoded
+        if not dispatch_line(handlers, line):
+            return False
+        proc.stdin.write(line.encode("utf-8"))
+    return True
+
 
 def set_state_file_path(file_path: str):
     global state_file_path
@@ -144,15 +184,10 @@ def main():
             stdout=subprocess.PIPE,
         )
 
-        record_types = handlers.keys()
         for line in io.TextIOWrapper(proc.stdout, encoding="utf-8"):  # or another encoding
             if line.strip() == "":
                 continue
-            json_record = json.loads(line)
-            if json_record["type"] not in record_types:
-                stdout_handlers["default"].handle(json_record)
-            else:
-                stdout_handlers[json_record["type"]].handle(json_record)
+            dispatch_line(stdout_handlers, line)
 
         return_code = proc.poll()
         if return_code is not None and return_code != 0:
@@ -166,6 +201,8 @@ def main():
                            engine.connector_state.run_time_args["sync_id"],
                            engine.connector_state.run_time_args["run_id"],
                            CONNECTOR_STRING)
+        # every exit path of the wrapper closes the last log segment
+        atexit.register(SingletonLogWriter.close_instance)
        
         # initialize SampleWriter
         SampleWriter.get_writer_by_metric_type(store_config_str=os.environ["VALMI_INTERMEDIATE_STORE"],
@@ -193,19 +230,15 @@ def main():
             )
             proc_stdout_handler_thread.start()
 
-            record_types = handlers.keys()
-
-            for line in store_reader.read():
-                if line.strip() == "":
+            passthrough = not any(handler.inspects_lines for handler in handlers.values())
+            for chunk in store_reader.read_chunks():
+                if chunk is None:
                     continue
-                json_record = json.loads(line)
-                if json_record["type"] not in record_types:
-                    if not handlers["default"].handle(json_record):
-                        break
-                else:
-                    if not handlers[json_record["type"]].handle(json_record):
-                        break
-                proc.stdin.write(line.encode("utf-8"))
+                f, chunk_codec = chunk
+                if passthrough and chunk_codec.passthrough:
+                    forward_chunk(f, proc.stdin)
+                elif not handle_chunk_lines(chunk_codec.read_lines(f), proc):
+                    break
 
         except Exception as e:
             engine.error(msg=str(e))
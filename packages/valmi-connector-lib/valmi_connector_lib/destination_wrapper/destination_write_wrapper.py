@@ -1,6 +1,10 @@
 from abc import abstractmethod
-from collections import defaultdict, namedtuple
+import asyncio
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import functools
+import inspect
 from typing import Any, Dict, Iterable, Mapping
 from airbyte_cdk import AirbyteLogger
 from airbyte_cdk.models import (
@@ -18,6 +22,9 @@ from valmi_connector_lib.valmi_protocol import (
 )
 from valmi_connector_lib.common.run_time_args import RunTimeArgs
 
+# connectors opt in to concurrent records, within the rate limits of their provider
+DEFAULT_MAX_IN_FLIGHT = 1
+
 HandlerResponseData = namedtuple(
     "HandlerResponseData", ["flushed", "metrics", "emittable_records"], defaults=(False, {}, [])
 )
@@ -63,7 +70,6 @@ class DestinationWriteWrapper:
         counter: int = 0
         counter_by_type: dict[str, int] = defaultdict(lambda: 0)
         chunk_id = self.read_chunk_id_checkpoint()
-        run_time_args = RunTimeArgs.parse_obj(self.config["run_time_args"] if "run_time_args" in self.config else {})
 
         self.initialise_message_handling()
         for msg in input_messages:
@@ -74,58 +80,63 @@ class DestinationWriteWrapper:
                 handler_response = HandlerResponseData()
                 try:
                     handler_response = self.handle_message(msg, counter)
-                    if handler_response.emittable_records:
-                        for record in handler_response.emittable_records:
-                            yield AirbyteMessage(
-                                type=Type.RECORD,
-                                record=record,
-                            )
                 except Exception as e:
-                    yield AirbyteMessage(
-                        type=Type.TRACE,
-                        trace=AirbyteTraceMessage(
-                            type=TraceType.ERROR,
-                            error=AirbyteErrorTraceMessage(message=str(e)),
-                            emitted_at=int(datetime.now().timestamp()) * 1000,
-                        ),
-                    )
+                    yield self.error_message(e)
                     return
 
-                sync_op = msg.record.data["_valmi_meta"]["_valmi_sync_op"]
-                if not handler_response.metrics:
-                    handler_response = handler_response._replace(metrics={sync_op: 1})
-
-                for op, metric in handler_response.metrics.items():
-                    counter_by_type[op] = counter_by_type[op] + metric
-
-                # Commit state only when chunk is finished processing. Flushes are guaranteed for every chunk end, but could be more frequent and even per record for some record
-                commit_state = False
-                if counter % run_time_args.chunk_size == 0:
-                    commit_state = True
-
-                # Aggregate metrics for the current chunk_id and publish
-                if counter % run_time_args.records_per_metric == 0 or counter % run_time_args.chunk_size == 0:
-                    yield AirbyteMessage(
-                        type=Type.STATE,
-                        state=AirbyteStateMessage(
-                            type=AirbyteStateType.STREAM,
-                            data={
-                                "records_delivered": counter_by_type,
-                                "chunk_id": chunk_id,
-                                "finished": False,
-                                "commit_state": commit_state,
-                                "commit_metric": True,
-                            },
-                        ),
-                    )
-                    if counter % run_time_args.chunk_size == 0:
-                        counter_by_type.clear()
-                        chunk_id = chunk_id + 1
+                chunk_id = yield from self.emit_handler_response(msg, counter, handler_response, counter_by_type,
+                                                                 chunk_id)
 
                 if (datetime.now() - now).seconds > 5:
                     self.logger.info("A log every 5 seconds - is this required??")
 
         handler_response = self.finalise_message_handling()
+        yield from self.emit_final_response(handler_response, counter_by_type, chunk_id)
+
+    def emit_handler_response(self, msg, counter, handler_response, counter_by_type, chunk_id):
+        # yields the messages for a handled record and returns the chunk_id of the next record
+        run_time_args = self.run_time_args
+        if handler_response.emittable_records:
+            for record in handler_response.emittable_records:
+                yield AirbyteMessage(
+                    type=Type.RECORD,
+                    record=record,
+                )
+
+        sync_op = msg.record.data["_valmi_meta"]["_valmi_sync_op"]
+        if not handler_response.metrics:
+            handler_response = handler_response._replace(metrics={sync_op: 1})
+
+        for op, metric in handler_response.metrics.items():
+            counter_by_type[op] = counter_by_type[op] + metric
+
+        # Commit state only when chunk is finished processing. Flushes are guaranteed for every chunk end,
+        # but could be more frequent and even per record for some record
+        commit_state = False
+        if counter % run_time_args.chunk_size == 0:
+            commit_state = True
+
+        # Aggregate metrics for the current chunk_id and publish
+        if counter % run_time_args.records_per_metric == 0 or counter % run_time_args.chunk_size == 0:
+            yield AirbyteMessage(
+                type=Type.STATE,
+                state=AirbyteStateMessage(
+                    type=AirbyteStateType.STREAM,
+                    data={
+                        "records_delivered": counter_by_type,
+                        "chunk_id": chunk_id,
+                        "finished": False,
+                        "commit_state": commit_state,
+                        "commit_metric": True,
+                    },
+                ),
+            )
+            if counter % run_time_args.chunk_size == 0:
+                counter_by_type.clear()
+                chunk_id = chunk_id + 1
+        return chunk_id
+
+    def emit_final_response(self, handler_response, counter_by_type, chunk_id):
         if handler_response and handler_response.emittable_records:
             for record in handler_response.emittable_records:
                 yield AirbyteMessage(
@@ -151,3 +162,99 @@ class DestinationWriteWrapper:
                 },
             ),
         )
+
+    def error_message(self, e: Exception) -> AirbyteMessage:
+        return AirbyteMessage(
+            type=Type.TRACE,
+            trace=AirbyteTraceMessage(
+                type=TraceType.ERROR,
+                error=AirbyteErrorTraceMessage(message=str(e)),
+                emitted_at=int(datetime.now().timestamp()) * 1000,
+            ),
+        )
+
+
+class AsyncDestinationWriteWrapper(DestinationWriteWrapper):
+    '''
+    For destinations that make an API call per record. handle_message is a coroutine and up to max_in_flight
+    records are handled at a time. Responses are emitted in the order of the records, so the STATE of a chunk
+    is only emitted after every record of the chunk is handled.
+    Records are handled one at a time unless the connector raises max_in_flight.
+    run_blocking uses up to max_blocking_calls threads, max_in_flight when not set.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super(AsyncDestinationWriteWrapper, self).__init__(*args, **kwargs)
+        self.max_in_flight = DEFAULT_MAX_IN_FLIGHT
+        self.max_blocking_calls = None
+        self.loop = None
+        self.executor = None
+
+    @abstractmethod
+    async def handle_message(self, msg: AirbyteMessage, counter: int) -> HandlerResponseData:
+        pass
+
+    async def run_blocking(self, fn, *args, **kwargs):
+        # for handlers built on blocking http clients
+        return await self.loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    def start_message_handling(self, input_messages: Iterable[AirbyteMessage]) -> AirbyteMessage:
+        counter: int = 0
+        counter_by_type: dict[str, int] = defaultdict(lambda: 0)
+        chunk_id = self.read_chunk_id_checkpoint()
+        in_flight = deque()
+
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_blocking_calls or self.max_in_flight)
+        try:
+            initialised = self.initialise_message_handling()
+            if inspect.isawaitable(initialised):
+                self.loop.run_until_complete(initialised)
+            for msg in input_messages:
+                if msg.type == Type.RECORD:
+                    counter = counter + 1
+                    in_flight.append((msg, counter, self.loop.create_task(self.handle_message(msg, counter))))
+
+                    # let the new request start, and wait for a free slot when all of them are taken.
+                    # records are emitted in order, so only the oldest one frees a slot
+                    if len(in_flight) >= self.max_in_flight:
+                        self.loop.run_until_complete(asyncio.wait([in_flight[0][2]]))
+                    else:
+                        self.loop.run_until_complete(asyncio.sleep(0))
+
+                    try:
+                        chunk_id = yield from self.emit_completed(in_flight, counter_by_type, chunk_id, wait=False)
+                    except Exception as e:
+                        yield self.error_message(e)
+                        return
+
+            try:
+                chunk_id = yield from self.emit_completed(in_flight, counter_by_type, chunk_id, wait=True)
+            except Exception as e:
+                yield self.error_message(e)
+                return
+
+            handler_response = self.finalise_message_handling()
+            if inspect.isawaitable(handler_response):
+                handler_response = self.loop.run_until_complete(handler_response)
+            yield from self.emit_final_response(handler_response, counter_by_type, chunk_id)
+        finally:
+            tasks = [task for _, _, task in in_flight]
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.executor.shutdown(wait=False)
+            self.loop.close()
+
+    def emit_completed(self, in_flight, counter_by_type, chunk_id, wait):
+        # emits the handled records in order, up to the first one still in flight
+        while in_flight:
+            msg, counter, task = in_flight[0]
+            if not task.done():
+                if not wait:
+                    break
+                self.loop.run_until_complete(asyncio.wait([task]))
+            in_flight.popleft()
+            chunk_id = yield from self.emit_handler_response(msg, counter, task.result(), counter_by_type, chunk_id)
+        return chunk_id
@@ -30,6 +30,8 @@ from pydantic import UUID4
 import requests
 from requests.adapters import HTTPAdapter, Retry
 
+from valmi_connector_lib.common.metrics import MetricsShipper
+
 # TODO: Constants - need to come from current_run_details
 HTTP_TIMEOUT = 3  # seconds
 MAX_HTTP_RETRIES = 5
@@ -106,6 +108,11 @@ class Engine(NullEngine):
         self.session_without_retries.mount("http://", HTTPAdapter(max_retries=retries))
         self.session_without_retries.mount("https://", HTTPAdapter(max_retries=retries))
 
+        self.metrics_shipper = MetricsShipper(
+            self.engine_url, self.session_with_retries, self.session_without_retries, HTTP_TIMEOUT
+        )
+        self.metrics_shipper.start()
+
         run_time_args = self.current_run_details()
         self.connector_state = ConnectorState(run_time_args=run_time_args)
 
@@ -146,22 +153,7 @@ class Engine(NullEngine):
         }
 
         print("payload ", payload)
-        if commit:
-            r = self.session_with_retries.post(
-                f"{self.engine_url}/metrics/",
-                timeout=HTTP_TIMEOUT,
-                json=payload,
-            )
-            r.raise_for_status()
-        else:
-            try:
-                r = self.session_without_retries.post(
-                    f"{self.engine_url}/metrics/",
-                    timeout=HTTP_TIMEOUT,
-                    json=payload,
-                )
-            except Exception:
-                pass
+        self.metrics_shipper.add(payload, commit=commit)
 
     def error(self, msg="error"):
         print("sending error ", msg)
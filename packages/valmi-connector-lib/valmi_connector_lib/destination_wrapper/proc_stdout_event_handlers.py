@@ -25,16 +25,21 @@ SOFTWARE.
 
 import json
 import os
-from os.path import join
+from os.path import dirname, join
 import time
 
+from valmi_connector_lib.common.chunk_codecs import ChunkCodecFactory
+from valmi_connector_lib.common.chunk_manifest import ChunkManifestReader
 from valmi_connector_lib.common.logs import SingletonLogWriter
+from valmi_connector_lib.common.pipeline import decode_line, json_loads
 from valmi_connector_lib.common.samples import SampleWriter
 
 from .engine import NullEngine, ConnectorState, Engine
 
 # TODO: Constants - need to become env vars
 MAGIC_NUM = 0x7FFFFFFF
+CHUNK_WAIT_TIMEOUT = 3  # seconds
+ABORT_CHECK_INTERVAL = 3  # seconds
 
 
 class StoreWriter:
@@ -65,21 +70,38 @@ class StoreReader:
             os.makedirs(path_name, exist_ok=True)
             self.path_name = path_name
             self.last_handled_fn = self.get_file_name_from_chunk_id(self.read_chunk_id_checkpoint())
+            self.chunk_manifest_reader = ChunkManifestReader(dirname(path_name))
+            # chunks are decoded by the codec in their header, but a configured codec that cannot be
+            # created here fails the sync before the source has written anything
+            ChunkCodecFactory.get_codec_from_store_config(store_config)
+            self.last_abort_check_time = time.monotonic()
 
     def read(self):
+        for chunk in self.read_chunks():
+            if chunk is None:
+                yield ""
+                continue
+            f, chunk_codec = chunk
+            for line in chunk_codec.read_lines(f):
+                # print("yiedling", line)
+                yield line
+
+    def read_chunks(self):
+        '''
+        Yields (file, codec) for every chunk, with the binary file positioned at the chunk payload,
+        and None while waiting for the source to write more chunks.
+        '''
         while True:
             if not os.path.exists(self.path_name):
                 time.sleep(1)
-                yield ""
-            list_dir = sorted([f.lower() for f in os.listdir(self.path_name)], key=lambda x: int(x[:-5]))
-            for fn in list_dir:
+                yield None
+            for fn in self.list_chunk_files():
                 if self.last_handled_fn is not None and int(fn[:-5]) <= int(self.last_handled_fn[:-5]):
                     continue
                 if fn.endswith(".vald"):
-                    with open(join(self.path_name, fn), "r") as f:
-                        for line in f.readlines():
-                            # print("yiedling", line)
-                            yield line
+                    with open(join(self.path_name, fn), "rb") as f:
+                        chunk_codec = ChunkCodecFactory.detect_codec(f)
+                        yield f, chunk_codec
 
                     self.last_handled_fn = fn
                 # print(fn)
@@ -89,14 +111,30 @@ class StoreReader:
                     return
 
                 # Check for abort condition after reading a file
-                if self.engine.abort_required():
+                if self.abort_required():
                     return
-                
+
             # Check for abort condition after exhausting files in the folder
-            if self.engine.abort_required():
+            if self.abort_required():
                 return
-            time.sleep(3)
-            yield ""
+            # wakes up as soon as the source announces a new chunk
+            self.chunk_manifest_reader.wait(timeout=CHUNK_WAIT_TIMEOUT)
+            yield None
+
+    def list_chunk_files(self):
+        if self.chunk_manifest_reader.available():
+            return self.chunk_manifest_reader.new_chunk_files()
+        # source wrappers without a manifest, fall back to listing the directory
+        return sorted([f.lower() for f in os.listdir(self.path_name) if f.lower().endswith(".vald")],
+                      key=lambda x: int(x[:-5]))
+
+    def abort_required(self):
+        # abort checks are engine round-trips, so do not make them for every chunk
+        now = time.monotonic()
+        if now - self.last_abort_check_time < ABORT_CHECK_INTERVAL:
+            return False
+        self.last_abort_check_time = now
+        return self.engine.abort_required()
 
     def read_chunk_id_checkpoint(self):
         # TODO: connector_state is not being used for destination, clean it up.
@@ -133,17 +171,27 @@ class DefaultHandler:
             SingletonLogWriter.instance().check_for_flush()
         return True
 
+    def handle_raw(self, line) -> bool:
+        # handlers that do not need the payload override this to skip decoding the line
+        return self.handle(json_loads(line))
+
 
 class LogHandler(DefaultHandler):
     def __init__(self, *args, **kwargs):
         super(LogHandler, self).__init__(*args, **kwargs)
 
     def handle(self, record) -> bool:
-        log_str = json.dumps(record)
+        return self.write_log(json.dumps(record))
+
+    def handle_raw(self, line) -> bool:
+        return self.write_log(decode_line(line))
+
+    def write_log(self, log_str) -> bool:
         print(log_str)
         if SingletonLogWriter.instance() is not None:
             SingletonLogWriter.instance().write(log_str)
-        return
+        # only a False return stops the connector
+        return True
 
 
 class CheckpointHandler(DefaultHandler):
@@ -23,12 +23,12 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import json
 import os
 import io
 import threading
 
 from valmi_connector_lib.common.logs import SingletonLogWriter
+from valmi_connector_lib.common.pipeline import json_loads, sniff_type
 from .proc_stdout_event_handlers import LogHandler, CheckpointHandler, DefaultHandler, Engine, TraceHandler
 import logging
 
@@ -61,24 +61,30 @@ class ProcStdoutHandlerThread(threading.Thread):
                 for line in io.TextIOWrapper(self.proc_stdout, encoding="utf-8"):
                     if line.strip() == "":
                         continue
-                    json_record = json.loads(line)
+                    # lines are only decoded by the handlers that need the payload
+                    json_record = None
+                    record_type = sniff_type(line)
+                    if record_type is None:
+                        json_record = json_loads(line)
+                        record_type = json_record["type"]
 
                     # We want to check abort status after every chunk,
                     # STATE record is written after every chunk
-                    if json_record["type"] == "STATE":
+                    if record_type == "STATE":
                         if self.engine.abort_required():
                             if SingletonLogWriter.instance() is not None:
                                 SingletonLogWriter.instance().check_for_flush()
                             self.proc.kill()
                             os._exit(0)
 
-                    if json_record["type"] not in record_types:
-                        handlers["default"].handle(json_record)
+                    handler = handlers[record_type] if record_type in record_types else handlers["default"]
+                    if json_record is None:
+                        ret_val = handler.handle_raw(line)
                     else:
-                        ret_val = handlers[json_record["type"]].handle(json_record)
-                        if ret_val is False:  # TODO: comes from ERROR Trace, should be handled cleanly
-                            self.proc.kill()
-                            os._exit(0)  # error is already logged with engine in the handler
+                        ret_val = handler.handle(json_record)
+                    if ret_val is False:  # TODO: comes from ERROR Trace, should be handled cleanly
+                        self.proc.kill()
+                        os._exit(0)  # error is already logged with engine in the handler
 
                 # stdout finished. clean close
                 self.exit_flag = True
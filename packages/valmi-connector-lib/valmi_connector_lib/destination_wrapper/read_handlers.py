@@ -32,6 +32,9 @@ from .proc_stdout_event_handlers import (
 
 
 class ReadDefaultHandler:
+    # handlers that look at the lines read from the store disable forwarding whole chunks to the connector
+    inspects_lines = False
+
     def __init__(
         self,
         engine: Engine = None,
@@ -48,6 +51,10 @@ class ReadDefaultHandler:
     def handle(self, record) -> bool:
         return True
 
+    def handle_raw(self, line) -> bool:
+        # none of the read handlers look at the payload, the line is forwarded to the connector as it is
+        return True
+
 
 class ReadLogHandler(ReadDefaultHandler):
     def __init__(self, *args, **kwargs):
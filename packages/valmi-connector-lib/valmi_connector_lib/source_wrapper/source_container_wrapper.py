@@ -23,26 +23,34 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import atexit
 import json
 import os
 import sys
-from os.path import join
+from os.path import dirname, join
 import subprocess
-import io
+import threading
 from typing import Any, Dict
 import uuid
 from pydantic import UUID4
 import requests
 from requests.adapters import HTTPAdapter, Retry
 
+from valmi_connector_lib.common.arrow_chunks import ARROW_CHUNK_STATE_KEY
+from valmi_connector_lib.common.chunk_codecs import ChunkCodecFactory
+from valmi_connector_lib.common.chunk_manifest import ChunkManifestWriter
 from valmi_connector_lib.common.logs import SingletonLogWriter, TimeAndChunkEndFlushPolicy
+from valmi_connector_lib.common.metrics import MetricsShipper
+from valmi_connector_lib.common.pipeline import PipelineStage, PipeReaderThread, decode_line, dispatch_line, json_loads
 from valmi_connector_lib.common.samples import SampleWriter
 
 # TODO: Constants - need to become env vars
 MAGIC_NUM = 0x7FFFFFFF
+TMP_CHUNK_FILE = "chunk.vald.tmp"
 HTTP_TIMEOUT = 3  # seconds
 MAX_HTTP_RETRIES = 5
 CONNECTOR_STRING = "src"
+ABORT_CHECK_INTERVAL = 3  # seconds
 
 state_file_path = None
 loaded_state = None
@@ -121,6 +129,11 @@ class Engine(NullEngine):
         self.session_without_retries.mount("http://", HTTPAdapter(max_retries=retries))
         self.session_without_retries.mount("https://", HTTPAdapter(max_retries=retries))
 
+        self.metrics_shipper = MetricsShipper(
+            self.engine_url, self.session_with_retries, self.session_without_retries, HTTP_TIMEOUT
+        )
+        self.metrics_shipper.start()
+
         run_time_args = self.current_run_details()
         self.connector_state = ConnectorState(run_time_args=run_time_args)
 
@@ -147,22 +160,7 @@ class Engine(NullEngine):
         }
 
         print("payload ", payload)
-        if commit:
-            r = self.session_with_retries.post(
-                f"{self.engine_url}/metrics/",
-                timeout=HTTP_TIMEOUT,
-                json=payload,
-            )
-            r.raise_for_status()
-        else:
-            try:
-                r = self.session_without_retries.post(
-                    f"{self.engine_url}/metrics/",
-                    timeout=HTTP_TIMEOUT,
-                    json=payload,
-                )
-            except Exception:
-                pass
+        self.metrics_shipper.add(payload, commit=commit)
 
     def error(self, msg="error"):
         print("sending error ", msg)
@@ -215,6 +213,9 @@ class NullWriter:
     def flush(self, last=False):
         pass
 
+    def commit_chunk_file(self, file_name, num_records):
+        pass
+
     def finalize(self):
         pass
 
@@ -233,10 +234,14 @@ class StoreWriter(NullWriter):
             os.makedirs(path_name, exist_ok=True)
 
             self.path_name = path_name
+            # files that are not complete chunks stay out of the data directory, older readers list it
+            self.run_path_name = dirname(path_name)
             self.records = []
+            self.chunk_codec = ChunkCodecFactory.get_codec_from_store_config(store_config)
+            self.chunk_manifest_writer = ChunkManifestWriter(self.run_path_name)
 
     def write(self, record, last=False):
-        self.records.append(record)
+        self.buffer_record(record)
         self.connector_state.register_record()
         if self.connector_state.records_in_chunk >= self.connector_state.run_time_args["chunk_size"]:
             self.flush(last=False)
@@ -246,33 +251,113 @@ class StoreWriter(NullWriter):
         elif self.connector_state.records_in_chunk % self.connector_state.run_time_args["records_per_metric"] == 0:
             self.engine.metric(commit=False)
 
+    def buffer_record(self, record):
+        self.records.append(record)
+
     def flush(self, last=False):
         # list_dir = sorted([f.lower() for f in os.listdir(self.path_name)], key=lambda x: int(x[:-5]))
+        f = self.open_chunk_file()
+        self.chunk_codec.write(f, self.records)
+        self.close_chunk_file(f, last=last)
+
+    def open_chunk_file(self):
+        f = open(join(self.run_path_name, TMP_CHUNK_FILE), "wb")
+        self.chunk_codec.write_header(f)
+        return f
+
+    def close_chunk_file(self, f, last=False):
         new_file_name = f"{MAGIC_NUM}.vald" if last else f"{self.engine.connector_state.num_chunks}.vald"
-        with open(join(self.path_name, new_file_name), "w") as f:
-            for record in self.records:
-                f.write(json.dumps(record))
-                f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        # readers never see a partially written chunk
+        os.replace(join(self.run_path_name, TMP_CHUNK_FILE), join(self.path_name, new_file_name))
+        # announce the chunk only after it is completely written
+        self.chunk_manifest_writer.append(new_file_name)
+
+    def commit_chunk_file(self, file_name, num_records):
+        # a chunk written by the connector itself, records of the chunk never went through stdout
+        if self.connector_state.records_in_chunk > 0:
+            self.flush(last=False)
+            self.records = []
+            self.engine.metric(commit=True)
+            self.connector_state.register_chunk()
+
+        new_file_name = f"{self.engine.connector_state.num_chunks}.vald"
+        os.replace(join(self.run_path_name, file_name), join(self.path_name, new_file_name))
+        self.chunk_manifest_writer.append(new_file_name)
+
+        self.connector_state.records_in_chunk = num_records
+        self.connector_state.total_records = self.connector_state.total_records + num_records
+        self.engine.metric(commit=True)
+        self.connector_state.register_chunk()
 
     def finalize(self):
         self.flush(last=True)
         self.engine.metric(commit=True)
 
 
+class StreamingStoreWriter(StoreWriter):
+    '''
+    Encodes every record into the chunk file as it arrives instead of holding the whole chunk in memory.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super(StreamingStoreWriter, self).__init__(*args, **kwargs)
+        self.chunk_file = None
+        self.chunk_stream_writer = None
+
+    def buffer_record(self, record):
+        if self.chunk_stream_writer is None:
+            self.open_chunk_stream()
+        self.chunk_stream_writer.write(record)
+
+    def open_chunk_stream(self):
+        self.chunk_file = self.open_chunk_file()
+        self.chunk_stream_writer = self.chunk_codec.stream_writer(self.chunk_file)
+
+    def flush(self, last=False):
+        if self.chunk_stream_writer is None:
+            self.open_chunk_stream()
+        self.chunk_stream_writer.close()
+        self.close_chunk_file(self.chunk_file, last=last)
+        self.chunk_file = None
+        self.chunk_stream_writer = None
+
+
+def get_store_writer(engine: NullEngine) -> StoreWriter:
+    store_config = json.loads(os.environ["VALMI_INTERMEDIATE_STORE"])
+    if store_config["provider"] == "local" and store_config["local"].get("chunk_writer", "buffered") == "streaming":
+        return StreamingStoreWriter(engine)
+    return StoreWriter(engine)
+
+
 class DefaultHandler:
     def __init__(
-        self, engine: Engine = None, store_writer: StoreWriter = None, stdout_writer: StdoutWriter = None
+        self,
+        engine: Engine = None,
+        store_writer: StoreWriter = None,
+        stdout_writer: StdoutWriter = None,
+        writer_stage: PipelineStage = None,
+        engine_stage: PipelineStage = None,
     ) -> None:
         self.engine = engine
         self.store_writer = store_writer
         self.stdout_writer = stdout_writer
-        pass
+        # the store writer and the engine calls it makes are only used from the writer stage
+        self.writer_stage = writer_stage
+        # engine calls that need not hold up reading the connector's stdout
+        self.engine_stage = engine_stage
 
     def handle(self, record):
         print(json.dumps(record))
         if SingletonLogWriter.instance() is not None:
             SingletonLogWriter.instance().check_for_flush()
 
+    def handle_raw(self, line):
+        # handlers that do not need the payload override this to skip decoding the line
+        self.handle(json_loads(line))
+
     def finalize(self):
         pass
 
@@ -282,7 +367,12 @@ class LogHandler(DefaultHandler):
         super(LogHandler, self).__init__(*args, **kwargs)
 
     def handle(self, record):
-        log_str = json.dumps(record)
+        self.write_log(json.dumps(record))
+
+    def handle_raw(self, line):
+        self.write_log(decode_line(line))
+
+    def write_log(self, log_str):
         print(log_str)
         if SingletonLogWriter.instance() is not None:
             SingletonLogWriter.instance().write(log_str)
@@ -293,8 +383,15 @@ class CheckpointHandler(DefaultHandler):
         super(CheckpointHandler, self).__init__(*args, **kwargs)
 
     def handle(self, record):
+        data = record["state"].get("data") or {}
+        if ARROW_CHUNK_STATE_KEY in data:
+            arrow_chunk = data.pop(ARROW_CHUNK_STATE_KEY)
+            self.writer_stage.submit(self.store_writer.commit_chunk_file, arrow_chunk["file"], arrow_chunk["records"])
+
         print(json.dumps(record))
-        self.engine.checkpoint(record)
+        # checkpoint only after the records before the state are in the store
+        self.writer_stage.drain()
+        self.engine_stage.submit(self.engine.checkpoint, record)
         if SingletonLogWriter.instance() is not None:
             SingletonLogWriter.instance().data_chunk_flush_callback()
         SampleWriter.data_chunk_flush_callback()
@@ -306,7 +403,7 @@ class RecordHandler(DefaultHandler):
 
     def handle(self, record):
         if not record["record"]["rejected"]:
-            self.store_writer.write(record)
+            self.writer_stage.submit(self.store_writer.write, record)
 
         if SingletonLogWriter.instance() is not None:
             SingletonLogWriter.instance().check_for_flush()
@@ -315,7 +412,8 @@ class RecordHandler(DefaultHandler):
         sample_writer.write(record)
 
     def finalize(self):
-        self.store_writer.finalize()
+        self.writer_stage.submit(self.store_writer.finalize)
+        self.writer_stage.drain()
 
 
 class TraceHandler(DefaultHandler):
@@ -330,8 +428,11 @@ class TraceHandler(DefaultHandler):
             self.engine.error(record["trace"]["error"]["message"])
             sys.exit(0)
         elif record["trace"]["type"] == "ESTIMATE":
-            self.engine.metric_ext(
-                {record["trace"]["estimate"]["row_kind"]: record["trace"]["estimate"]["row_estimate"]}, commit=True
+            # through the writer stage, the chunk of the metric is owned by it
+            self.writer_stage.submit(
+                self.engine.metric_ext,
+                {record["trace"]["estimate"]["row_kind"]: record["trace"]["estimate"]["row_estimate"]},
+                commit=True,
             )
 
 
@@ -392,11 +493,32 @@ def populate_run_time_args(airbyte_command, engine, config_file_path):
                 f.write(json.dumps(run_time_args['state']))
 
 
-def sync_engine_for_error(proc: subprocess, engine: NullEngine):
-    if engine.abort_required():
-        proc.kill()
-        sys.exit(0)  # Not this connector's fault
-        
+class AbortWatcherThread(threading.Thread):
+    '''
+    Checks with the engine for aborts in the background instead of in between the lines of the connector.
+    '''
+
+    def __init__(self, proc: subprocess.Popen, engine: NullEngine) -> None:
+        threading.Thread.__init__(self, daemon=True)
+        self.name = "AbortWatcherThread"
+        self.proc = proc
+        self.engine = engine
+        self.aborted = False
+        self.exit_event = threading.Event()
+
+    def run(self) -> None:
+        while not self.exit_event.wait(ABORT_CHECK_INTERVAL):
+            try:
+                if self.engine.abort_required():
+                    self.aborted = True
+                    self.proc.kill()
+                    return
+            except Exception as e:
+                print("abort check failed ", e)
+
+    def stop(self):
+        self.exit_event.set()
+
 
 def set_state_file_path(file_path: str):
     global state_file_path
@@ -426,7 +548,7 @@ def main():
     engine = None
     if airbyte_command == "read":
         engine = Engine()
-        store_writer = StoreWriter(engine)
+        store_writer = get_store_writer(engine)
     else:
         engine = NullEngine()
         store_writer = NullWriter(engine)
@@ -441,6 +563,8 @@ def main():
                            engine.connector_state.run_time_args["sync_id"],
                            engine.connector_state.run_time_args["run_id"],
                            CONNECTOR_STRING)
+        # every exit path of the wrapper closes the last log segment
+        atexit.register(SingletonLogWriter.close_instance)
 
         # initialize SampleWriter
         SampleWriter.get_writer_by_metric_type(store_config_str=os.environ["VALMI_INTERMEDIATE_STORE"],
@@ -450,9 +574,18 @@ def main():
 
     stdout_writer = StdoutWriter(engine)
 
+    writer_stage = PipelineStage("WriterStageThread")
+    writer_stage.start()
+    engine_stage = PipelineStage("EngineStageThread")
+    engine_stage.start()
+
     # initialize handlers
     for key in handlers.keys():
-        handlers[key] = handlers[key](engine=engine, store_writer=store_writer, stdout_writer=stdout_writer)
+        handlers[key] = handlers[key](engine=engine,
+                                      store_writer=store_writer,
+                                      stdout_writer=stdout_writer,
+                                      writer_stage=writer_stage,
+                                      engine_stage=engine_stage)
 
     # create the subprocess
     subprocess_args = sys.argv[1:]
@@ -464,22 +597,27 @@ def main():
         stdout=subprocess.PIPE,
     )
 
-    # check engine errors every CHUNK_SIZE records
-    record_types = handlers.keys()
-    for line in io.TextIOWrapper(proc.stdout, encoding="utf-8"):  # or another encoding
-        if line.strip() == "":
+    # reading the connector's stdout is decoupled from handling it, the bounded queues in between
+    # apply backpressure to the connector
+    pipe_reader = PipeReaderThread(proc.stdout)
+    pipe_reader.start()
+
+    abort_watcher = None
+    if airbyte_command == "read":
+        abort_watcher = AbortWatcherThread(proc, engine)
+        abort_watcher.start()
+
+    for line in pipe_reader:
+        if line.strip() == b"":
             continue
         # print(line)
-        json_record = json.loads(line)
-        if json_record["type"] not in record_types:
-            handlers["default"].handle(json_record)
-        else:
-            handlers[json_record["type"]].handle(json_record)
+        dispatch_line(handlers, line)
 
-        # sync with engine for any errors - in the future -> to apply backpressure to the connector
-        if airbyte_command == "read":
-            if engine.connector_state.records_in_chunk % engine.connector_state.run_time_args["chunk_size"] == 0:
-                sync_engine_for_error(proc, engine=engine)
+    proc.wait()
+    if abort_watcher is not None:
+        abort_watcher.stop()
+        if abort_watcher.aborted:
+            sys.exit(0)  # Not this connector's fault
 
     return_code = proc.poll()
 
@@ -492,7 +630,8 @@ def main():
         sys.exit(return_code)
     else:
         if airbyte_command == "read":
-            store_writer.finalize()
+            handlers["RECORD"].finalize()
+            engine_stage.drain()
         engine.success()
 
 
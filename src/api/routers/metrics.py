@@ -32,7 +32,7 @@ from fastapi.routing import APIRouter
 from pydantic import UUID4
 
 from vyper import v
-from api.schemas import MetricCreate, MetricBase, GenericResponse
+from api.schemas import MetricCreate, MetricBase, MetricBulkCreate, GenericResponse
 from api.services import MetricsService, get_metrics_service
 
 router = APIRouter(prefix="/metrics")
@@ -53,6 +53,19 @@ async def create_metric(
     return GenericResponse()
 
 
+@router.post(
+    "/bulk",
+    response_model=GenericResponse,
+    status_code=201,
+    responses={409: {"description": "Conflict Error"}},
+)
+async def create_metrics_bulk(
+    metrics: MetricBulkCreate, metric_service: MetricsService = Depends(get_metrics_service)
+) -> GenericResponse:
+    metric_service.create_bulk(metrics)
+    return GenericResponse()
+
+
 @router.get("/syncs/{sync_id}/runs/{run_id}/metrics", response_model=dict[str, Any])
 async def get_metrics(
     sync_id: UUID4, run_id: UUID4, metric_service: MetricsService = Depends(get_metrics_service)
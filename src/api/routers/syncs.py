@@ -23,15 +23,18 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import asyncio
 import copy
 import logging
+import time
 import uuid
 import json
 
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-from fastapi import Depends
+from fastapi import Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
 
 from fastapi.routing import APIRouter
 from orchestrator.run_manager import SyncRunnerThread
@@ -52,7 +55,7 @@ from api.services import (
     get_log_handling_service,
     get_sample_handling_service,
 )
-from log_handling.log_retriever import LogRetrieverTask
+from log_handling.log_retriever import MAX_PAGE_LIMIT, LogPageTask, LogRetrieverTask, LogSearchTask
 from sample_handling.sample_retriever import SampleRetrieverTask
 
 from api.schemas.utils import assign_metrics_to_run
@@ -317,8 +320,8 @@ async def finalise_last_run(
         sync_run.run_end_at = datetime.now()
         sync_runs_service.commit()
 
-        if metrics:
-            metric_service.clear_metrics(MetricBase(run_id=sync_id, sync_id=sync_run.run_id))
+        # the metrics are left to the compactor, late posts of retried connectors still land on this run
+        metric_service.finalise(MetricBase(run_id=sync_run.run_id, sync_id=sync_id))
 
         return GenericResponse(success=True, message="success")
 
@@ -345,9 +348,89 @@ async def get_logs(
         before: Optional[int] = None,
         log_handling_service: LogHandlingService = Depends(get_log_handling_service)) -> dict:
     log_retriever_task = LogRetrieverTask(sync_id, run_id, connector, before, since)
-    log_handling_service.add_log_retriever_task(
+    future = log_handling_service.add_log_retriever_task(
         log_retriever_task=log_retriever_task)
-    return await log_handling_service.read_log_retriever_data(log_retriever_task=log_retriever_task)
+    return await log_handling_service.read_log_retriever_data(future=future)
+
+
+@router.get("/{sync_id}/runs/{run_id}/logs/page", response_model=dict)
+async def get_logs_page(
+        sync_id: UUID4,
+        run_id: UUID4,
+        connector: str,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+        since: Optional[int] = None,
+        log_handling_service: LogHandlingService = Depends(get_log_handling_service)) -> dict:
+    log_page_task = LogPageTask(sync_id, run_id, connector, cursor, limit, since)
+    future = log_handling_service.add_log_retriever_task(
+        log_retriever_task=log_page_task)
+    return await log_handling_service.read_log_retriever_data(future=future)
+
+
+@router.get("/{sync_id}/runs/{run_id}/logs/search", response_model=dict)
+async def search_logs(
+        sync_id: UUID4,
+        run_id: UUID4,
+        connector: str,
+        q: Optional[str] = None,
+        regex: bool = False,
+        ignore_case: bool = False,
+        level: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+        log_handling_service: LogHandlingService = Depends(get_log_handling_service)) -> dict:
+    '''
+    Log lines containing q, or matching it as a regular expression, at the level or a more severe one.
+    The cursor of every line can be passed to logs/page to read the logs from it.
+    '''
+    log_search_task = LogSearchTask(sync_id, run_id, connector, q, regex, ignore_case, level, cursor, limit)
+    future = log_handling_service.add_log_retriever_task(
+        log_retriever_task=log_search_task)
+    return await log_handling_service.read_log_retriever_data(future=future)
+
+
+LOG_TAIL_INTERVAL = 1  # seconds
+LOG_TAIL_KEEP_ALIVE_INTERVAL = 15  # seconds
+
+
+@router.get("/{sync_id}/runs/{run_id}/logs/tail")
+async def tail_logs(
+        request: Request,
+        sync_id: UUID4,
+        run_id: UUID4,
+        connector: str,
+        cursor: Optional[str] = None,
+        since: Optional[int] = None,
+        last_event_id: Optional[str] = Header(None),
+        log_handling_service: LogHandlingService = Depends(get_log_handling_service)) -> StreamingResponse:
+    '''
+    Server sent events with the new log lines of a run, every event is a page with the cursor as its id.
+    A reconnecting EventSource sends the id of its last event, and continues from there.
+    '''
+    async def events():
+        next_cursor, next_since = last_event_id or cursor, since
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            future = log_handling_service.add_log_retriever_task(
+                log_retriever_task=LogPageTask(sync_id, run_id, connector, next_cursor, None, next_since))
+            page = await log_handling_service.read_log_retriever_data(future=future)
+            if page is not None and "error" in page:
+                yield "event: error\ndata: %s\n\n" % json.dumps(page)
+                return
+            if page is not None and page["cursor"]:
+                next_cursor, next_since = page["cursor"], None
+            if page is not None and page["logs"]:
+                last_sent = time.monotonic()
+                yield "id: %s\ndata: %s\n\n" % (next_cursor, json.dumps(page))
+                continue
+
+            if time.monotonic() - last_sent > LOG_TAIL_KEEP_ALIVE_INTERVAL:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(LOG_TAIL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 
 @router.get("/{sync_id}/runs/{run_id}/samples", response_model=dict)
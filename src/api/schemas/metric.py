@@ -18,5 +18,9 @@ class MetricCreate(MetricBase):
         extra = Extra.allow
 
 
+class MetricBulkCreate(BaseModel):
+    metrics: list[MetricCreate]
+
+
 class Metric(MetricCreate):
     pass
@@ -23,15 +23,95 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
-from log_handling.log_serving_process import LogServingProcess
+from log_handling.log_serving_process import TASK_STARTED, LogServingProcess
 from log_handling.log_retriever import LogRetrieverTask
+from vyper import v
+import itertools
 import multiprocessing
+import threading
 import asyncio
+import time
+
+DEFAULT_LOG_SERVING_WORKERS = 2
+DEFAULT_LOG_TASK_TIMEOUT = 60  # seconds
+LIVENESS_CHECK_INTERVAL = 5  # seconds
 
 
 class LogHandlingService():
     __initialized = False
 
+    class ResultListenerThread(threading.Thread):
+        '''
+        Receives the results pushed by the log serving processes and completes the futures waiting for them.
+        '''
+
+        def __init__(self, result_queue, pending) -> None:
+            threading.Thread.__init__(self, daemon=True)
+            self.name = "LogResultListenerThread"
+            self.result_queue = result_queue
+            self.pending = pending
+
+        def run(self) -> None:
+            while True:
+                result = self.result_queue.get()
+                if result is None:
+                    break
+                task_id, kind, value = result
+                if kind == TASK_STARTED:
+                    self.pending.started(task_id, value)
+                    continue
+                future = self.pending.pop_by_id(task_id)
+                if future is not None:
+                    future.get_loop().call_soon_threadsafe(LogHandlingService.set_result, future, value)
+
+    class PendingTasks(object):
+        # futures of the tasks in flight, identical tasks share one
+        def __init__(self) -> None:
+            self.lock = threading.Lock()
+            self.ids = itertools.count()
+            self.by_key = {}
+            self.by_id = {}
+            self.ids_by_future = {}
+            # pid of the log serving process serving a task
+            self.workers = {}
+
+        def add(self, key):
+            with self.lock:
+                if key in self.by_key:
+                    return None, self.by_key[key][1]
+                task_id = next(self.ids)
+                future = asyncio.get_running_loop().create_future()
+                self.by_key[key] = (task_id, future)
+                self.by_id[task_id] = (key, future)
+                self.ids_by_future[future] = task_id
+                return task_id, future
+
+        def started(self, task_id, pid):
+            with self.lock:
+                if task_id in self.by_id:
+                    self.workers[task_id] = pid
+
+        def worker_of(self, future):
+            with self.lock:
+                return self.workers.get(self.ids_by_future.get(future))
+
+        def pop_by_id(self, task_id):
+            with self.lock:
+                if task_id not in self.by_id:
+                    return None
+                key, future = self.by_id.pop(task_id)
+                del self.by_key[key]
+                del self.ids_by_future[future]
+                self.workers.pop(task_id, None)
+                return future
+
+        def discard(self, future):
+            # a late result of the task is dropped, and the next identical task is queued again
+            with self.lock:
+                task_id = self.ids_by_future.get(future)
+            if task_id is not None:
+                self.pop_by_id(task_id)
+
     def __new__(cls) -> object:
         if not hasattr(cls, "instance"):
             cls.instance = super(LogHandlingService, cls).__new__(cls)
@@ -44,29 +124,70 @@ class LogHandlingService():
         LogHandlingService.__initialized = True
         
         multiprocessing.set_start_method("spawn", force=True)
-        self.mgr = multiprocessing.Manager()
-        self.result_dict = self.mgr.dict()
         self.task_queue = multiprocessing.JoinableQueue()
+        self.result_queue = multiprocessing.Queue()
         self.exit_flag_event = multiprocessing.Event()
+        self.pending = LogHandlingService.PendingTasks()
+        self.task_timeout = v.get_int("LOG_TASK_TIMEOUT") or DEFAULT_LOG_TASK_TIMEOUT
+
+        num_workers = v.get_int("LOG_SERVING_WORKERS") or DEFAULT_LOG_SERVING_WORKERS
+        self.log_serving_processes = [
+            LogServingProcess(task_queue=self.task_queue, result_queue=self.result_queue,
+                              exit_flag_event=self.exit_flag_event, name="LogServingProcess-%s" % i)
+            for i in range(num_workers)]
+        for log_serving_process in self.log_serving_processes:
+            log_serving_process.start()
+
+        self.result_listener_thread = LogHandlingService.ResultListenerThread(self.result_queue, self.pending)
+        self.result_listener_thread.start()
 
-        self.log_serving_process = LogServingProcess(task_queue=self.task_queue,
-                                                     result_dict=self.result_dict, exit_flag_event=self.exit_flag_event)
-        self.log_serving_process.start()
+    @staticmethod
+    def set_result(future, answer):
+        if not future.done():
+            future.set_result(answer)
 
     def exit_log_serving_process(self):
-        self.log_serving_process.exit_flag_event.set()
-        self.log_serving_process.join()
-
-    def add_log_retriever_task(self, log_retriever_task: LogRetrieverTask):
-        self.log_serving_process.task_queue.put(log_retriever_task)
-
-    async def read_log_retriever_data(self, log_retriever_task: LogRetrieverTask):
-        while self.log_serving_process.is_alive():
-            if (str(log_retriever_task) not in self.log_serving_process.result_dict):
-                await asyncio.sleep(0.5)
-            else:
-                response = self.log_serving_process.result_dict[str(log_retriever_task)]
-                del self.log_serving_process.result_dict[str(log_retriever_task)]
-                return response
-
-        raise Exception("Log Serving Process is not alive!")
+        self.exit_flag_event.set()
+        for log_serving_process in self.log_serving_processes:
+            log_serving_process.join()
+        self.result_queue.put(None)
+        self.result_listener_thread.join()
+
+    def is_alive(self):
+        return any(log_serving_process.is_alive() for log_serving_process in self.log_serving_processes)
+
+    def is_worker_alive(self, pid):
+        # a task not taken by a worker yet is waiting on all of them
+        if pid is None:
+            return True
+        return any(log_serving_process.pid == pid and log_serving_process.is_alive()
+                   for log_serving_process in self.log_serving_processes)
+
+    def add_log_retriever_task(self, log_retriever_task: LogRetrieverTask) -> asyncio.Future:
+        # a task identical to one in flight is not queued again, it gets the result of that one
+        task_id, future = self.pending.add(str(log_retriever_task))
+        if task_id is not None:
+            self.task_queue.put((task_id, log_retriever_task))
+        return future
+
+    async def read_log_retriever_data(self, future: asyncio.Future):
+        deadline = time.monotonic() + self.task_timeout
+        while self.is_alive():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return await self.fail_task(future, Exception("Log task timed out!"))
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout=min(LIVENESS_CHECK_INTERVAL, remaining))
+            except asyncio.TimeoutError:
+                pass
+            if not self.is_worker_alive(self.pending.worker_of(future)):
+                return await self.fail_task(future, Exception("Log Serving Process died while serving the task!"))
+
+        return await self.fail_task(future, Exception("Log Serving Process is not alive!"))
+
+    async def fail_task(self, future: asyncio.Future, exception: Exception):
+        # the requests sharing the future fail with it
+        self.pending.discard(future)
+        if not future.done():
+            future.set_exception(exception)
+        return await future
@@ -1,5 +1,5 @@
 from vyper import v
-from api.schemas import MetricCreate, MetricBase
+from api.schemas import MetricCreate, MetricBase, MetricBulkCreate
 from metrics.metric_store import Metrics
 
 
@@ -10,11 +10,17 @@ class MetricsService(object):
     def create(self, obj: MetricCreate) -> None:
         self.metrics.put_metrics(**obj.dict())
 
+    def create_bulk(self, obj: MetricBulkCreate) -> None:
+        self.metrics.put_metrics_bulk([metric.dict() for metric in obj.metrics])
+
     def get_metrics(self, obj: MetricBase) -> dict[str, dict[str | int]]:
         return self.metrics.get_metrics(**obj.dict())
 
     def clear_metrics(self, obj: MetricBase) -> None:
         return self.metrics.clear_metrics(**obj.dict())
 
+    def finalise(self, obj: MetricBase) -> None:
+        return self.metrics.finalise(**obj.dict())
+
     def shutdown(self):
         self.metrics.shutdown()
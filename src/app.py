@@ -42,12 +42,14 @@ async def lifespan(app: FastAPI):
     from orchestrator.repo import Repo
     from docker import ImageWarmupManager, ContainerCleaner
     from datastore.datastore_cleaner import DatastoreCleaner
+    from metrics import MetricsCompactor
     from api.services import get_metrics_service
     from api.services import get_log_handling_service
 
     img_manager = ImageWarmupManager()
     container_cleaner = ContainerCleaner()
     datastore_cleaner = DatastoreCleaner()
+    metrics_compactor = MetricsCompactor()
     repo = Repo()
     log_handling_service = get_log_handling_service()
     
@@ -62,6 +64,9 @@ async def lifespan(app: FastAPI):
     logging.info("Shutting down Repo manager")
     repo.destroy()
 
+    logging.info("Shutting down Metrics Compactor")
+    metrics_compactor.destroy()
+
     logging.info("Shutting down DataStore Cleaner")
     datastore_cleaner.destroy()
 
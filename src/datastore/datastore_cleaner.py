@@ -29,10 +29,12 @@ import shutil
 import threading
 import time
 
+import duckdb as db
 import os
 from os.path import join
 from vyper import v
 from api.services import get_sync_runs_service
+from log_handling.log_rollup import DEFAULT_ROW_GROUP_SIZE, roll_up_run
 from metastore.session import get_session
 from orchestrator.job_generator import SHARED_DIR
 
@@ -69,6 +71,8 @@ class DatastoreCleanerThread(threading.Thread):
 
         db_session = next(get_session())
         self.run_service = get_sync_runs_service(db_session)
+        # used to roll up the logs of the finished runs
+        self.log_rollup_connection = db.connect(':memory:')
 
     def run(self) -> None:
         while not self.exit_flag:
@@ -91,6 +95,9 @@ class DatastoreCleanerThread(threading.Thread):
                     dir_path = join(store_path, dir, "data")
                     if os.path.exists(dir_path):
                         shutil.rmtree(dir_path)
+                    # the logs are kept, merged into one compressed file per connector
+                    roll_up_run(self.log_rollup_connection, join(store_path, dir),
+                                v.get_int("LOG_ROLLUP_ROW_GROUP_SIZE") or DEFAULT_ROW_GROUP_SIZE)
 
                 time.sleep(v.get_int("DATASTORE_CLEANER_SLEEP_TIME") or 60)
             except Exception:
@@ -0,0 +1,229 @@
+'''
+Copyright (c) 2023 valmi.io <https://github.com/valmi-io>
+
+Created Date: Friday, October 20th 2023, 10:14:33 am
+Author: Rajashekar Varkala @ valmi.io
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import json
+from os.path import exists, join
+
+# written by the LogWriter of the connector wrappers next to the log segments, one json entry per flush
+LOG_INDEX_FILE = "segments.index"
+MAGIC_DELIM = ":zZ9Vy9:"  # short unique id to delimit the log lines
+
+# the caches live as long as the log serving process
+LOG_INDEX_CACHE_SIZE = 64
+SEGMENT_CACHE_SIZE = 16
+
+
+class IndexedSegment(object):
+    def __init__(self, name: str, first: int):
+        self.name = name
+        self.first = first
+        # (last line time, segment size in bytes) after every flush
+        self.flushes = []
+
+    @property
+    def bytes(self):
+        return self.flushes[-1][1] if self.flushes else 0
+
+    def start_offset(self, since: int):
+        # the lines of the flushes that ended before since are skipped
+        idx = bisect_left([last for last, _ in self.flushes], since)
+        return self.flushes[idx - 1][1] if idx > 0 else 0
+
+    def end_offset(self, before: int):
+        # lines before the time are all in the flushes up to the first one that ended at or after it
+        idx = bisect_left([last for last, _ in self.flushes], before)
+        return self.flushes[idx][1] if idx < len(self.flushes) else self.bytes
+
+
+class LogIndex(object):
+    '''
+    The segments of the logs of a connector, loaded from the index maintained by the LogWriter.
+    The index is append only, refresh() only reads the entries added since the last one.
+    '''
+
+    def __init__(self, dir_name: str):
+        self.dir_name = dir_name
+        self.file_path = join(dir_name, LOG_INDEX_FILE)
+        self.offset = 0
+        self.segments = []
+        self.firsts = []
+
+    def refresh(self):
+        with open(self.file_path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+
+        # only complete entries, the writer may be in the middle of appending one
+        end = data.rfind(b"\n")
+        if end < 0:
+            return
+        self.offset += end + 1
+        for line in data[:end].split(b"\n"):
+            if not line:
+                continue
+            entry = json.loads(line)
+            if not self.segments or self.segments[-1].name != entry["segment"]:
+                self.segments.append(IndexedSegment(entry["segment"], entry["first"]))
+                self.firsts.append(entry["first"])
+            self.segments[-1].flushes.append((entry["last"], entry["bytes"]))
+
+    def find(self, since: int, before: int):
+        '''
+        Returns the segment holding the time and the start time of the next segment, like the interval
+        test over the segment names. Since is inclusive and before is exclusive.
+        '''
+        if since is not None:
+            idx = bisect_right(self.firsts, since)
+        else:
+            idx = bisect_left(self.firsts, before)
+        segment = self.segments[idx - 1] if idx > 0 else None
+        next_first = self.firsts[idx] if idx < len(self.firsts) else None
+        return segment, next_first
+
+    @staticmethod
+    def exists(dir_name: str):
+        return exists(join(dir_name, LOG_INDEX_FILE))
+
+
+class CachedSegment(object):
+    '''
+    Parsed lines of a segment from a byte offset, extended as the segment grows.
+    '''
+
+    def __init__(self, path: str, start: int):
+        self.path = path
+        self.start = start
+        self.end = start
+        self.timestamps = []
+        self.messages = []
+
+    def extend_to(self, end: int):
+        if end <= self.end:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.end)
+            data = f.read(end - self.end)
+        for line in data.decode("utf-8").split("\n"):
+            if not line:
+                continue
+            timestamp, message = line.split(MAGIC_DELIM, 1)
+            self.timestamps.append(int(timestamp))
+            self.messages.append(message)
+        self.end = end
+
+    def lines(self, since: int, before: int):
+        if since is not None:
+            idx = bisect_left(self.timestamps, since)
+            return list(zip(self.timestamps[idx:], self.messages[idx:]))
+        idx = bisect_left(self.timestamps, before)
+        return list(zip(self.timestamps[:idx], self.messages[:idx]))
+
+
+class LRUCache(OrderedDict):
+    def __init__(self, max_size: int):
+        super(LRUCache, self).__init__()
+        self.max_size = max_size
+
+    def get(self, key):
+        value = super(LRUCache, self).get(key)
+        if value is not None:
+            self.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        while len(self) > self.max_size:
+            self.popitem(last=False)
+
+
+log_indexes = LRUCache(LOG_INDEX_CACHE_SIZE)
+segments = LRUCache(SEGMENT_CACHE_SIZE)
+
+
+def get_log_index(dir_name: str) -> LogIndex:
+    log_index = log_indexes.get(dir_name)
+    if log_index is None:
+        log_index = LogIndex(dir_name)
+        log_indexes.put(dir_name, log_index)
+    log_index.refresh()
+    return log_index
+
+
+def get_segment_lines(dir_name: str, segment: IndexedSegment, since: int, before: int):
+    path = join(dir_name, segment.name)
+    start = segment.start_offset(since) if since is not None else 0
+    end = segment.bytes if since is not None else segment.end_offset(before)
+
+    cached_segment = segments.get(path)
+    if cached_segment is None or cached_segment.start > start:
+        cached_segment = CachedSegment(path, start)
+        segments.put(path, cached_segment)
+    cached_segment.extend_to(end)
+    return cached_segment.lines(since, before)
+
+
+def read_page(log_index: LogIndex, position, limit: int, since: int = None):
+    '''
+    Reads up to limit lines from the position, a (segment first time, byte offset) tuple, moving on to
+    the next segments as they are exhausted. Without a position, reading starts at since or at the beginning.
+    Returns the lines and the position after the last line read.
+    '''
+    segments = log_index.segments
+    if position is not None:
+        idx, offset = bisect_left(log_index.firsts, position[0]), position[1]
+    elif since is not None:
+        segment, _ = log_index.find(since, None)
+        idx = log_index.segments.index(segment) if segment else 0
+        offset = segment.start_offset(since) if segment else 0
+    else:
+        idx, offset = 0, 0
+    if idx >= len(segments):
+        return [], position
+
+    lines = []
+    while len(lines) < limit:
+        segment = segments[idx]
+        if offset < segment.bytes:
+            with open(join(log_index.dir_name, segment.name), "rb") as f:
+                f.seek(offset)
+                data = f.read(segment.bytes - offset)
+            for line in data.split(b"\n")[:-1]:
+                offset += len(line) + 1
+                timestamp, message = line.decode("utf-8").split(MAGIC_DELIM, 1)
+                if since is not None and int(timestamp) < since:
+                    continue
+                lines.append((int(timestamp), message))
+                if len(lines) >= limit:
+                    break
+
+        # the last segment may still be written to, the position stays in it
+        if offset >= segment.bytes and idx < len(segments) - 1:
+            idx, offset = idx + 1, 0
+        elif len(lines) < limit:
+            break
+    return lines, (segments[idx].first, offset)
@@ -28,8 +28,16 @@ from vyper import v
 from os.path import join
 import os
 import sys
+import base64
 import json
+import re
 import duckdb as db
+from log_handling.log_index import LogIndex, get_log_index, get_segment_lines, read_page
+from log_handling.log_rollup import LogRollup, get_log_rollup
+from log_handling.log_search import LogSearch
+
+DEFAULT_PAGE_LIMIT = 500
+MAX_PAGE_LIMIT = 5000
 
 
 MAGIC_DELIM = ":zZ9Vy9:"  # short unique id to delimit the log lines
@@ -73,6 +81,115 @@ class LogRetrieverTask(object):
         return '%s %s %s %s %s' % (self.sync_id, self.run_id, self.collector, self.before, self.since)
 
 
+class LogPageTask(object):
+
+    '''
+    Returns at most limit lines from the cursor, and the cursor to continue from.
+    The cursor is opaque to the clients, without one the lines are read from since or from the beginning.
+    Logs are only paged when they are written with a segment index, or have been rolled up.
+    '''
+
+    def __init__(self, sync_id: str, run_id: str, collector: str, cursor: str, limit: int, since: int):
+        self.sync_id = sync_id
+        self.run_id = run_id
+        self.collector = collector
+        self.cursor = cursor
+        self.limit = min(limit or DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT)
+        self.since = since
+
+    def __call__(self):
+        store_config = json.loads(v.get("VALMI_INTERMEDIATE_STORE"))
+        dir_name = join(store_config["local"]["directory"], str(self.run_id), "logs", self.collector)
+        try:
+            position = decode_cursor(self.cursor) if self.cursor else None
+        except ValueError as e:
+            return {"logs": [], "cursor": None, "error": str(e)}
+        since = self.since if position is None else None
+
+        # the cursors of the segments stay valid after the run is rolled up
+        if LogRollup.exists(dir_name):
+            con = get_connection().cursor()
+            lines, position = get_log_rollup(dir_name, con).read_page(con, position, self.limit, since=since)
+            con.close()
+        elif LogIndex.exists(dir_name):
+            lines, position = read_page(get_log_index(dir_name), position, self.limit, since=since)
+        else:
+            return {"logs": [], "cursor": self.cursor}
+        return {"logs": lines, "cursor": encode_cursor(position) if position else self.cursor}
+
+    def __str__(self):
+        return 'page %s %s %s %s %s %s' % (self.sync_id, self.run_id, self.collector,
+                                           self.cursor, self.limit, self.since)
+
+
+class LogSearchTask(object):
+
+    '''
+    Returns at most limit lines matching the query and the level from the cursor, with the cursor of every line
+    to read the logs around it from, and the cursor to continue the search from.
+    Rolled up logs are searched inside duckdb, the segments of a running sync are scanned a bounded
+    number of bytes at a time, so the search may need to be continued even when fewer lines are returned.
+    '''
+
+    def __init__(self, sync_id: str, run_id: str, collector: str, query: str, regex: bool, ignore_case: bool,
+                 level: str, cursor: str, limit: int):
+        self.sync_id = sync_id
+        self.run_id = run_id
+        self.collector = collector
+        self.query = query
+        self.regex = regex
+        self.ignore_case = ignore_case
+        self.level = level
+        self.cursor = cursor
+        self.limit = min(limit or DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT)
+
+    def __call__(self):
+        store_config = json.loads(v.get("VALMI_INTERMEDIATE_STORE"))
+        dir_name = join(store_config["local"]["directory"], str(self.run_id), "logs", self.collector)
+        con = get_connection().cursor()
+        try:
+            position = decode_cursor(self.cursor) if self.cursor else None
+            log_search = LogSearch(self.query, self.regex, self.ignore_case, self.level)
+            log_search.check_pattern(con)
+        except (re.error, ValueError) as e:
+            return {"logs": [], "cursor": self.cursor, "done": True, "error": str(e)}
+        finally:
+            con.close()
+
+        if LogRollup.exists(dir_name):
+            con = get_connection().cursor()
+            matches, position, done = log_search.search_rollup(con, get_log_rollup(dir_name, con), position, self.limit)
+            con.close()
+        elif LogIndex.exists(dir_name):
+            matches, position, done = log_search.search_segments(get_log_index(dir_name), position, self.limit)
+        else:
+            return {"logs": [], "cursor": self.cursor, "done": True}
+        return {"logs": [{"timestamp": timestamp, "message": message, "cursor": encode_cursor(line_position)}
+                         for line_position, timestamp, message in matches],
+                "cursor": encode_cursor(position) if position else self.cursor,
+                "done": done}
+
+    def __str__(self):
+        return 'search %s %s %s %s %s %s %s %s %s' % (self.sync_id, self.run_id, self.collector, self.query, self.regex,
+                                                      self.ignore_case, self.level, self.cursor, self.limit)
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    # the cursors come from the clients, only a (segment first time, byte offset) pair is accepted
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, list) or len(position) != 2 \
+            or any(type(value) is not int or value < 0 for value in position):
+        raise ValueError("Invalid cursor")
+    return tuple(position)
+
+
 class Storage(object):
     def __init__(self, store_config: dict, run_id: str, collector: str, before: int, since: int):
         self.store_config = store_config
@@ -99,9 +216,24 @@ class StorageFactory(object):
             raise Exception("Log provider not supported!")
 
 
+# kept open for the lifetime of the log serving process
+_connection = None
+
+
+def get_connection():
+    global _connection
+    if _connection is None:
+        _connection = db.connect(':memory:')
+    return _connection
+
+
 class LocalStorage(Storage):
     def __init__(self, *args, **kwargs):
         super(LocalStorage, self).__init__(*args, **kwargs)
+        self.dir_name = join(self.store_config["local"]["directory"], str(self.run_id), "logs", self.collector)
+        self.segment = None
+        self.rollup = None
+        self.rollup_segment = None
 
     def sort(self, files_list):
         return files_list
@@ -120,9 +252,26 @@ class LocalStorage(Storage):
 
     def list_files(self):
         if self.since is None and self.before is None:
-            return []
-
-        dir_name = join(self.store_config["local"]["directory"], str(self.run_id), "logs", self.collector)
+            return ([], {"since": None, "before": None})
+
+        # the segments of finished runs are rolled up into a single file, which knows their start times
+        if LogRollup.exists(self.dir_name):
+            con = get_connection().cursor()
+            self.rollup = get_log_rollup(self.dir_name, con)
+            con.close()
+            self.rollup_segment, next_first = self.rollup.find(self.since, self.before)
+            return ([self.rollup.file_path] if self.rollup_segment is not None else [],
+                    {"since": str(self.rollup_segment) if self.rollup_segment is not None else None,
+                     "before": str(next_first) if next_first is not None else None})
+
+        # logs written with a segment index are looked up in it, instead of listing the directory
+        if LogIndex.exists(self.dir_name):
+            self.segment, next_first = get_log_index(self.dir_name).find(self.since, self.before)
+            return ([join(self.dir_name, self.segment.name)] if self.segment else [],
+                    {"since": str(self.segment.first) if self.segment else None,
+                     "before": str(next_first) if next_first is not None else None})
+
+        dir_name = self.dir_name
         list_dir = sorted([f.lower() for f in os.listdir(dir_name) if f.endswith('.vall')], key=lambda x: int(x[:-5]))
 
         filtered_list = []
@@ -157,7 +306,17 @@ class LocalStorage(Storage):
             return {"meta": meta,
                     "lines": []}
 
-        con = db.connect(':memory:')
+        if self.rollup is not None:
+            con = get_connection().cursor()
+            lines = self.rollup.segment_lines(con, self.rollup_segment, self.since, self.before)
+            con.close()
+            return {"meta": meta, "logs": lines}
+
+        if self.segment is not None:
+            # only the byte range of the segment with the requested lines is read, and cached for the next requests
+            return {"meta": meta, "logs": get_segment_lines(self.dir_name, self.segment, self.since, self.before)}
+
+        con = get_connection().cursor()
         time_filter = ""
         if self.since is not None:
             time_filter = "WHERE timestamp_micros >= %s" % self.since
@@ -176,6 +335,7 @@ class LocalStorage(Storage):
             % (files_list, MAGIC_DELIM))
         '''
         lines = con.fetchall()
+        con.close()
         return {"meta": meta, "logs": lines}
 
 
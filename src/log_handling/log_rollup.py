@@ -0,0 +1,171 @@
+'''
+Copyright (c) 2023 valmi.io <https://github.com/valmi-io>
+
+Created Date: Saturday, October 21st 2023, 11:02:18 am
+Author: Rajashekar Varkala @ valmi.io
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from bisect import bisect_left, bisect_right
+import logging
+import os
+from os.path import exists, getmtime, getsize, join
+from vyper import v
+from log_handling.log_index import LOG_INDEX_FILE, MAGIC_DELIM, LRUCache
+
+logger = logging.getLogger(v.get("LOGGER_NAME"))
+
+# the segments of a finished run are merged into this file, next to where they were written
+LOG_ROLLUP_FILE = "logs.parquet"
+DEFAULT_ROW_GROUP_SIZE = 100000
+LOG_ROLLUP_CACHE_SIZE = 64
+
+
+def segment_files(dir_name: str):
+    return sorted([f for f in os.listdir(dir_name) if f.endswith('.vall')], key=lambda x: int(x[:-5]))
+
+
+def roll_up(con, dir_name: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+    '''
+    Merges the log segments of a connector into a zstd compressed parquet file sorted by segment and line.
+    Every line keeps the segment it was written to and its byte offsets in it, so that the segment lookups
+    and the cursors of the raw segments work unchanged on the roll-up.
+    The segments are only deleted once the roll-up is verified to hold all of their bytes.
+    '''
+    files = segment_files(dir_name)
+    if not files:
+        return False
+
+    tmp_path = join(dir_name, LOG_ROLLUP_FILE + ".tmp")
+    rollup_path = join(dir_name, LOG_ROLLUP_FILE)
+    # segments written after an earlier roll-up of the run are merged into it
+    rolled_up_before = ""
+    if exists(rollup_path):
+        rolled_up_before = "UNION ALL SELECT segment, line_offset, next_offset, timestamp_micros, message \
+            FROM read_parquet('%s')" % rollup_path
+    line_bytes = "strlen(timestamp_micros) + %s + strlen(coalesce(message, '')) + 1" % len(MAGIC_DELIM)
+    # quoting is disabled, the messages are written as they are
+    con.execute(
+        "COPY ( \
+            SELECT segment, next_offset - line_bytes AS line_offset, next_offset, timestamp_micros, message FROM ( \
+                SELECT CAST(regexp_extract(filename, '(\\d+)\\.vall$', 1) AS BIGINT) AS segment, \
+                    %s AS line_bytes, \
+                    CAST(sum(%s) OVER (PARTITION BY filename ORDER BY row_num ROWS UNBOUNDED PRECEDING) AS BIGINT) \
+                        AS next_offset, \
+                    CAST(timestamp_micros AS BIGINT) AS timestamp_micros, \
+                    coalesce(message, '') AS message \
+                FROM (SELECT row_number() OVER () AS row_num, * FROM read_csv(%s, sep='%s', quote='\x01', \
+                    escape='\x01', header=False, auto_detect=False, filename=True, \
+                    columns={'timestamp_micros': 'VARCHAR', 'message': 'VARCHAR'})) \
+            ) %s ORDER BY segment, line_offset \
+        ) TO '%s' (FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE %s)"
+        % (line_bytes, line_bytes, [join(dir_name, f) for f in files], MAGIC_DELIM, rolled_up_before,
+           tmp_path, row_group_size))
+
+    con.execute("SELECT segment, max(next_offset) FROM read_parquet('%s') GROUP BY segment" % tmp_path)
+    rolled_up = dict(con.fetchall())
+    for f in files:
+        if rolled_up.get(int(f[:-5]), 0) != getsize(join(dir_name, f)):
+            logger.warning("Log roll-up of %s does not match the segment %s, keeping the segments", dir_name, f)
+            os.remove(tmp_path)
+            return False
+
+    os.rename(tmp_path, rollup_path)
+    if exists(join(dir_name, LOG_INDEX_FILE)):
+        os.remove(join(dir_name, LOG_INDEX_FILE))
+    for f in files:
+        os.remove(join(dir_name, f))
+    return True
+
+
+def roll_up_run(con, run_dir: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+    logs_dir = join(run_dir, "logs")
+    if not exists(logs_dir):
+        return
+    for connector in os.listdir(logs_dir):
+        dir_name = join(logs_dir, connector)
+        try:
+            if roll_up(con, dir_name, row_group_size):
+                logger.info("Rolled up the logs of %s", dir_name)
+        except Exception:
+            logger.exception("Error while rolling up the logs of %s", dir_name)
+
+
+class LogRollup(object):
+    '''
+    The segments of a rolled up log, looked up like the LogIndex. The lines are read with the filters
+    pushed down to the parquet row groups, which are sorted by segment and line.
+    '''
+
+    def __init__(self, dir_name: str, con):
+        self.dir_name = dir_name
+        self.file_path = join(dir_name, LOG_ROLLUP_FILE)
+        self.mtime = getmtime(self.file_path)
+        con.execute("SELECT DISTINCT segment FROM read_parquet(?) ORDER BY segment", [self.file_path])
+        self.firsts = [row[0] for row in con.fetchall()]
+
+    def find(self, since: int, before: int):
+        # the first time of the segment holding the time and of the next segment, like LogIndex.find()
+        if since is not None:
+            idx = bisect_right(self.firsts, since)
+        else:
+            idx = bisect_left(self.firsts, before)
+        first = self.firsts[idx - 1] if idx > 0 else None
+        next_first = self.firsts[idx] if idx < len(self.firsts) else None
+        return first, next_first
+
+    def segment_lines(self, con, first: int, since: int, before: int):
+        time_filter = "timestamp_micros >= ?" if since is not None else "timestamp_micros < ?"
+        con.execute("SELECT timestamp_micros, message FROM read_parquet(?) WHERE segment = ? AND %s \
+                    ORDER BY segment, line_offset" % time_filter,
+                    [self.file_path, first, since if since is not None else before])
+        return con.fetchall()
+
+    def read_page(self, con, position, limit: int, since: int = None):
+        # same positions as log_index.read_page(), the byte offsets of the lines are kept in the roll-up
+        if position is not None:
+            line_filter = "segment > ? OR (segment = ? AND line_offset >= ?)"
+            params = [position[0], position[0], position[1]]
+        elif since is not None:
+            line_filter, params = "timestamp_micros >= ?", [since]
+        else:
+            line_filter, params = "true", []
+        con.execute("SELECT segment, next_offset, timestamp_micros, message FROM read_parquet(?) WHERE %s \
+                    ORDER BY segment, line_offset LIMIT ?" % line_filter, [self.file_path] + params + [limit])
+        rows = con.fetchall()
+        if not rows:
+            return [], position
+        return [(row[2], row[3]) for row in rows], (rows[-1][0], rows[-1][1])
+
+    @staticmethod
+    def exists(dir_name: str):
+        return exists(join(dir_name, LOG_ROLLUP_FILE))
+
+
+log_rollups = LRUCache(LOG_ROLLUP_CACHE_SIZE)
+
+
+def get_log_rollup(dir_name: str, con) -> LogRollup:
+    # the roll-up does not change once written, unless the run is rolled up again
+    log_rollup = log_rollups.get(dir_name)
+    if log_rollup is None or log_rollup.mtime != getmtime(join(dir_name, LOG_ROLLUP_FILE)):
+        log_rollup = LogRollup(dir_name, con)
+        log_rollups.put(dir_name, log_rollup)
+    return log_rollup
@@ -0,0 +1,167 @@
+'''
+Copyright (c) 2023 valmi.io <https://github.com/valmi-io>
+
+Created Date: Monday, October 23rd 2023, 3:41:07 pm
+Author: Rajashekar Varkala @ valmi.io
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from bisect import bisect_left
+import re
+import duckdb as db
+from os.path import join
+from log_handling.log_index import MAGIC_DELIM, LogIndex
+from log_handling.log_rollup import LogRollup
+
+# lowest to highest severity, the levels of the airbyte log messages
+LOG_LEVELS = ["TRACE", "DEBUG", "INFO", "WARN", "ERROR", "FATAL"]
+# the connector wrappers log the airbyte messages as json, other lines are raw output of the connectors
+JSON_LEVEL_PATTERN = '"level": "([A-Z]+)"'
+RAW_LEVEL_PATTERN = '\\b(%s)\\b' % "|".join(reversed(LOG_LEVELS))
+
+# bytes of the raw segments scanned by a request, the search continues from the returned cursor
+MAX_SEARCH_BYTES = 64 * 1024 * 1024
+SEARCH_READ_SIZE = 4 * 1024 * 1024
+
+json_level_re = re.compile(JSON_LEVEL_PATTERN)
+raw_level_re = re.compile(RAW_LEVEL_PATTERN)
+
+
+def levels_from(level: str):
+    # the level and the more severe ones
+    level = level.upper()
+    if level == "WARNING":
+        level = "WARN"
+    if level not in LOG_LEVELS:
+        raise ValueError("Unknown log level %s" % level)
+    return LOG_LEVELS[LOG_LEVELS.index(level):]
+
+
+def line_level(message: str):
+    match = json_level_re.search(message) or raw_level_re.search(message)
+    return match.group(1) if match else None
+
+
+class LogSearch(object):
+    '''
+    Lines of a connector's logs matching a substring or a regular expression and at least a log level.
+    Every match carries the position of its line, which the log pages can be read from.
+    '''
+
+    def __init__(self, query: str, regex: bool, ignore_case: bool, level: str):
+        self.query = query
+        self.regex = regex
+        self.ignore_case = ignore_case
+        self.levels = levels_from(level) if level else None
+
+        if regex and not query:
+            raise ValueError("A regular expression search requires a query")
+        if regex:
+            pattern = re.compile(query, re.IGNORECASE if ignore_case else 0)
+            self.matches_query = lambda message: pattern.search(message) is not None
+        elif query and ignore_case:
+            needle = query.lower()
+            self.matches_query = lambda message: needle in message.lower()
+        elif query:
+            self.matches_query = lambda message: query in message
+        else:
+            self.matches_query = lambda message: True
+
+    def check_pattern(self, con):
+        # the roll-ups are searched with the RE2 expressions of duckdb, which have no lookarounds and backreferences,
+        # so the patterns are held to them for the segments as well
+        if not self.regex:
+            return
+        try:
+            con.execute("SELECT regexp_matches('', ?)", [self.query]).fetchall()
+        except db.Error as e:
+            raise ValueError("Unsupported regular expression: %s" % e)
+
+    def matches(self, message: str):
+        if not self.matches_query(message):
+            return False
+        return self.levels is None or line_level(message) in self.levels
+
+    def search_rollup(self, con, log_rollup: LogRollup, position, limit: int):
+        # the filters run inside duckdb, over the row groups after the position
+        filters, params = [], []
+        if position is not None:
+            filters.append("(segment > ? OR (segment = ? AND line_offset >= ?))")
+            params.extend([position[0], position[0], position[1]])
+        if self.regex:
+            filters.append("regexp_matches(message, ?, '%s')" % ("i" if self.ignore_case else "c"))
+            params.append(self.query)
+        elif self.query and self.ignore_case:
+            filters.append("contains(lower(message), ?)")
+            params.append(self.query.lower())
+        elif self.query:
+            filters.append("contains(message, ?)")
+            params.append(self.query)
+        if self.levels is not None:
+            filters.append("coalesce(nullif(regexp_extract(message, '%s', 1), ''), regexp_extract(message, '%s', 1)) \
+                           IN (%s)" % (JSON_LEVEL_PATTERN, RAW_LEVEL_PATTERN, ", ".join("?" for _ in self.levels)))
+            params.extend(self.levels)
+
+        con.execute("SELECT segment, line_offset, next_offset, timestamp_micros, message FROM read_parquet(?) \
+                    WHERE %s ORDER BY segment, line_offset LIMIT ?" % (" AND ".join(filters) or "true"),
+                    [log_rollup.file_path] + params + [limit])
+        rows = con.fetchall()
+        matches = [((row[0], row[1]), row[3], row[4]) for row in rows]
+        # fewer matches than asked for, the whole roll-up has been searched
+        return matches, (rows[-1][0], rows[-1][2]) if rows else position, len(rows) < limit
+
+    def search_segments(self, log_index: LogIndex, position, limit: int, max_bytes: int = MAX_SEARCH_BYTES):
+        # the segments are scanned from the position, at most max_bytes of them in one go
+        segments = log_index.segments
+        idx, offset = (bisect_left(log_index.firsts, position[0]), position[1]) if position is not None else (0, 0)
+        matches = []
+        scanned = 0
+        while idx < len(segments) and len(matches) < limit and scanned < max_bytes:
+            segment = segments[idx]
+            if offset < segment.bytes:
+                with open(join(log_index.dir_name, segment.name), "rb") as f:
+                    f.seek(offset)
+                    data = f.read(min(segment.bytes - offset, max_bytes - scanned, SEARCH_READ_SIZE))
+                    if b"\n" not in data:
+                        # a line longer than the read is read whole
+                        f.seek(offset)
+                        data = f.readline(segment.bytes - offset)
+                end = data.rfind(b"\n") + 1
+                if end == 0:
+                    break
+                scanned += end
+                for line in data[:end].split(b"\n")[:-1]:
+                    line_offset, offset = offset, offset + len(line) + 1
+                    timestamp, message = line.decode("utf-8").split(MAGIC_DELIM, 1)
+                    if self.matches(message):
+                        matches.append(((segment.first, line_offset), int(timestamp), message))
+                        if len(matches) >= limit:
+                            break
+
+            # the last segment may still be written to, the position stays in it
+            if offset >= segment.bytes and idx < len(segments) - 1:
+                idx, offset = idx + 1, 0
+            elif offset >= segment.bytes:
+                break
+
+        if idx >= len(segments):
+            return matches, position, True
+        done = idx == len(segments) - 1 and offset >= segments[idx].bytes
+        return matches, (segments[idx].first, offset), done
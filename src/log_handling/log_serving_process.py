@@ -33,6 +33,10 @@ from queue import Empty
 import os
 import logging.config
 
+# the result queue carries (task_id, TASK_STARTED, pid) when a worker takes a task, and (task_id, TASK_DONE, answer)
+TASK_STARTED = "started"
+TASK_DONE = "done"
+
 
 class LogServingProcess(multiprocessing.Process):
     exit_flag = False
@@ -55,10 +59,10 @@ class LogServingProcess(multiprocessing.Process):
         def run(self) -> None:
             self.wait_for_exit_event()
 
-    def __init__(self, task_queue, result_dict, exit_flag_event):
-        multiprocessing.Process.__init__(self)
+    def __init__(self, task_queue, result_queue, exit_flag_event, name=None):
+        multiprocessing.Process.__init__(self, name=name)
         self.task_queue = task_queue
-        self.result_dict = result_dict
+        self.result_queue = result_queue
         self.exit_flag_event = exit_flag_event
 
     def run(self):
@@ -87,13 +91,17 @@ class LogServingProcess(multiprocessing.Process):
                 if next_task:
                     self.task_queue.task_done()
                 break
-            self.logger.info('%s: %s' % (proc_name, next_task))
+            task_id, task = next_task
+            self.logger.info('%s: %s' % (proc_name, task))
+            # lets the api process fail the task if this process dies while serving it
+            self.result_queue.put((task_id, TASK_STARTED, self.pid))
             try:
-                answer = next_task()
+                answer = task()
             except:
                 self.logger.exception("Exception occurred while processing task")
                 answer = None
                 pass
-            self.result_dict[str(next_task)] = answer
+            # pushed to the api process, which wakes up the request waiting for it
+            self.result_queue.put((task_id, TASK_DONE, answer))
 
             self.task_queue.task_done()
@@ -1,4 +1,5 @@
 from .metric_store import Metrics  # noqa: F401
 from .metric_display_order import MetricDisplayOrder  # noqa: F401
+from .metrics_compactor import MetricsCompactor  # noqa: F401
 
-__all__ = ["Metrics", "MetricDisplayOrder"]
+__all__ = ["Metrics", "MetricDisplayOrder", "MetricsCompactor"]
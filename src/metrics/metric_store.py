@@ -30,12 +30,20 @@ from pydantic.types import UUID4
 import duckdb
 import uuid
 import random
-from datetime import datetime
+from datetime import datetime, timedelta
 
 METRICS_TABLE = "metrics"
+# latest value of every metric type of a chunk, upserted on every post
+LATEST_METRICS_TABLE = "metrics_latest"
+# running per run totals of the latest values, so that reads do not scan the chunks of a run
+RUN_METRICS_TABLE = "metrics_run_totals"
+STAGING_METRICS_TABLE = "metrics_staging"
+# runs that have been finalised, their raw metrics are folded away by the compactor
+FINALISED_RUNS_TABLE = "metrics_finalised_runs"
 DB_NAME = "/data/valmi_metrics.db"
 
 MAGIC_CHUNK_ID = 2**31 - 1
+INSERT_BATCH_SIZE = 1000
 
 
 class Metrics:
@@ -57,15 +65,17 @@ class Metrics:
         self.con = duckdb.connect(DB_NAME)
 
         metric_table_found = False
+        aggregate_tables_found = False
         if delete_db:
             self.con.execute(f"DROP TABLE IF EXISTS {METRICS_TABLE}")
+            self.con.execute(f"DROP TABLE IF EXISTS {LATEST_METRICS_TABLE}")
+            self.con.execute(f"DROP TABLE IF EXISTS {RUN_METRICS_TABLE}")
+            self.con.execute(f"DROP TABLE IF EXISTS {FINALISED_RUNS_TABLE}")
         else:
             self.con.execute("SHOW TABLES")
-            tables = self.con.fetchall()
-
-            for table in tables:
-                if table[0] == METRICS_TABLE:
-                    metric_table_found = True
+            tables = [table[0] for table in self.con.fetchall()]
+            metric_table_found = METRICS_TABLE in tables
+            aggregate_tables_found = LATEST_METRICS_TABLE in tables and RUN_METRICS_TABLE in tables
 
         if not metric_table_found:
             self.con.sql(
@@ -74,33 +84,83 @@ class Metrics:
                     count BIGINT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
             )
 
+        # every query and delete on the raw metrics is scoped to a single run
+        self.con.execute(f"CREATE INDEX IF NOT EXISTS {METRICS_TABLE}_run_idx ON {METRICS_TABLE} (sync_id, run_id)")
+
+        if not aggregate_tables_found:
+            self._create_aggregate_tables()
+
+        self.con.sql(
+            f"CREATE TABLE IF NOT EXISTS {FINALISED_RUNS_TABLE} (sync_id VARCHAR, run_id VARCHAR, \
+                finalised_at TIMESTAMP, compacted BOOLEAN DEFAULT FALSE, PRIMARY KEY (sync_id, run_id))"
+        )
+
+        self.con.sql(
+            f"CREATE TEMP TABLE {STAGING_METRICS_TABLE} (sync_id VARCHAR, connector_id VARCHAR, run_id VARCHAR, \
+                chunk_id BIGINT, metric_type VARCHAR, count BIGINT, created_at TIMESTAMP)"
+        )
+
+    def _create_aggregate_tables(self) -> None:
+        self.con.begin()
+        self.con.execute(f"DROP TABLE IF EXISTS {LATEST_METRICS_TABLE}")
+        self.con.execute(f"DROP TABLE IF EXISTS {RUN_METRICS_TABLE}")
+        self.con.sql(
+            f"CREATE TABLE {LATEST_METRICS_TABLE} (sync_id VARCHAR, connector_id VARCHAR, run_id VARCHAR, \
+                chunk_id BIGINT, metric_type VARCHAR, count BIGINT, created_at TIMESTAMP, \
+                PRIMARY KEY (sync_id, run_id, connector_id, chunk_id, metric_type))"
+        )
+        self.con.sql(
+            f"CREATE TABLE {RUN_METRICS_TABLE} (sync_id VARCHAR, connector_id VARCHAR, run_id VARCHAR, \
+                metric_type VARCHAR, count BIGINT, \
+                PRIMARY KEY (sync_id, run_id, connector_id, metric_type))"
+        )
+
+        # backfill from the metrics posted before the aggregates existed
+        self.con.sql(
+            f"INSERT INTO {LATEST_METRICS_TABLE} \
+                SELECT sync_id, connector_id, run_id, chunk_id, metric_type, \
+                    arg_max(count, created_at), max(created_at) \
+                FROM {METRICS_TABLE} \
+                GROUP BY sync_id, run_id, connector_id, chunk_id, metric_type"
+        )
+        self.con.sql(
+            f"INSERT INTO {RUN_METRICS_TABLE} \
+                SELECT sync_id, connector_id, run_id, metric_type, SUM(count) \
+                FROM {LATEST_METRICS_TABLE} \
+                GROUP BY sync_id, run_id, connector_id, metric_type"
+        )
+        self.con.commit()
+
     def clear_metrics(self, sync_id: UUID4, run_id: UUID4) -> None:
         try:
-            self.con.sql(f"DELETE FROM {METRICS_TABLE} WHERE sync_id = '{sync_id}' AND run_id = '{run_id}'")
+            self.con.begin()
+            for table in [METRICS_TABLE, LATEST_METRICS_TABLE, RUN_METRICS_TABLE, FINALISED_RUNS_TABLE]:
+                self.con.execute(f"DELETE FROM {table} WHERE sync_id = ? AND run_id = ?", [str(sync_id), str(run_id)])
+            self.con.commit()
         except Exception as e:
             self.con.rollback()
             raise e
 
     def get_metrics(self, sync_id: UUID4, run_id: UUID4, ingore_chunk_id: int = None) -> dict[str, dict[str, int]]:
         # get the metrics of the run
-        # deduplicate by chunk_id and return
+        # the running totals already hold the latest value of every chunk
         try:
-            ignore_clause = " AND m.chunk_id != %s" % ingore_chunk_id if ingore_chunk_id is not None else ""
-            aggregated_metrics = self.con.sql(
-                f"SELECT deduped_chunks.connector_id AS connector_id,  deduped_chunks.metric_type AS metric_type, SUM(count) as count \
-                    FROM {METRICS_TABLE} m2 RIGHT JOIN \
-                            ( SELECT m.connector_id AS connector_id, m.chunk_id AS chunk_id, m.metric_type as metric_type, max(m.created_at) AS created_at \
-                            FROM {METRICS_TABLE} m \
-                            WHERE m.sync_id = '{sync_id}' AND m.run_id = '{run_id}' \
-                                {ignore_clause} \
-                            GROUP BY  m.connector_id, m.chunk_id, m.metric_type ) deduped_chunks \
-                        ON m2.chunk_id = deduped_chunks.chunk_id AND \
-                            m2.created_at = deduped_chunks.created_at AND \
-                            m2.connector_id = deduped_chunks.connector_id AND \
-                            m2.metric_type = deduped_chunks.metric_type \
-                    WHERE sync_id = '{sync_id}' AND run_id = '{run_id}' \
-                    GROUP BY  deduped_chunks.connector_id, deduped_chunks.metric_type"
-            ).fetchall()
+            if ingore_chunk_id is None:
+                aggregated_metrics = self.con.execute(
+                    f"SELECT connector_id, metric_type, count FROM {RUN_METRICS_TABLE} \
+                        WHERE sync_id = ? AND run_id = ?",
+                    [str(sync_id), str(run_id)],
+                ).fetchall()
+            else:
+                aggregated_metrics = self.con.execute(
+                    f"SELECT t.connector_id, t.metric_type, t.count - COALESCE(l.count, 0) \
+                        FROM {RUN_METRICS_TABLE} t LEFT JOIN {LATEST_METRICS_TABLE} l \
+                            ON l.sync_id = t.sync_id AND l.run_id = t.run_id AND \
+                                l.connector_id = t.connector_id AND l.metric_type = t.metric_type AND \
+                                l.chunk_id = ? \
+                        WHERE t.sync_id = ? AND t.run_id = ?",
+                    [ingore_chunk_id, str(sync_id), str(run_id)],
+                ).fetchall()
 
             ret_map = {}
             for x, y, z in aggregated_metrics:
@@ -116,65 +176,133 @@ class Metrics:
     def put_metrics(
         self, sync_id: UUID4, connector_id: UUID4, run_id: UUID4, chunk_id: int, metrics: dict[str, int], **kwargs
     ) -> None:
-        try:
-            """
-            DISABLE AGGREGATION IF IT IS SLOW
-            """
-            # aggregate for every MAX chunks
-            MAX = 10
-            sync_info = self.con.sql(
-                f"SELECT COUNT(*) FROM {METRICS_TABLE} WHERE sync_id = '{sync_id}' \
-                            AND run_id = '{run_id}' AND connector_id= '{connector_id}'"
-            ).fetchone()
-            if (
-                False and sync_info[0] > MAX
-            ):  # TODO: Disabling aggregation until we inject state into connectors, otherwise metrics are counted multiple times when connectors are retried
-                print("AGGREGATING")
-                # aggregate ignoring the latest chunk
-                old_metrics = self.get_metrics(sync_id=sync_id, run_id=run_id, ingore_chunk_id=chunk_id)
-                print("old metrics below")
-                print(old_metrics)
-                for conn, old_metric in old_metrics.items():
-                    if len(old_metric.keys()) > 0 and conn == connector_id:
-                        self.con.begin()
-                        self.con.sql(
-                            f"DELETE FROM {METRICS_TABLE} WHERE sync_id = '{sync_id}' \
-                                AND run_id = '{run_id}' AND connector_id= '{connector_id}' AND chunk_id != {chunk_id}"
-                        )
-                        # generate CHUNK_ID
-                        print("inserting magical chunk")
-                        print(old_metric)
-                        self._insert_metrics(sync_id, connector_id, run_id, MAGIC_CHUNK_ID, old_metric)
-                        self.con.commit()
+        self.put_metrics_bulk(
+            [
+                {
+                    "sync_id": sync_id,
+                    "connector_id": connector_id,
+                    "run_id": run_id,
+                    "chunk_id": chunk_id,
+                    "metrics": metrics,
+                }
+            ]
+        )
+
+    def put_metrics_bulk(self, metrics: list[dict]) -> None:
+        # all the posts share the same created_at, so the last post of a chunk in the request wins
+        now = datetime.now()
+        latest = {}
+        for metric in metrics:
+            for metric_type, count in metric["metrics"].items():
+                row = (
+                    str(metric["sync_id"]),
+                    str(metric["connector_id"]),
+                    str(metric["run_id"]),
+                    metric["chunk_id"],
+                    metric_type,
+                    count,
+                    now,
+                )
+                latest[row[:5]] = row
+        if not latest:
+            return
+        rows = list(latest.values())
 
+        try:
             self.con.begin()
-            self._insert_metrics(sync_id, connector_id, run_id, chunk_id, metrics)
+            self._insert_rows(METRICS_TABLE, rows)
+            self._insert_rows(STAGING_METRICS_TABLE, rows)
+            self._upsert_aggregates()
+            self.con.execute(f"DELETE FROM {STAGING_METRICS_TABLE}")
             self.con.commit()
         except Exception as e:
             self.con.rollback()
             raise e
 
-    def _insert_metrics(
-        self, sync_id: UUID4, connector_id: UUID4, run_id: UUID4, chunk_id: int, metrics: dict[str, int]
-    ):
-        # put the metrics of the run
-        now = datetime.now()
-        inserts = []
-
-        for metric_type, count in metrics.items():
-            inserts.append(f"('{sync_id}', '{connector_id}', '{run_id}', {chunk_id},'{metric_type}',{count},'{now}')")
-
-        print(inserts)
-        if inserts:
-            self.con.sql(f"INSERT INTO {METRICS_TABLE} VALUES {','.join(inserts)}")
+    def _upsert_aggregates(self) -> None:
+        # the totals move by the difference to the previous latest value of the chunk,
+        # so they have to be updated before the latest values are replaced
+        self.con.sql(
+            f"INSERT INTO {RUN_METRICS_TABLE} \
+                SELECT s.sync_id, s.connector_id, s.run_id, s.metric_type, SUM(s.count - COALESCE(l.count, 0)) \
+                FROM {STAGING_METRICS_TABLE} s LEFT JOIN {LATEST_METRICS_TABLE} l \
+                    ON l.sync_id = s.sync_id AND l.run_id = s.run_id AND l.connector_id = s.connector_id AND \
+                        l.chunk_id = s.chunk_id AND l.metric_type = s.metric_type \
+                GROUP BY s.sync_id, s.run_id, s.connector_id, s.metric_type \
+            ON CONFLICT (sync_id, run_id, connector_id, metric_type) \
+                DO UPDATE SET count = count + excluded.count"
+        )
+        self.con.sql(
+            f"INSERT INTO {LATEST_METRICS_TABLE} SELECT * FROM {STAGING_METRICS_TABLE} \
+            ON CONFLICT (sync_id, run_id, connector_id, chunk_id, metric_type) \
+                DO UPDATE SET count = excluded.count, created_at = excluded.created_at"
+        )
+
+    def _insert_rows(self, table: str, rows: list[tuple]) -> None:
+        # multi-row inserts with bound parameters, a statement per batch instead of a statement per row
+        for i in range(0, len(rows), INSERT_BATCH_SIZE):
+            batch = rows[i : i + INSERT_BATCH_SIZE]
+            placeholders = ",".join(["(?, ?, ?, ?, ?, ?, ?)"] * len(batch))
+            self.con.execute(f"INSERT INTO {table} VALUES {placeholders}", [value for row in batch for value in row])
 
     def get_samples(self, sync_id: UUID4, run_id: UUID4):
         # get the samples from the intermediate store
         pass
 
-    def finalise(self, sync_id: UUID4, run_id: UUID4):
-        # aggregate and store the finalised metrics into the metastore
-        pass
+    def finalise(self, sync_id: UUID4, run_id: UUID4) -> None:
+        # the finalised metrics are stored into the metastore by the caller,
+        # the run is only marked here so that the compactor can fold it
+        try:
+            self.con.execute(
+                f"INSERT INTO {FINALISED_RUNS_TABLE} VALUES (?, ?, ?, FALSE) \
+                ON CONFLICT (sync_id, run_id) DO UPDATE SET finalised_at = excluded.finalised_at",
+                [str(sync_id), str(run_id), datetime.now()],
+            )
+        except Exception as e:
+            self.con.rollback()
+            raise e
+
+    def compact(self, retention_seconds: int) -> int:
+        """
+        Folds finalised runs down to their per run totals and per chunk latest values, dropping the raw metrics.
+        The latest values stay until the retention expires, late posts of retried connectors are diffed against them.
+        All the metrics of runs finalised longer than retention_seconds ago are dropped.
+        Runs on its own cursor, so that it can be called from a background thread.
+        Returns the number of runs compacted.
+        """
+        cursor = self.con.cursor()
+        try:
+            runs = cursor.execute(
+                f"SELECT sync_id, run_id FROM {FINALISED_RUNS_TABLE} WHERE NOT compacted"
+            ).fetchall()
+            for sync_id, run_id in runs:
+                cursor.begin()
+                cursor.execute(f"DELETE FROM {METRICS_TABLE} WHERE sync_id = ? AND run_id = ?", [sync_id, run_id])
+                cursor.execute(
+                    f"UPDATE {FINALISED_RUNS_TABLE} SET compacted = TRUE WHERE sync_id = ? AND run_id = ?",
+                    [sync_id, run_id],
+                )
+                cursor.commit()
+
+            cursor.begin()
+            expired_at = datetime.now() - timedelta(seconds=retention_seconds)
+            for table in [METRICS_TABLE, LATEST_METRICS_TABLE, RUN_METRICS_TABLE]:
+                cursor.execute(
+                    f"DELETE FROM {table} t WHERE EXISTS ( \
+                        SELECT 1 FROM {FINALISED_RUNS_TABLE} f \
+                        WHERE f.sync_id = t.sync_id AND f.run_id = t.run_id AND f.compacted AND f.finalised_at < ?)",
+                    [expired_at],
+                )
+            cursor.execute(
+                f"DELETE FROM {FINALISED_RUNS_TABLE} WHERE compacted AND finalised_at < ?", [expired_at]
+            )
+            cursor.commit()
+            return len(runs)
+        except Exception as e:
+            cursor.rollback()
+            raise e
+        finally:
+            cursor.close()
 
     def size(self) -> int:
         return self.con.sql(f"SELECT COUNT(*) as count FROM {METRICS_TABLE}").fetchone()[0]
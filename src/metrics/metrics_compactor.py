@@ -0,0 +1,73 @@
+"""
+Copyright (c) 2023 valmi.io <https://github.com/valmi-io>
+
+Created Date: Wednesday, October 18th 2023, 6:32:10 pm
+Author: Rajashekar Varkala @ valmi.io
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import logging
+import threading
+import time
+
+from vyper import v
+from .metric_store import Metrics
+
+logger = logging.getLogger(v.get("LOGGER_NAME"))
+
+
+class MetricsCompactor:
+    __initialized = False
+
+    def __new__(cls) -> object:
+        if not hasattr(cls, "instance"):
+            cls.instance = super(MetricsCompactor, cls).__new__(cls)
+        return cls.instance
+
+    def __init__(self) -> None:
+        if MetricsCompactor.__initialized:
+            return
+
+        MetricsCompactor.__initialized = True
+
+        self.compactor_thread = MetricsCompactorThread(64, "MetricsCompactorThread")
+        self.compactor_thread.start()
+
+    def destroy(self) -> None:
+        self.compactor_thread.exit_flag = True
+
+
+class MetricsCompactorThread(threading.Thread):
+    def __init__(self, thread_id: int, name: str) -> None:
+        threading.Thread.__init__(self)
+        self.thread_id = thread_id
+        self.exit_flag = False
+        self.name = name
+
+    def run(self) -> None:
+        while not self.exit_flag:
+            try:
+                logger.info("Compacting metrics of finalised runs")
+                num_runs = Metrics().compact(retention_seconds=v.get_int("METRICS_RETENTION") or 86400)
+                logger.debug("compacted metrics of %s runs", num_runs)
+                time.sleep(v.get_int("METRICS_COMPACTOR_SLEEP_TIME") or 60)
+            except Exception:
+                logger.exception("Error while compacting metrics")
+                time.sleep(v.get_int("METRICS_COMPACTOR_SLEEP_TIME") or 60)
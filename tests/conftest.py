@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+
+import pytest
+
+# the engine modules are imported as top level modules, as when it runs from src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from log_handling.log_index import LOG_INDEX_FILE, MAGIC_DELIM  # noqa: E402
+
+LOG_MESSAGES = [
+    '{"type": "LOG", "log": {"level": "INFO", "message": "Reading stream users"}}',
+    "ERROR Failed to upsert record %d",
+    '{"type": "LOG", "log": {"level": "WARN", "message": "Retrying request %d"}}',
+    "plain connector output %d",
+    '{"type": "LOG", "log": {"level": "ERROR", "message": "failed to upsert record %d"}}',
+]
+
+
+def sample_log_segments(segment_count=4, lines_per_segment=10, lines_per_flush=3):
+    '''
+    Segments starting every 1000 micros, every segment a list of flushes of (timestamp, message) lines.
+    Two lines of every segment share a timestamp, like lines logged in the same microsecond.
+    '''
+    segments = []
+    for s in range(segment_count):
+        first = (s + 1) * 1000
+        lines = []
+        for i in range(lines_per_segment):
+            timestamp = first + 50 * (i if i != 5 else 4)
+            message = LOG_MESSAGES[(s + i) % len(LOG_MESSAGES)]
+            lines.append((timestamp, message % timestamp if "%d" in message else message))
+        segments.append([lines[i:i + lines_per_flush] for i in range(0, len(lines), lines_per_flush)])
+    return segments
+
+
+def write_log_segments(dir_name, segments, index=True):
+    # segments and index entries as the LogWriter writes them
+    dir_name.mkdir(parents=True, exist_ok=True)
+    index_entries = []
+    for flushes in segments:
+        segment = "%d.vall" % flushes[0][0][0]
+        lines = size = 0
+        with open(dir_name / segment, "wb") as f:
+            for flush in flushes:
+                for timestamp, message in flush:
+                    size += f.write(("%d%s%s\n" % (timestamp, MAGIC_DELIM, message)).encode("utf-8"))
+                lines += len(flush)
+                index_entries.append({"segment": segment, "first": int(segment[:-5]), "last": flush[-1][0],
+                                      "lines": lines, "bytes": size})
+    if index:
+        with open(dir_name / LOG_INDEX_FILE, "w") as f:
+            for entry in index_entries:
+                f.write(json.dumps(entry))
+                f.write("\n")
+    return str(dir_name)
+
+
+@pytest.fixture
+def log_segments():
+    return sample_log_segments()
+
+
+@pytest.fixture
+def log_lines(log_segments):
+    return [line for flushes in log_segments for flush in flushes for line in flush]
+
+
+@pytest.fixture
+def log_dir(tmp_path, log_segments):
+    # the logs of the src connector of the run
+    return write_log_segments(tmp_path / "run" / "logs" / "src", log_segments)
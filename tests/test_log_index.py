@@ -0,0 +1,67 @@
+import os
+import shutil
+
+import pytest
+
+from log_handling.log_index import LOG_INDEX_FILE, LogIndex, get_log_index
+from log_handling.log_retriever import LocalStorage
+
+TIMES = [None, 0, 999, 1000, 1001, 1150, 1200, 1450, 1999, 2000, 2200, 3999, 4000, 4450, 4451, 5000]
+
+
+def storage(dir_name, since, before):
+    run_dir = os.path.dirname(os.path.dirname(os.path.dirname(dir_name)))
+    return LocalStorage({"provider": "local", "local": {"directory": run_dir}}, "run", "src", before, since)
+
+
+@pytest.fixture
+def legacy_log_dir(tmp_path, log_dir):
+    # the same segments, written before the index existed
+    legacy_dir = tmp_path / "legacy" / "run" / "logs" / "src"
+    shutil.copytree(log_dir, legacy_dir)
+    os.remove(legacy_dir / LOG_INDEX_FILE)
+    return str(legacy_dir)
+
+
+@pytest.mark.parametrize("since,before", [(since, before) for since in TIMES for before in TIMES])
+def test_index_finds_the_segments_of_the_interval_test(log_dir, legacy_log_dir, since, before):
+    files, meta = storage(log_dir, since, before).list_files()
+    legacy_files, legacy_meta = storage(legacy_log_dir, since, before).list_files()
+
+    assert [os.path.basename(f) for f in files] == [os.path.basename(f) for f in legacy_files]
+    assert meta == legacy_meta
+
+
+@pytest.mark.parametrize("since,before",
+                         [(since, None) for since in TIMES[1:]] + [(None, before) for before in TIMES[1:]])
+def test_segment_lines_of_the_interval(log_dir, log_lines, since, before):
+    log_storage = storage(log_dir, since, before)
+    files, meta = log_storage.list_files()
+    lines = log_storage.get_data(files, meta).get("logs", [])
+
+    first = int(meta["since"]) if meta["since"] else None
+    next_first = int(meta["before"]) if meta["before"] else None
+    segment_lines = [line for line in log_lines
+                     if first is not None and line[0] >= first and (next_first is None or line[0] < next_first)]
+    if since is not None:
+        assert lines == [line for line in segment_lines if line[0] >= since]
+    else:
+        assert lines == [line for line in segment_lines if line[0] < before]
+
+
+def test_index_is_refreshed_with_the_entries_appended_since(log_dir, log_segments):
+    with open(os.path.join(log_dir, LOG_INDEX_FILE), "rb") as f:
+        entries = f.read().split(b"\n")
+    with open(os.path.join(log_dir, LOG_INDEX_FILE), "wb") as f:
+        f.write(b"\n".join(entries[:2]) + b"\n" + entries[2][:10])
+
+    log_index = get_log_index(log_dir)
+    assert [segment.name for segment in log_index.segments] == ["1000.vall"]
+    assert len(log_index.segments[0].flushes) == 2
+
+    with open(os.path.join(log_dir, LOG_INDEX_FILE), "wb") as f:
+        f.write(b"\n".join(entries))
+    log_index = get_log_index(log_dir)
+    assert log_index.firsts == [1000, 2000, 3000, 4000]
+    assert [len(segment.flushes) for segment in log_index.segments] == [len(flushes) for flushes in log_segments]
+    assert LogIndex.exists(log_dir)
@@ -0,0 +1,56 @@
+import base64
+import json
+
+import pytest
+from vyper import v
+
+from log_handling.log_retriever import LogPageTask, decode_cursor, encode_cursor
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii")
+
+
+@pytest.fixture
+def store_config(tmp_path, log_dir):
+    v.set("VALMI_INTERMEDIATE_STORE", json.dumps({"provider": "local", "local": {"directory": str(tmp_path)}}))
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor((2000, 345))) == (2000, 345)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    base64.urlsafe_b64encode(b"not json").decode("ascii"),
+    raw_cursor({"segment": 1000, "offset": 0}),
+    raw_cursor([1000]),
+    raw_cursor([1000, 0, 0]),
+    raw_cursor([1000, -1]),
+    raw_cursor([1000, 1.5]),
+    raw_cursor([True, 0]),
+    raw_cursor(["1000", 0]),
+    raw_cursor(["1000; DROP TABLE logs", 0]),
+    raw_cursor(None),
+])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+def test_pages_are_read_from_the_cursor(store_config, log_lines):
+    lines, cursor = [], None
+    while True:
+        page = LogPageTask("sync", "run", "src", cursor, 7, None)()
+        if not page["logs"]:
+            break
+        lines.extend(page["logs"])
+        cursor = page["cursor"]
+    assert lines == log_lines
+    page = LogPageTask("sync", "run", "src", None, 5000, 2200)()
+    assert page["logs"] == [line for line in log_lines if line[0] >= 2200]
+
+
+def test_invalid_page_cursor_is_an_error(store_config):
+    page = LogPageTask("sync", "run", "src", raw_cursor([1000, -1]), 10, None)()
+    assert page == {"logs": [], "cursor": None, "error": "Invalid cursor"}
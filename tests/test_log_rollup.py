@@ -0,0 +1,99 @@
+import os
+import shutil
+
+import duckdb
+import pytest
+
+from log_handling.log_index import LOG_INDEX_FILE, LogIndex, get_log_index, read_page
+from log_handling.log_retriever import LocalStorage
+from log_handling.log_rollup import LOG_ROLLUP_FILE, LogRollup, roll_up
+
+from .conftest import sample_log_segments, write_log_segments
+
+LIMITS = [1, 3, 7, 10, 1000]
+TIMES = [0, 999, 1000, 1150, 1200, 1999, 2000, 3999, 4450, 4451, 5000]
+
+
+@pytest.fixture
+def con():
+    con = duckdb.connect(":memory:")
+    yield con
+    con.close()
+
+
+def index_pages(log_index, limit, since=None):
+    pages, position = [], None
+    while True:
+        lines, position = read_page(log_index, position, limit, since=since if position is None else None)
+        if not lines:
+            return pages
+        pages.append((lines, position))
+
+
+def rollup_pages(con, log_rollup, limit, since=None):
+    pages, position = [], None
+    while True:
+        lines, position = log_rollup.read_page(con, position, limit, since=since if position is None else None)
+        if not lines:
+            return pages
+        pages.append((lines, position))
+
+
+def test_roll_up_replaces_the_segments(con, log_dir, log_lines):
+    assert roll_up(con, log_dir, row_group_size=4)
+    assert sorted(os.listdir(log_dir)) == [LOG_ROLLUP_FILE]
+    assert not LogIndex.exists(log_dir)
+    assert LogRollup(log_dir, con).read_page(con, None, 1000)[0] == log_lines
+
+
+def test_roll_up_without_segments(con, tmp_path):
+    assert not roll_up(con, str(tmp_path))
+
+
+@pytest.mark.parametrize("limit", LIMITS)
+@pytest.mark.parametrize("since", [None] + TIMES)
+def test_rollup_pages_are_the_pages_of_the_index(con, tmp_path, log_dir, limit, since):
+    # the same logs, not rolled up
+    index_dir = str(shutil.copytree(log_dir, tmp_path / "index"))
+    log_index = get_log_index(index_dir)
+    pages = index_pages(log_index, limit, since)
+
+    roll_up(con, log_dir, row_group_size=4)
+    log_rollup = LogRollup(log_dir, con)
+    rolled_up_pages = rollup_pages(con, log_rollup, limit, since)
+    assert [lines for lines, _ in rolled_up_pages] == [lines for lines, _ in pages]
+
+    # a page ending a segment moves the cursor of the index to the next segment, and the one of the roll-up
+    # to the end of the segment. the cursors handed out before the roll-up keep working on it, and the other way
+    for position in [position for _, position in pages + rolled_up_pages]:
+        assert log_rollup.read_page(con, position, 1000)[0] == read_page(log_index, position, 1000)[0]
+
+
+def test_segments_written_after_a_roll_up_are_merged_into_it(con, tmp_path, log_lines):
+    segments = sample_log_segments(segment_count=6)
+    dir_name = write_log_segments(tmp_path, segments[:4])
+    roll_up(con, dir_name)
+    write_log_segments(tmp_path, segments[4:])
+    assert LogIndex.exists(dir_name)
+
+    assert roll_up(con, dir_name)
+    lines = [line for flushes in segments for flush in flushes for line in flush]
+    log_rollup = LogRollup(dir_name, con)
+    assert log_rollup.firsts == [1000, 2000, 3000, 4000, 5000, 6000]
+    assert log_rollup.read_page(con, None, 1000)[0] == lines
+
+
+@pytest.mark.parametrize("since,before", [(since, None) for since in TIMES] + [(None, before) for before in TIMES])
+def test_rolled_up_segments_are_found_like_the_indexed_ones(con, tmp_path, log_dir, since, before):
+    run_dir = str(tmp_path)
+    storage = LocalStorage({"provider": "local", "local": {"directory": run_dir}}, "run", "src", before, since)
+    files, meta = storage.list_files()
+    data = storage.get_data(files, meta)
+
+    roll_up(con, log_dir)
+    assert not os.path.exists(os.path.join(log_dir, LOG_INDEX_FILE))
+    storage = LocalStorage({"provider": "local", "local": {"directory": run_dir}}, "run", "src", before, since)
+    rollup_files, rollup_meta = storage.list_files()
+    assert rollup_meta == meta
+    assert bool(rollup_files) == bool(files)
+    assert storage.get_data(rollup_files, rollup_meta) == data
@@ -0,0 +1,138 @@
+import re
+import shutil
+
+import duckdb
+import pytest
+
+from log_handling import log_search
+from log_handling.log_index import get_log_index
+from log_handling.log_rollup import LogRollup, roll_up
+from log_handling.log_search import LogSearch, levels_from, line_level
+
+from .conftest import sample_log_segments, write_log_segments
+
+SEARCHES = [
+    ("", False, False, None),
+    ("upsert record", False, False, None),
+    ("FAILED", False, False, None),
+    ("FAILED", False, True, None),
+    ("record 1[0-9]+0", True, False, None),
+    ("^error", True, True, None),
+    ("", False, False, "warn"),
+    ("", False, False, "ERROR"),
+    ("upsert", False, True, "error"),
+    ("no such line", False, False, None),
+]
+
+
+@pytest.fixture
+def con():
+    con = duckdb.connect(":memory:")
+    yield con
+    con.close()
+
+
+def expected_matches(log_lines, query, regex, ignore_case, level):
+    # brute force over the lines
+    levels = levels_from(level) if level else None
+    matches = []
+    for timestamp, message in log_lines:
+        if regex:
+            found = re.search(query, message, re.IGNORECASE if ignore_case else 0) is not None
+        elif ignore_case:
+            found = query.lower() in message.lower()
+        else:
+            found = query in message
+        if found and (levels is None or line_level(message) in levels):
+            matches.append((timestamp, message))
+    return matches
+
+
+def search_all(search, limit):
+    matches, position = [], None
+    while True:
+        page, position, done = search(position, limit)
+        matches.extend(page)
+        if done:
+            return matches
+
+
+def test_line_levels():
+    assert line_level('{"type": "LOG", "log": {"level": "WARN", "message": "ERROR in the message"}}') == "WARN"
+    assert line_level("2023-10-18 ERROR Failed to upsert") == "ERROR"
+    assert line_level("ERRORS are not levels") is None
+    assert levels_from("warning") == ["WARN", "ERROR", "FATAL"]
+    with pytest.raises(ValueError):
+        levels_from("verbose")
+
+
+@pytest.mark.parametrize("query,regex,ignore_case,level", SEARCHES)
+@pytest.mark.parametrize("limit", [1, 4, 1000])
+def test_segments_and_rollup_searches_match_the_lines(con, tmp_path, log_dir, log_lines,
+                                                      query, regex, ignore_case, level, limit):
+    search = LogSearch(query, regex, ignore_case, level)
+    search.check_pattern(con)
+    expected = expected_matches(log_lines, query, regex, ignore_case, level)
+
+    index_dir = str(shutil.copytree(log_dir, tmp_path / "index"))
+    log_index = get_log_index(index_dir)
+    segment_matches = search_all(lambda position, limit: search.search_segments(log_index, position, limit), limit)
+    assert [(timestamp, message) for _, timestamp, message in segment_matches] == expected
+
+    roll_up(con, log_dir, row_group_size=4)
+    log_rollup = LogRollup(log_dir, con)
+    rollup_matches = search_all(lambda position, limit: search.search_rollup(con, log_rollup, position, limit), limit)
+    assert rollup_matches == segment_matches
+
+    # the logs around every match are read from its position
+    for position, timestamp, message in segment_matches:
+        assert log_rollup.read_page(con, position, 1)[0] == [(timestamp, message)]
+
+
+def test_segments_are_searched_a_bounded_number_of_bytes_at_a_time(log_dir, log_lines):
+    search = LogSearch("upsert", False, False, None)
+    log_index = get_log_index(log_dir)
+    matches, position, done = search.search_segments(log_index, None, 1000, max_bytes=200)
+    assert not done
+    assert len(matches) < len(expected_matches(log_lines, "upsert", False, False, None))
+
+    matches = search_all(lambda position, limit: search.search_segments(log_index, position, limit, max_bytes=200),
+                         1000)
+    assert [(timestamp, message) for _, timestamp, message in matches] \
+        == expected_matches(log_lines, "upsert", False, False, None)
+
+
+def test_lines_longer_than_a_read_are_searched(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_search, "SEARCH_READ_SIZE", 16)
+    segments = sample_log_segments(segment_count=2)
+    log_index = get_log_index(write_log_segments(tmp_path, segments))
+    log_lines = [line for flushes in segments for flush in flushes for line in flush]
+
+    search = LogSearch("record", False, False, None)
+    matches = search_all(lambda position, limit: search.search_segments(log_index, position, limit), 1000)
+    assert [(timestamp, message) for _, timestamp, message in matches] \
+        == expected_matches(log_lines, "record", False, False, None)
+
+
+def test_search_of_a_running_sync_stays_in_the_last_segment(log_dir):
+    search = LogSearch("no such line", False, False, None)
+    log_index = get_log_index(log_dir)
+    matches, position, done = search.search_segments(log_index, None, 10)
+    assert (matches, done) == ([], True)
+    assert position == (4000, log_index.segments[-1].bytes)
+
+
+def test_regular_expression_without_a_query():
+    with pytest.raises(ValueError):
+        LogSearch("", True, False, None)
+
+
+@pytest.mark.parametrize("query", ["(?=upsert)", "(a)\\1"])
+def test_regular_expressions_duckdb_does_not_support(con, query):
+    with pytest.raises(ValueError, match="Unsupported regular expression"):
+        LogSearch(query, True, False, None).check_pattern(con)
+
+
+def test_invalid_regular_expression():
+    with pytest.raises(re.error):
+        LogSearch("record [", True, False, None)
@@ -0,0 +1,122 @@
+import pytest
+
+from metrics import metric_store
+from metrics.metric_store import LATEST_METRICS_TABLE, RUN_METRICS_TABLE, Metrics
+
+SYNC_ID = "7b2a2b1e-5a52-4e3e-9d5c-6a3c8a8e4f01"
+RUN_ID = "0d5d7f6a-0a4c-4b8e-8f3e-2f1c9b6d7e02"
+
+
+@pytest.fixture
+def db_name(tmp_path, monkeypatch):
+    db_name = str(tmp_path / "valmi_metrics.db")
+    monkeypatch.setattr(metric_store, "DB_NAME", db_name)
+    return db_name
+
+
+def new_metrics(monkeypatch, delete_db=False):
+    # Metrics is a singleton
+    monkeypatch.setattr(Metrics, "_Metrics__initialized", False)
+    if hasattr(Metrics, "instance"):
+        monkeypatch.delattr(Metrics, "instance")
+    return Metrics(delete_db=delete_db)
+
+
+@pytest.fixture
+def metrics(db_name, monkeypatch):
+    metrics = new_metrics(monkeypatch, delete_db=True)
+    yield metrics
+    metrics.shutdown()
+
+
+def test_latest_value_of_a_chunk_wins(metrics):
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 1, {"succeeded": 5})
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 1, {"succeeded": 7, "failed": 1})
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 2, {"succeeded": 3})
+    metrics.put_metrics(SYNC_ID, "DEST", RUN_ID, 1, {"upsert": 4})
+
+    assert metrics.get_metrics(SYNC_ID, RUN_ID) == {"SRC": {"succeeded": 10, "failed": 1}, "DEST": {"upsert": 4}}
+
+
+def test_last_post_of_a_chunk_in_a_bulk_wins(metrics):
+    metrics.put_metrics_bulk(
+        [
+            {"sync_id": SYNC_ID, "connector_id": "SRC", "run_id": RUN_ID, "chunk_id": 1, "metrics": {"succeeded": 5}},
+            {"sync_id": SYNC_ID, "connector_id": "SRC", "run_id": RUN_ID, "chunk_id": 1, "metrics": {"succeeded": 2}},
+            {"sync_id": SYNC_ID, "connector_id": "SRC", "run_id": RUN_ID, "chunk_id": 2, "metrics": {"succeeded": 1}},
+        ]
+    )
+
+    assert metrics.get_metrics(SYNC_ID, RUN_ID) == {"SRC": {"succeeded": 3}}
+
+
+def test_metrics_ignoring_a_chunk(metrics):
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 1, {"succeeded": 5})
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 2, {"succeeded": 3, "failed": 2})
+
+    assert metrics.get_metrics(SYNC_ID, RUN_ID, 2) == {"SRC": {"succeeded": 5, "failed": 0}}
+
+
+def test_metrics_of_other_runs_are_not_counted(metrics):
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 1, {"succeeded": 5})
+    metrics.put_metrics(SYNC_ID, "SRC", "another run", 1, {"succeeded": 3})
+
+    assert metrics.get_metrics(SYNC_ID, RUN_ID) == {"SRC": {"succeeded": 5}}
+    metrics.clear_metrics(SYNC_ID, RUN_ID)
+    assert metrics.get_metrics(SYNC_ID, RUN_ID) == {}
+    assert metrics.get_metrics(SYNC_ID, "another run") == {"SRC": {"succeeded": 3}}
+
+
+def test_aggregates_are_backfilled_from_the_raw_metrics(db_name, monkeypatch):
+    metrics = new_metrics(monkeypatch, delete_db=True)
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 1, {"succeeded": 5})
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 1, {"succeeded": 7})
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 2, {"succeeded": 3})
+    # a database written before the aggregate tables existed
+    metrics.con.execute(f"DROP TABLE {LATEST_METRICS_TABLE}")
+    metrics.con.execute(f"DROP TABLE {RUN_METRICS_TABLE}")
+    metrics.shutdown()
+
+    metrics = new_metrics(monkeypatch)
+    try:
+        assert metrics.get_metrics(SYNC_ID, RUN_ID) == {"SRC": {"succeeded": 10}}
+        metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 2, {"succeeded": 4})
+        assert metrics.get_metrics(SYNC_ID, RUN_ID) == {"SRC": {"succeeded": 11}}
+    finally:
+        metrics.shutdown()
+
+
+def test_compaction_keeps_the_totals_of_finalised_runs(metrics):
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 1, {"succeeded": 5})
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 2, {"succeeded": 3})
+    metrics.put_metrics(SYNC_ID, "SRC", "running", 1, {"succeeded": 1})
+    metrics.finalise(SYNC_ID, RUN_ID)
+
+    assert metrics.compact(retention_seconds=3600) == 1
+    assert metrics.size() == 1
+    assert metrics.get_metrics(SYNC_ID, RUN_ID) == {"SRC": {"succeeded": 8}}
+    assert metrics.get_metrics(SYNC_ID, "running") == {"SRC": {"succeeded": 1}}
+    # already compacted
+    assert metrics.compact(retention_seconds=3600) == 0
+
+
+def test_late_posts_after_compaction_are_not_double_counted(metrics):
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 1, {"succeeded": 5})
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 2, {"succeeded": 3})
+    metrics.finalise(SYNC_ID, RUN_ID)
+    metrics.compact(retention_seconds=3600)
+
+    # a retried connector posts the chunk again
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 2, {"succeeded": 4})
+    assert metrics.get_metrics(SYNC_ID, RUN_ID) == {"SRC": {"succeeded": 9}}
+
+
+def test_metrics_are_dropped_when_the_retention_expires(metrics):
+    metrics.put_metrics(SYNC_ID, "SRC", RUN_ID, 1, {"succeeded": 5})
+    metrics.put_metrics(SYNC_ID, "SRC", "running", 1, {"succeeded": 1})
+    metrics.finalise(SYNC_ID, RUN_ID)
+
+    assert metrics.compact(retention_seconds=0) == 1
+    assert metrics.get_metrics(SYNC_ID, RUN_ID) == {}
+    assert metrics.get_metrics(SYNC_ID, "running") == {"SRC": {"succeeded": 1}}
+    assert metrics.compact(retention_seconds=0) == 0
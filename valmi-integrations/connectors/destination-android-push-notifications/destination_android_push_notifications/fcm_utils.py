@@ -10,6 +10,7 @@ from valmi_connector_lib.valmi_protocol import (
 )
 
 from valmi_connector_lib.common.metrics import get_metric_type
+from valmi_connector_lib.common.rate_limiter import RateLimiter
 from valmi_connector_lib.common.run_time_args import RunTimeArgs
 from airbyte_cdk.sources.streams.http.rate_limiting import user_defined_backoff_handler, default_backoff_handler
 from airbyte_cdk.sources.streams.http.exceptions import DefaultBackoffException, UserDefinedBackoffException
@@ -19,10 +20,11 @@ import firebase_admin
 from firebase_admin import credentials, messaging
 from firebase_admin.exceptions import FirebaseError, RESOURCE_EXHAUSTED, UNAVAILABLE
 from airbyte_cdk.models import AirbyteMessage
-import time
 import json
 
 MAX_CHUNK_SIZE = 500
+# FCM accepts 600,000 messages per minute for a project
+MESSAGES_PER_SECOND = 10000
 
 
 def map_data(mapping: list[Dict[str, str]], data: Dict[str, Any]):
@@ -66,6 +68,7 @@ class FCMUtils:
                 self.chunk_size = run_time_args.chunk_size
 
         self.run_time_args = run_time_args
+        self.rate_limiter = RateLimiter(MESSAGES_PER_SECOND, burst=MAX_CHUNK_SIZE)
         self.msgs: List[AirbyteMessage] = []
         self.fcm_msgs: List[messaging.Notification] = []
 
@@ -129,8 +132,6 @@ class FCMUtils:
         self.msgs.append(msg)
 
         if len(self.msgs) >= self.chunk_size:
-            # Sleep for 1 proper error logging
-            time.sleep(1)
             flushed, new_metrics, new_rejected_records = self.flush(configured_stream, sink)
             metrics = self.merge_metric_dictionaries(metrics, new_metrics)
             rejected_records.extend(new_rejected_records)
@@ -173,6 +174,7 @@ class FCMUtils:
             The SDK will retry each of the above errors up to 5 times (the original attempt + 4 retries) with exponential backoff. 
             You can implement your own retry mechanisms at the application level if you want, but this is typically not required.
         """
+        self.rate_limiter.acquire(tokens=len(self.fcm_msgs))
         batch_response = self.make_request(messaging.send_all, self.fcm_msgs)
 
         rejected_records = []
@@ -208,7 +210,7 @@ class FCMUtils:
                 dummy_http_request = Request()
                 dummy_http_response = Response()
                 error_message = str(e)
-                custom_backoff_time = self.backoff_time()
+                custom_backoff_time = self.backoff_time(e)
                 if custom_backoff_time:
                     raise UserDefinedBackoffException(
                         backoff=custom_backoff_time,
@@ -243,12 +245,17 @@ class FCMUtils:
     def retry_factor(self) -> float:
         return 5
 
-    def backoff_time(self) -> Optional[float]:
+    def backoff_time(self, firebaseError: FirebaseError) -> Optional[float]:
         """
-        :param response:
+        :param firebaseError:
         :return how long to backoff in seconds. The return value may be a floating point number for subsecond precision. Returning None defers backoff
         to the default backoff behavior (e.g using an exponential algorithm).
         """
+        if firebaseError.http_response is not None:
+            # Retry-After of the response also holds off the following batches
+            backoff = self.rate_limiter.update_from_headers(firebaseError.http_response.headers)
+            if backoff:
+                return backoff
         return None
 
     def should_retry(self, firebaseError: FirebaseError) -> bool:
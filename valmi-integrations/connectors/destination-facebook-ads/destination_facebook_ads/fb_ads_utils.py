@@ -1,5 +1,6 @@
 from collections import defaultdict
 from datetime import datetime
+import functools
 from typing import Any, Mapping, Optional, Union
 from airbyte_cdk import AirbyteLogger
 from requests_cache import Request, Response
@@ -8,6 +9,7 @@ from valmi_connector_lib.valmi_protocol import (
     ConfiguredValmiSink,
     ValmiFinalisedRecordMessage
 )
+from valmi_connector_lib.common.identifier_hashing import IdentifierHasher
 from valmi_connector_lib.common.metrics import get_metric_type
 from valmi_connector_lib.common.run_time_args import RunTimeArgs
 from facebook_business.adobjects.customaudience import CustomAudience
@@ -16,6 +18,15 @@ from facebook_business.exceptions import FacebookRequestError
 from airbyte_cdk.sources.streams.http.rate_limiting import user_defined_backoff_handler, default_backoff_handler
 from airbyte_cdk.sources.streams.http.exceptions import DefaultBackoffException, UserDefinedBackoffException
 
+# CustomAudience.format_params of facebook_business 26.0.2 for raw multi key users: every key is stripped
+# of these characters, lowercased and normalized, and all of them but extern_id are hashed
+SDK_STRIPPED_CHARS = " \t\r\n\0\x0B."
+UNHASHED_KEYS = (CustomAudience.Schema.MultiKeySchema.extern_id,)
+
+
+def normalize_user_key(key_name, value):
+    return CustomAudience.normalize_key(key_name, str(value).strip(SDK_STRIPPED_CHARS).lower())
+
 
 class FBAdsUtils:
     logger = AirbyteLogger()
@@ -31,6 +42,7 @@ class FBAdsUtils:
         self.lookup_keys = None
         self.is_deleting = True
         self.run_time_args = run_time_args
+        self.hasher = IdentifierHasher()
 
     def get_custom_audience_schema(self):
         key_types = [
@@ -122,6 +134,11 @@ class FBAdsUtils:
                 m2[k] = v
         return m2
     
+    def hash_users(self, schema, users):
+        # the normalization and hashing of the sdk for raw users, a key at a time and cached across chunks
+        normalizers = {key: functools.partial(normalize_user_key, key) for key in schema}
+        return self.hasher.hash_columns(schema, users, normalizers=normalizers, unhashed_columns=UNHASHED_KEYS)
+
     def flush(self, configured_stream: ValmiStream, sink: ConfiguredValmiSink):
         valid_records, rejected_records = self.run_validations(configured_stream, sink)
         metrics = defaultdict(lambda: 0)
@@ -133,7 +150,7 @@ class FBAdsUtils:
                 self.make_request(
                     CustomAudience(sink.sink.name).remove_users,
                     [sink.destination_id],
-                    user_list,
+                    self.hash_users([sink.destination_id], user_list),
                     True,
                 )
             metrics[get_metric_type("delete")] = len(valid_records)
@@ -143,7 +160,7 @@ class FBAdsUtils:
             self.make_request(
                 CustomAudience(sink.sink.name).add_users,
                 self.schema,
-                user_list,
+                self.hash_users(self.schema, user_list),
                 True)
             metrics[get_metric_type("upsert")] = len(valid_records)
             self.msgs.clear()
@@ -151,7 +168,8 @@ class FBAdsUtils:
     
     def _fn_exception_handler(self, fn, schema, users, is_raw):
         try:
-            return fn(schema, users, is_raw)
+            # users are hashed by hash_users
+            return fn(schema, users, is_raw, pre_hashed=True)
         except FacebookRequestError as e:
             if (self.should_retry(e)):
                 dummy_http_request = Request()
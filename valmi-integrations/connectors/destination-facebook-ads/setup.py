@@ -3,7 +3,8 @@ from setuptools import find_packages, setup
 MAIN_REQUIREMENTS = [
     "valmi_connector_lib",
     "requests",
-    "facebook_business",
+    # the hashing of raw users in fb_ads_utils is ported from this version
+    "facebook_business==26.0.2",
 ]
 
 TEST_REQUIREMENTS = ["pytest~=6.2"]
@@ -41,16 +41,21 @@ from valmi_connector_lib.valmi_protocol import (
     FieldCatalog,
 )
 from valmi_connector_lib.destination_wrapper.destination_write_wrapper import (
-    DestinationWriteWrapper,
+    AsyncDestinationWriteWrapper,
     HandlerResponseData,
 )
 from valmi_connector_lib.common.metrics import get_metric_type
 from valmi_connector_lib.valmi_destination import ValmiDestination
 import requests
-from .gong_utils import BASE_API_URL, GongUtils
+from .gong_utils import BASE_API_URL, MAX_REQUESTS_IN_FLIGHT, GongUtils
 
 
-class GongWriter(DestinationWriteWrapper):
+class GongWriter(AsyncDestinationWriteWrapper):
+    def __init__(self, *args, **kwargs):
+        super(GongWriter, self).__init__(*args, **kwargs)
+        # the requests share the rate limiter of GongUtils
+        self.max_in_flight = MAX_REQUESTS_IN_FLIGHT
+
     def initialise_message_handling(self):
         self.gong_utils = GongUtils(
             self.config,
@@ -58,7 +63,7 @@ class GongWriter(DestinationWriteWrapper):
             self.run_time_args,
         )
 
-    def handle_message(
+    async def handle_message(
         self,
         msg,
         counter,
@@ -68,7 +73,8 @@ class GongWriter(DestinationWriteWrapper):
 
         rejected_records = []
         if sync_op == "upsert":
-            sync_op_response = self.gong_utils.upsert(
+            sync_op_response = await self.run_blocking(
+                self.gong_utils.upsert,
                 msg.record,
                 configured_stream=self.configured_catalog.streams[0],
                 sink=self.configured_destination_catalog.sinks[0],
@@ -80,7 +86,8 @@ class GongWriter(DestinationWriteWrapper):
                 metrics[get_metric_type(sync_op)] = 1
 
         elif sync_op == "update":
-            sync_op_response = self.gong_utils.update(
+            sync_op_response = await self.run_blocking(
+                self.gong_utils.update,
                 msg.record,
                 configured_stream=self.configured_catalog.streams[0],
                 sink=self.configured_destination_catalog.sinks[0],
@@ -26,10 +26,12 @@ SOFTWARE.
 
 from collections import namedtuple
 from datetime import datetime
+import itertools
 from typing import Any, Dict, Iterable, List, Mapping, Optional, Union
 from airbyte_cdk import AirbyteLogger
 import requests
 from valmi_connector_lib.valmi_protocol import ValmiStream, ConfiguredValmiSink, ValmiFinalisedRecordMessage
+from valmi_connector_lib.common.rate_limiter import RateLimiter
 from valmi_connector_lib.common.run_time_args import RunTimeArgs
 from airbyte_cdk.sources.streams.http.http import HttpStream
 from requests import Request
@@ -38,6 +40,9 @@ import random
 
 SyncOpResponse = namedtuple("SyncOpResponse", ["obj", "rejected", "rejected_record"], defaults=[None, False, None])
 BASE_API_URL = "https://us-68970.api.gong.io"
+# Gong allows 3 api calls per second
+REQUESTS_PER_SECOND = 3
+MAX_REQUESTS_IN_FLIGHT = 3
 
 
 # TODO: Use batch api for Gong. Currently doing one by one
@@ -53,7 +58,9 @@ class GongUtils(HttpStream):
         self.access_key_secret = config["access_key_secret"]
         self.integration_id = sink.sink.integrationId
 
-        self.clientRequestId = random.randint(0, 1000000000)
+        # Gong deduplicates the requests by clientRequestId, every request takes its own
+        self.client_request_ids = itertools.count(random.randint(0, 1000000000))
+        self.rate_limiter = RateLimiter(REQUESTS_PER_SECOND, burst=MAX_REQUESTS_IN_FLIGHT)
 
     def make_object(self, data, configured_stream: ValmiStream, sink: ConfiguredValmiSink):
         mapped_data = self.map_data(sink.mapping, data)
@@ -94,6 +101,7 @@ class GongUtils(HttpStream):
             auth=(self.access_key, self.access_key_secret),
         )
         prepped = s.prepare_request(req)
+        self.rate_limiter.acquire()
         resp = self._send_request(prepped, request_kwargs={"timeout": self.run_time_args.http_timeout})
 
         objects_map = resp.json()["crmObjectsMap"]
@@ -112,13 +120,14 @@ class GongUtils(HttpStream):
             )
 
     def make_request(self, sink, request_obj):
-        self.clientRequestId = self.clientRequestId + 1
+        # requests run concurrently, the id is taken once for the whole request
+        client_request_id = next(self.client_request_ids)
         s = requests.session()
         self.airbyte_logger.debug(f"Request Object: {request_obj}")
         params = {
             "integrationId": self.integration_id,
             "objectType": sink.sink.name,
-            "clientRequestId": str(self.clientRequestId),
+            "clientRequestId": str(client_request_id),
         }
         self.airbyte_logger.debug(f"Params: {params}")
         req = Request(
@@ -126,13 +135,10 @@ class GongUtils(HttpStream):
             url=f"{BASE_API_URL}/v2/crm/entities",
             auth=(self.access_key, self.access_key_secret),
             files={"dataFile": json.dumps(request_obj)},
-            params={
-                "integrationId": self.integration_id,
-                "objectType": sink.sink.name,
-                "clientRequestId": str(self.clientRequestId),
-            },
+            params=params,
         )
         prepped = s.prepare_request(req)
+        self.rate_limiter.acquire()
         return self._send_request(prepped, request_kwargs={"timeout": self.run_time_args.http_timeout})
 
     def generate_rejected_message_from_record(self, record, error_reason, error_code, metric_type):
@@ -157,9 +163,13 @@ class GongUtils(HttpStream):
 
         Unexpected but transient exceptions (connection timeout, DNS resolution failed, etc..) are retried by default.
         """
-        self.clientRequestId = self.clientRequestId + 1
         return response.status_code == 429 or 500 <= response.status_code < 600
 
+    def backoff_time(self, response: requests.Response) -> Optional[float]:
+        # Retry-After of a throttled response also holds off the other requests in flight
+        backoff = self.rate_limiter.update_from_headers(response.headers)
+        return backoff if backoff else None
+
     ##############################################################################################
     # Dummy methods to satisfy the abstract class
 
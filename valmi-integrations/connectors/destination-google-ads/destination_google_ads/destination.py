@@ -78,8 +78,11 @@ class GoogleAdsWriter(DestinationWriteWrapper):
         return HandlerResponseData(flushed=flushed)
 
     def finalise_message_handling(self) -> None:
-        self.google_ads_utils.flush(sink=self.configured_destination_catalog.sinks[0])
-        self.google_ads_utils.submit_offline_jobs(sink=self.configured_destination_catalog.sinks[0])
+        try:
+            self.google_ads_utils.flush(sink=self.configured_destination_catalog.sinks[0])
+            self.google_ads_utils.submit_offline_jobs(sink=self.configured_destination_catalog.sinks[0])
+        finally:
+            self.google_ads_utils.shutdown_uploads()
 
 
 class DestinationGoogleAds(ValmiDestination):
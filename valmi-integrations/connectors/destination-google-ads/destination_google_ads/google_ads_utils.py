@@ -23,11 +23,10 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import hashlib
-
 from typing import Any, Mapping, Dict, List
 from airbyte_cdk import AirbyteLogger
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
 
 from valmi_connector_lib.valmi_protocol import (
@@ -35,6 +34,7 @@ from valmi_connector_lib.valmi_protocol import (
     ConfiguredValmiSink,
 )
 
+from valmi_connector_lib.common.identifier_hashing import IdentifierHasher
 from valmi_connector_lib.common.run_time_args import RunTimeArgs
 
 from google.ads.googleads.client import GoogleAdsClient
@@ -48,30 +48,48 @@ RETRY_SECONDS = 30
 
 MAX_CHUNK_SIZE = 3000  # limit is (10000/(3 identifies)) for a single job request
 
+# Uploads of a job waiting in the background, beyond which flush waits for the oldest one.
+MAX_PENDING_UPLOADS = 2
+
+ADDRESS_REQUIRED_KEYS = ("last_name", "country_code", "postal_code")
+
 
-def normalize_and_hash(s: str, remove_all_whitespace: bool) -> str:
-    """Normalizes and hashes a string with SHA-256.
+def normalize(s: str, remove_all_whitespace: bool) -> str:
+    """Normalizes a string, lowercase and without whitespace.
 
     Args:
         s: The string to perform this operation on.
         remove_all_whitespace: If true, removes leading, trailing, and
-            intermediate spaces from the string before hashing. If false, only
-            removes leading and trailing spaces from the string before hashing.
+            intermediate spaces from the string. If false, only
+            removes leading and trailing spaces from the string.
 
     Returns:
-        A normalized (lowercase, remove whitespace) and SHA-256 hashed string.
+        A normalized (lowercase, remove whitespace) string.
     """
-    # Normalizes by first converting all characters to lowercase, then trimming
-    # spaces.
     if remove_all_whitespace:
         # Removes leading, trailing, and intermediate whitespace.
         s = "".join(s.split())
     else:
         # Removes only leading and trailing spaces.
-        s = s.strip().lower()
+        s = s.strip()
+    return s.lower()
+
+
+def normalize_identifier(s: str) -> str:
+    return normalize(s, True)
 
-    # Hashes the normalized string using the hashing algorithm.
-    return hashlib.sha256(s.encode()).hexdigest()
+
+def normalize_name(s: str) -> str:
+    return normalize(s, False)
+
+
+# identifier fields of a record that are hashed, with their normalization
+HASHED_FIELDS = {
+    "email": normalize_identifier,
+    "phone": normalize_identifier,
+    "first_name": normalize_name,
+    "last_name": normalize_name,
+}
 
 
 class GoogleAdsUtils:
@@ -88,6 +106,13 @@ class GoogleAdsUtils:
         self.num_identifiers: dict[str, int] = defaultdict(lambda: 0)
         self.offline_user_data_job_resource_names: dict[str, str] = defaultdict(str)
         self.operations: dict[str, list[Any]] = defaultdict(list)
+        # records are turned into operations at flush, so that their identifiers are hashed together
+        self.records: dict[str, list[Mapping[str, Any]]] = defaultdict(list)
+        self.hasher = IdentifierHasher()
+        # Operations are added to a job one request at a time and in order, as concurrent requests on a job
+        # fail with CONCURRENT_MODIFICATION. The delete job and the create job are uploaded to concurrently.
+        self.upload_executors = {op: ThreadPoolExecutor(max_workers=1) for op in ("delete", "create")}
+        self.pending_uploads: dict[str, deque] = defaultdict(deque)
 
         # Max cap on chunk size
         self.chunk_size = MAX_CHUNK_SIZE
@@ -219,8 +244,44 @@ class GoogleAdsUtils:
 
         return client_to_manager
 
-    def prepare_user_data_from_record(self, record: Mapping[str, Any]) -> Any:
+    def has_address(self, record: Mapping[str, Any]) -> bool:
+        # Checks if the record has all the required mailing address elements.
+        return "first_name" in record and all(key in record for key in ADDRESS_REQUIRED_KEYS)
+
+    def count_user_identifiers(self, record: Mapping[str, Any]) -> int:
+        num_identifiers = int("email" in record) + int("phone" in record)
+        if "first_name" in record:
+            if self.has_address(record):
+                num_identifiers += 1
+            else:
+                # Determines which required elements are missing from the
+                # record.
+                missing_keys = record.keys() - ADDRESS_REQUIRED_KEYS
+                self.logger.info(
+                    "Skipping addition of mailing address information "
+                    "because the following required keys are missing: "
+                    f"{missing_keys}"
+                )
+        return num_identifiers
+
+    def hash_identifiers(self, records: List[Mapping[str, Any]]) -> Dict[str, List[str]]:
+        """Hashes the identifier fields of the records a field at a time.
+
+        Returns:
+            The hashes of every identifier field, in the order of the records.
+        """
+        hashes = {}
+        for field, normalize_fn in HASHED_FIELDS.items():
+            if field in ("first_name", "last_name"):
+                values = [record[field] if self.has_address(record) else None for record in records]
+            else:
+                values = [record.get(field) for record in records]
+            hashes[field] = self.hasher.hash_column(field, values, normalize=normalize_fn)
+        return hashes
+
+    def prepare_user_data_from_record(self, record: Mapping[str, Any], hashes: Mapping[str, str]) -> Any:
         # Creates a UserData object that represents a member of the user list.
+        # hashes holds the hashed identifier fields of the record.
         user_data = self.client.get_type("UserData")
 
         # Checks if the record has email, phone, or address information, and
@@ -250,9 +311,7 @@ class GoogleAdsUtils:
         # UserIdentifier for it.
         if "email" in record:
             user_identifier = self.client.get_type("UserIdentifier")
-            user_identifier.hashed_email = normalize_and_hash(
-                record["email"], True
-            )
+            user_identifier.hashed_email = hashes["email"]
             # Adds the hashed email identifier to the UserData object's list.
             user_data.user_identifiers.append(user_identifier)
 
@@ -260,43 +319,37 @@ class GoogleAdsUtils:
         # UserIdentifier for it.
         if "phone" in record:
             user_identifier = self.client.get_type("UserIdentifier")
-            user_identifier.hashed_phone_number = normalize_and_hash(
-                record["phone"], True
-            )
+            user_identifier.hashed_phone_number = hashes["phone"]
             # Adds the hashed phone number identifier to the UserData object's
             # list.
             user_data.user_identifiers.append(user_identifier)
 
         # Checks if the record has all the required mailing address elements,
         # and if so, adds a UserIdentifier for the mailing address.
-        if "first_name" in record:
-            required_keys = ("last_name", "country_code", "postal_code")
-            # Checks if the record contains all the other required elements of
-            # a mailing address.
-            if not all(key in record for key in required_keys):
-                # Determines which required elements are missing from the
-                # record.
-                missing_keys = record.keys() - required_keys
-                self.logger.info(
-                    "Skipping addition of mailing address information "
-                    "because the following required keys are missing: "
-                    f"{missing_keys}"
-                )
-            else:
-                user_identifier = self.client.get_type("UserIdentifier")
-                address_info = user_identifier.address_info
-                address_info.hashed_first_name = normalize_and_hash(
-                    record["first_name"], False
-                )
-                address_info.hashed_last_name = normalize_and_hash(
-                    record["last_name"], False
-                )
-                address_info.country_code = record["country_code"]
-                address_info.postal_code = record["postal_code"]
-                user_data.user_identifiers.append(user_identifier)
+        if self.has_address(record):
+            user_identifier = self.client.get_type("UserIdentifier")
+            address_info = user_identifier.address_info
+            address_info.hashed_first_name = hashes["first_name"]
+            address_info.hashed_last_name = hashes["last_name"]
+            address_info.country_code = record["country_code"]
+            address_info.postal_code = record["postal_code"]
+            user_data.user_identifiers.append(user_identifier)
 
         return user_data
 
+    def prepare_operations(self, op: str, records: List[Mapping[str, Any]]) -> List[Any]:
+        hashes = self.hash_identifiers(records)
+        operations = []
+        for idx, record in enumerate(records):
+            user_data = self.prepare_user_data_from_record(record, {field: hashes[field][idx] for field in hashes})
+            operation = self.client.get_type("OfflineUserDataJobOperation")
+            if op == "delete":
+                operation.remove = user_data
+            else:
+                operation.create = user_data
+            operations.append(operation)
+        return operations
+
     def add_to_queue(self, 
                      data: Mapping[str, Any], 
                      configured_stream: ValmiStream, 
@@ -305,22 +358,21 @@ class GoogleAdsUtils:
         # At max 20 identifiers can be added to a user data object.
         # Ref: https://developers.google.com/google-ads/api/docs/remarketing/audience-types/customer-match#customer_match_considerations
 
-        user_data = self.prepare_user_data_from_record(data)
-        self.logger.info(f"Adding user data: {user_data}")
+        # fails the sync with the first record after a background upload failed, not at the next flush
+        for op in self.pending_uploads:
+            self.check_uploads(op)
 
-        if user_data.user_identifiers:
-            operation = self.client.get_type("OfflineUserDataJobOperation")
+        num_identifiers = self.count_user_identifiers(data)
+
+        if num_identifiers:
             sync_op = data["_valmi_meta"]["_valmi_sync_op"]
-            self.num_identifiers[sync_op] += len(user_data.user_identifiers)
+            self.num_identifiers[sync_op] += num_identifiers
 
-            if sync_op == "delete":
-                operation.remove = user_data
-            else:
-                operation.create = user_data
+            if sync_op != "delete":
                 # Treating all other operations as create ( operation.create will handle update and insert )
                 sync_op = "create"
 
-            self.operations[sync_op].append(operation)
+            self.records[sync_op].append(data)
 
             # Check if any of the `delete` or `upsert` operations reaches max_identifiers limit 
             # we will publish them
@@ -439,18 +491,14 @@ class GoogleAdsUtils:
         # It will be in the format : customers/{customer_id}/userLists/{user_list_id}
         customer_id = sink.sink.name.split("/")[1]
 
-        quota_error_enum = self.client.get_type("QuotaErrorEnum").QuotaError
-        resource_exhausted = quota_error_enum.RESOURCE_EXHAUSTED
-        temp_resource_exhausted = quota_error_enum.RESOURCE_TEMPORARILY_EXHAUSTED
-
-        # This will be thrown when two or more jobs are running on same user list resource
-        database_error_enum = self.client.get_type("DatabaseErrorEnum").DatabaseError
-        concurrent_modification = database_error_enum.CONCURRENT_MODIFICATION
-
         # We will send `delete` and `upsert` operations in separate `OfflineUserDataJob`
         # Delete actions will be performed first and then `upsert` actions
         ops = ["delete", "create"]
         for op in ops:
+            if self.records[op]:
+                self.operations[op].extend(self.prepare_operations(op, self.records[op]))
+                self.records[op] = []
+
             self.logger.info(f"{len(self.operations[op])} Operations for {op}")
 
             if not len(self.operations[op]):
@@ -464,63 +512,100 @@ class GoogleAdsUtils:
                 )
                 self.offline_user_data_job_resource_names[op] = offline_user_data_job_resource_name
 
-            try:
-                retry_count = 0
-                retry_seconds = RETRY_SECONDS
+            # The operations are added to the job in the background, while the next records are buffered.
+            job_operations = self.operations[op]
+            self.operations[op] = []
+            pending_uploads = self.pending_uploads[op]
+            pending_uploads.append(
+                self.upload_executors[op].submit(
+                    self.upload_operations, op, offline_user_data_job_resource_name, job_operations
+                )
+            )
 
-                while retry_count < NUM_RETRIES:
-                    try:
-                        job_operations = self.operations[op]
+            # Bounds the operations held in memory.
+            while len(pending_uploads) > MAX_PENDING_UPLOADS:
+                pending_uploads.popleft().result()
+            self.check_uploads(op)
 
-                        self.logger.info(f"Retry count: {retry_count} for {op}")
-                        self.request_offline_user_data_job(
-                            offline_user_data_job_resource_name, job_operations
-                        )
-                        self.operations[op] = []
-                        break
-
-                    except GoogleAdsException as ex:
-                        retrying = False
-                        self.logger.info(f"GoogleAdsException: {ex}")
-                        for googleads_error in ex.failure.errors:
-                            # Checks if any of the errors are
-                            # QuotaError.RESOURCE_EXHAUSTED or
-                            # QuotaError.RESOURCE_TEMPORARILY_EXHAUSTED or
-                            # DatabaseError.CONCURRENT_MODIFICATION
-                            quota_error = googleads_error.error_code.quota_error
-                            database_error = googleads_error.error_code.database_error
-
-                            if (
-                                quota_error == resource_exhausted
-                                or quota_error == temp_resource_exhausted
-                                or database_error == concurrent_modification
-                            ):
-                                self.logger.info(
-                                    "Received rate exceeded error/concurrent modification error, retry after"
-                                    f"{retry_seconds} seconds."
-                                )
-                                sleep(retry_seconds)
-                                retrying = True
-                                retry_count += 1
-                                # Here exponential backoff is employed to ensure
-                                # the account doesn't get rate limited by making
-                                # too many requests too quickly. This increases the
-                                # time to wait between requests by a factor of 2.
-                                retry_seconds *= 2
-                                break
-                        # Bubbles up when there is not a RateExceededError
-                        if not retrying:
-                            raise ex
-                    finally:
-                        if retry_count == NUM_RETRIES:
-                            raise Exception(
-                                "Could not recover after making "
-                                f"{retry_count} attempts."
+    def upload_operations(self, op: str, offline_user_data_job_resource_name: str, job_operations: list[Any]) -> None:
+        quota_error_enum = self.client.get_type("QuotaErrorEnum").QuotaError
+        resource_exhausted = quota_error_enum.RESOURCE_EXHAUSTED
+        temp_resource_exhausted = quota_error_enum.RESOURCE_TEMPORARILY_EXHAUSTED
+
+        # This will be thrown when two or more jobs are running on same user list resource
+        database_error_enum = self.client.get_type("DatabaseErrorEnum").DatabaseError
+        concurrent_modification = database_error_enum.CONCURRENT_MODIFICATION
+
+        try:
+            retry_count = 0
+            retry_seconds = RETRY_SECONDS
+
+            while retry_count < NUM_RETRIES:
+                try:
+                    self.logger.info(f"Retry count: {retry_count} for {op}")
+                    self.request_offline_user_data_job(
+                        offline_user_data_job_resource_name, job_operations
+                    )
+                    break
+
+                except GoogleAdsException as ex:
+                    retrying = False
+                    self.logger.info(f"GoogleAdsException: {ex}")
+                    for googleads_error in ex.failure.errors:
+                        # Checks if any of the errors are
+                        # QuotaError.RESOURCE_EXHAUSTED or
+                        # QuotaError.RESOURCE_TEMPORARILY_EXHAUSTED or
+                        # DatabaseError.CONCURRENT_MODIFICATION
+                        quota_error = googleads_error.error_code.quota_error
+                        database_error = googleads_error.error_code.database_error
+
+                        if (
+                            quota_error == resource_exhausted
+                            or quota_error == temp_resource_exhausted
+                            or database_error == concurrent_modification
+                        ):
+                            self.logger.info(
+                                "Received rate exceeded error/concurrent modification error, retry after"
+                                f"{retry_seconds} seconds."
                             )
-            except Exception as ex:
-                # Prints any unhandled exception and bubbles up.
-                self.logger.info(f"Failed to validate keywords: {ex}")
-                raise ex
+                            sleep(retry_seconds)
+                            retrying = True
+                            retry_count += 1
+                            # Here exponential backoff is employed to ensure
+                            # the account doesn't get rate limited by making
+                            # too many requests too quickly. This increases the
+                            # time to wait between requests by a factor of 2.
+                            retry_seconds *= 2
+                            break
+                    # Bubbles up when there is not a RateExceededError
+                    if not retrying:
+                        raise ex
+                finally:
+                    if retry_count == NUM_RETRIES:
+                        raise Exception(
+                            "Could not recover after making "
+                            f"{retry_count} attempts."
+                        )
+        except Exception as ex:
+            # Prints any unhandled exception and bubbles up.
+            self.logger.info(f"Failed to validate keywords: {ex}")
+            raise ex
+
+    def check_uploads(self, op: str) -> None:
+        # surfaces the failures of finished uploads, the uploads of an operation finish in order
+        pending_uploads = self.pending_uploads[op]
+        while pending_uploads and pending_uploads[0].done():
+            pending_uploads.popleft().result()
+
+    def wait_for_uploads(self, op: str) -> None:
+        pending_uploads = self.pending_uploads[op]
+        while pending_uploads:
+            pending_uploads.popleft().result()
+
+    def shutdown_uploads(self) -> None:
+        # uploads queued behind a failed one are dropped
+        for upload_executor in self.upload_executors.values():
+            upload_executor.shutdown(wait=True, cancel_futures=True)
 
     def check_job_status(self, customer_id, offline_user_data_job_resource_name):
         """Retrieves, checks, and prints the status of the offline user data job.
@@ -624,8 +709,10 @@ class GoogleAdsUtils:
         )
 
         # Submit delete operations
+        # The create operations keep uploading while the delete job runs.
         delete_job_resource_name = self.offline_user_data_job_resource_names.get("delete", None)
         if delete_job_resource_name:
+            self.wait_for_uploads("delete")
             self.logger.info(f"Offline user data job for delete operations: {delete_job_resource_name}")
 
             # Issues a request to run the offline user data job for executing all
@@ -643,6 +730,7 @@ class GoogleAdsUtils:
         # Submit create operations
         create_job_resource_name = self.offline_user_data_job_resource_names.get("create", None)
         if create_job_resource_name:
+            self.wait_for_uploads("create")
             self.logger.info(f"Offline user data job for create operations: {create_job_resource_name}")
             request_response = offline_user_data_job_service_client.run_offline_user_data_job(
                 resource_name=create_job_resource_name
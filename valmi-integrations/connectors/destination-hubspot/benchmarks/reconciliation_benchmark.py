@@ -0,0 +1,122 @@
+"""
+Copyright (c) 2023 valmi.io <https://github.com/valmi-io>
+
+Created Date: Sunday, October 18th 2026, 10:12:41 am
+Author: Rajashekar Varkala @ valmi.io
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Compares the dict index reconciliation of a HubSpot batch with the list scans it replaced,
+# on large synthetic batches. Run from the connector directory:
+#   python benchmarks/reconciliation_benchmark.py
+
+import copy
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from destination_hubspot.hubspot_utils import HubspotClient  # noqa: E402
+
+BATCH_SIZES = [100, 1000, 5000]
+REPEAT = 3
+
+
+def list_scan_split_batch(client, sink, buffer, original_records, absent_ids):
+    # the nested loops over the batch and the absent ids, as they were before the dict indexes
+    create_objs = []
+    create_original_records = []
+    update_objs = []
+    update_original_records = []
+
+    for idx, element in enumerate(buffer):
+        for absent_obj in absent_ids:
+            id_key = client.get_id_from_buffer_obj(element, sink)
+            if id_key == absent_obj[0]:
+                create_objs.append(element)
+                create_original_records.append((original_records[idx], absent_obj,))
+                break
+
+    for idx, element in enumerate(buffer):
+        update = True
+        for absent_obj in absent_ids:
+            id_key = client.get_id_from_buffer_obj(element, sink)
+            if id_key == absent_obj[0]:
+                update = False
+        if update:
+            update_objs.append(element)
+            update_original_records.append(original_records[idx])
+    return create_objs, create_original_records, update_objs, update_original_records
+
+
+def list_scan_insert_ids_into_obj_buffer(resp_json, sink, buffer):
+    for element in buffer:
+        for result in resp_json["results"]:
+            if sink.destination_id == "id":
+                continue
+            if element["properties"][sink.destination_id] == result["properties"][sink.destination_id]:
+                element["id"] = result["id"]
+                break
+
+
+def synthetic_batch(batch_size):
+    # half of the objects are missing in hubspot, the other half is returned by the batch read
+    buffer = [{"properties": {"email": f"user{i}@example.com"}} for i in range(batch_size)]
+    original_records = list(range(batch_size))
+    absent_ids = [(f"user{i}@example.com", "OBJECT_NOT_FOUND", "not found") for i in range(0, batch_size, 2)]
+    resp_json = {
+        "results": [{"id": str(i), "properties": {"email": f"user{i}@example.com"}} for i in range(1, batch_size, 2)]
+    }
+    return buffer, original_records, absent_ids, resp_json
+
+
+def best_of(fn):
+    return min(timeit.repeat(fn, number=1, repeat=REPEAT))
+
+
+def main():
+    # the reconciliation does not touch the state of the client
+    client = HubspotClient.__new__(HubspotClient)
+    sink = SimpleNamespace(destination_id="email")
+
+    print(f"{'batch':>8} {'split list':>12} {'split dict':>12} {'ids list':>12} {'ids dict':>12}")
+    for batch_size in BATCH_SIZES:
+        buffer, original_records, absent_ids, resp_json = synthetic_batch(batch_size)
+
+        # both implementations reconcile the batch the same way
+        assert list_scan_split_batch(client, sink, buffer, original_records, absent_ids) \
+            == client.split_batch(sink, buffer, original_records, absent_ids)
+        list_buffer = copy.deepcopy(buffer)
+        dict_buffer = copy.deepcopy(buffer)
+        list_scan_insert_ids_into_obj_buffer(resp_json, sink, list_buffer)
+        client.insert_ids_into_obj_buffer(resp_json, sink, dict_buffer)
+        assert list_buffer == dict_buffer
+
+        split_list = best_of(lambda: list_scan_split_batch(client, sink, buffer, original_records, absent_ids))
+        split_dict = best_of(lambda: client.split_batch(sink, buffer, original_records, absent_ids))
+        ids_list = best_of(lambda: list_scan_insert_ids_into_obj_buffer(resp_json, sink, buffer))
+        ids_dict = best_of(lambda: client.insert_ids_into_obj_buffer(resp_json, sink, buffer))
+        print(f"{batch_size:>8} {split_list:>12.4f} {split_dict:>12.4f} {ids_list:>12.4f} {ids_dict:>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
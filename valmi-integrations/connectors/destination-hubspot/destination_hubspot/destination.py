@@ -24,6 +24,7 @@ SOFTWARE.
 """
 
 
+import asyncio
 import json
 from typing import Any, Dict, Iterable, Mapping
 
@@ -36,16 +37,35 @@ from valmi_connector_lib.valmi_protocol import (
     ConfiguredValmiDestinationCatalog,
 )
 from valmi_connector_lib.valmi_destination import ValmiDestination
-from .hubspot_utils import HubspotClient
-from valmi_connector_lib.destination_wrapper.destination_write_wrapper import DestinationWriteWrapper, HandlerResponseData
+from .hubspot_utils import HubspotClient, MAX_BATCHES_IN_FLIGHT
+from valmi_connector_lib.common.metrics import get_metric_type
+from valmi_connector_lib.destination_wrapper.destination_write_wrapper import (
+    AsyncDestinationWriteWrapper,
+    HandlerResponseData,
+)
+
+
+class HubspotWriter(AsyncDestinationWriteWrapper):
+    '''
+    Batches are flushed as they fill up, while the next batches are being buffered, so the batch read of a
+    batch overlaps the batch create and update of the previous ones. The wrapper emits the responses in
+    record order, so the metrics and rejected records of a chunk still come before its STATE message.
+    '''
 
+    def __init__(self, *args, **kwargs):
+        super(HubspotWriter, self).__init__(*args, **kwargs)
+        # records waiting for their batch to be flushed are in flight too
+        self.max_in_flight = MAX_BATCHES_IN_FLIGHT * HubspotClient.max_items_in_batch
+        # but only the batches being flushed take a thread
+        self.max_blocking_calls = MAX_BATCHES_IN_FLIGHT
 
-class HubspotWriter(DestinationWriteWrapper):
     def initialise_message_handling(self):
         self.hub_client = HubspotClient(run_time_args=self.run_time_args)
-        self.last_seen_sync_op = None   
+        self.last_seen_sync_op = None
+        # destination ids of the batches being flushed, by the task flushing them
+        self.batches_in_flight = {}
 
-    def handle_message(
+    async def handle_message(
         self,
         msg,
         counter,
@@ -53,13 +73,33 @@ class HubspotWriter(DestinationWriteWrapper):
 
         sync_op = msg.record.data["_valmi_meta"]["_valmi_sync_op"]
         self.last_seen_sync_op = sync_op
-        flushed, metrics, rejected_records = self.hub_client.add_to_queue(
-            sync_op, counter, msg, self.config,
+        sink = self.configured_destination_catalog.sinks[0]
+        should_flush = self.hub_client.add_to_queue(
+            sync_op, counter, msg,
             configured_stream=self.configured_catalog.streams[0],
-            sink=self.configured_destination_catalog.sinks[0])
+            sink=sink)
+        if not should_flush:
+            return HandlerResponseData(flushed=False, metrics={get_metric_type(sync_op): 0}, emittable_records=[])
 
+        flushed, metrics, rejected_records = await self.flush_batch(sync_op, *self.hub_client.take_batch())
         return HandlerResponseData(flushed=flushed, metrics=metrics, emittable_records=rejected_records)
 
+    async def flush_batch(self, sync_op, buffer, original_records):
+        sink = self.configured_destination_catalog.sinks[0]
+        keys = set(self.hub_client.get_id_from_buffer_obj(element, sink) for element in buffer)
+
+        # a batch creating an object has to finish before the batch read of a later batch with the same object
+        depends_on = [task for task, batch_keys in self.batches_in_flight.items() if not keys.isdisjoint(batch_keys)]
+        task = asyncio.current_task()
+        self.batches_in_flight[task] = keys
+        try:
+            if depends_on:
+                await asyncio.wait(depends_on)
+            return await self.run_blocking(self.hub_client.flush_batch,
+                                           sync_op, self.config, sink, buffer, original_records)
+        finally:
+            del self.batches_in_flight[task]
+
     def finalise_message_handling(self):
         flushed, metrics, rejected_records = self.hub_client.flush(self.last_seen_sync_op, config=self.config, sink=self.configured_destination_catalog.sinks[0])
         return HandlerResponseData(flushed=flushed, metrics=metrics, emittable_records=rejected_records)
@@ -2,6 +2,7 @@ from typing import Any, Iterable, List, Mapping, Optional, Union
 from airbyte_cdk.sources.streams.http.http import HttpStream
 from requests import Request, Session
 import requests
+from valmi_connector_lib.common.rate_limiter import RateLimiter
 from valmi_connector_lib.common.run_time_args import RunTimeArgs
 
 class UnsupportedMethodException(Exception):
@@ -9,15 +10,26 @@ class UnsupportedMethodException(Exception):
 
 
 class HttpSink(HttpStream):
-    def __init__(self, run_time_args: RunTimeArgs):
+    def __init__(self, run_time_args: RunTimeArgs, rate_limiter: RateLimiter = None):
         super().__init__(None)
         self.run_time_args = run_time_args
+        self.rate_limiter = rate_limiter
 
     @property
     def max_retries(self) -> Union[int, None]:
         return self.run_time_args.max_retries
 
+    def backoff_time(self, response: requests.Response) -> Optional[float]:
+        # Retry-After of a throttled response also holds off the other requests sharing the limiter
+        if self.rate_limiter is not None:
+            backoff = self.rate_limiter.update_from_headers(response.headers)
+            if backoff:
+                return backoff
+        return None
+
     def send(self, method, url, data, json, headers, auth):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
         s = Session()
         req = Request(method, url, data=data, json=json, headers=headers, auth=auth)
         prepped = s.prepare_request(req)
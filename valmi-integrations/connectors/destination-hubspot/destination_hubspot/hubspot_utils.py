@@ -1,10 +1,13 @@
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import threading
 from typing import Any, Dict, Mapping
 
 from airbyte_cdk import AirbyteLogger
 import requests
 
+from valmi_connector_lib.common.rate_limiter import RateLimiter
 from valmi_connector_lib.common.run_time_args import RunTimeArgs
 from .http_sink import HttpSink
 from .retry_decorators import retry_on_exception, retry_on_unauthorized_exception, RequestUnAuthorizedException
@@ -26,6 +29,11 @@ logger = AirbyteLogger()
 
 API_URL = "https://api.hubapi.com"
 REQ_TIMEOUT = 15
+# hubspot allows 100 requests every 10 seconds for an account
+REQUESTS_PER_SECOND = 10
+REQUESTS_BURST = 10
+# batches whose read, create and update calls overlap
+MAX_BATCHES_IN_FLIGHT = 4
 
 
 class HubspotClient:
@@ -64,8 +72,12 @@ class HubspotClient:
     def __init__(self, run_time_args: RunTimeArgs, *args, **kwargs):
         self.buffer = []
         self.original_records = []
-        self.http_sink = HttpSink(run_time_args=run_time_args)
+        self.http_sink = HttpSink(run_time_args=run_time_args,
+                                  rate_limiter=RateLimiter(REQUESTS_PER_SECOND, burst=REQUESTS_BURST))
         self.run_time_args = run_time_args
+        # batch create and batch update of a flush do not depend on each other
+        self.executor = ThreadPoolExecutor(max_workers=2 * MAX_BATCHES_IN_FLIGHT)
+        self.access_token_lock = threading.Lock()
 
     def map_data(self, configured_stream: ValmiStream, sink: ConfiguredValmiSink, mapping: list[Dict[str, str]], data: Dict[str, Any]):
         mapped_data = {}
@@ -82,6 +94,11 @@ class HubspotClient:
         return self.get_access_token(config)
     
     def get_access_token(self, config: Mapping[str, Any]):
+        # batches in flight share the token
+        with self.access_token_lock:
+            self.refresh_access_token(config)
+
+    def refresh_access_token(self, config: Mapping[str, Any]):
         if (
             self.access_token_created_at is not None
             and self.access_token_expires_in is not None
@@ -104,10 +121,12 @@ class HubspotClient:
 
     def add_to_queue(
         self, sync_op, counter, msg,
-        config: Mapping[Dict, Any],
         configured_stream: ValmiStream,
         sink: ConfiguredValmiSink
     ) -> bool:
+        '''
+        Returns True when the buffered batch has to be flushed.
+        '''
         obj = self.map_data(configured_stream, sink, sink.mapping, msg.record.data)
         
         props = {"properties": obj}
@@ -118,13 +137,19 @@ class HubspotClient:
         self.buffer.append(props)
         self.original_records.append(msg)
 
-        flushed = False
-        metrics = {get_metric_type(sync_op): 0}
-        rejected_records = []
+        return len(self.buffer) >= self.max_items_in_batch or counter % self.run_time_args.chunk_size == 0
 
-        if len(self.buffer) >= self.max_items_in_batch or counter % self.run_time_args.chunk_size == 0:
-            flushed, metrics, rejected_records = self.flush(sync_op, config, sink)
-        return flushed, metrics, rejected_records
+    def take_batch(self):
+        buffer, original_records = self.buffer, self.original_records
+        self.buffer = []
+        self.original_records = []
+        return buffer, original_records
+
+    def flush(self, sync_op, config: Mapping[Dict, Any], sink: ConfiguredValmiSink):
+        buffer, original_records = self.take_batch()
+        if not buffer:
+            return True, {}, []
+        return self.flush_batch(sync_op, config, sink, buffer, original_records)
     
     '''
     Sample Response
@@ -186,9 +211,9 @@ class HubspotClient:
         "completedAt": "2023-05-30T16:56:07.403Z"
     }
     '''
-    def get_objects(self, sink):
+    def get_objects(self, sink, buffer):
         ids = []
-        for element in self.buffer:
+        for element in buffer:
             ids.append(element["properties"][sink.destination_id])
 
         # TEST: if id is used as destination_id, then do we need to fetch the id from the properties?
@@ -213,11 +238,11 @@ class HubspotClient:
         if (resp.status_code == 200):
             absent_ids = []
             resp_json = resp.json()
-            self.insert_ids_into_obj_buffer(resp_json, sink)
+            self.insert_ids_into_obj_buffer(resp_json, sink, buffer)
 
         elif (resp.status_code == 207):
             resp_json = resp.json()
-            self.insert_ids_into_obj_buffer(resp_json, sink)
+            self.insert_ids_into_obj_buffer(resp_json, sink, buffer)
 
             if resp_json["numErrors"] > 0:
                 for error in resp_json["errors"]:
@@ -230,15 +255,17 @@ class HubspotClient:
             raise RequestUnAuthorizedException("Unauthorized")
         return absent_ids
 
-    def insert_ids_into_obj_buffer(self, resp_json, sink):
-        for element in self.buffer:
-            for result in resp_json["results"]:
-                if sink.destination_id == "id":
-                    # id is already part of the buffer object
-                    continue
-                if element["properties"][sink.destination_id] == result["properties"][sink.destination_id]:
-                    element["id"] = result["id"]
-                    break
+    def insert_ids_into_obj_buffer(self, resp_json, sink, buffer):
+        if sink.destination_id == "id":
+            # id is already part of the buffer object
+            return
+        ids = {}
+        for result in resp_json["results"]:
+            ids.setdefault(result["properties"][sink.destination_id], result["id"])
+        for element in buffer:
+            key = element["properties"][sink.destination_id]
+            if key in ids:
+                element["id"] = ids[key]
 
     def generate_rejected_message_from_record(self, record, error_code, error_msg, metric_type):
         return ValmiFinalisedRecordMessage(
@@ -260,6 +287,34 @@ class HubspotClient:
             id_key = element["properties"][sink.destination_id]
         return id_key
 
+    def index_by_key(self, objs, key_fn):
+        # positions of the batch objects by their key, the same key can occur more than once in a batch
+        indexes = defaultdict(list)
+        for idx, element in enumerate(objs):
+            indexes[key_fn(element)].append(idx)
+        return indexes
+
+    def split_batch(self, sink: ConfiguredValmiSink, buffer, original_records, absent_ids):
+        # objects missing in hubspot are created, the others are updated
+        create_objs = []
+        create_original_records = []
+        update_objs = []
+        update_original_records = []
+
+        absent_objs = {}
+        for absent_obj in absent_ids:
+            absent_objs.setdefault(absent_obj[0], absent_obj)
+
+        for idx, element in enumerate(buffer):
+            absent_obj = absent_objs.get(self.get_id_from_buffer_obj(element, sink))
+            if absent_obj is not None:
+                create_objs.append(element)
+                create_original_records.append((original_records[idx], absent_obj,))
+            else:
+                update_objs.append(element)
+                update_original_records.append(original_records[idx])
+        return create_objs, create_original_records, update_objs, update_original_records
+
     def merge_metric_dictionaries(self, m1, m2):
         for k, v in m1.items():
             if k in m2:
@@ -270,7 +325,7 @@ class HubspotClient:
 
     # RETRYING specifically for 401. Other retries are covered in http_sink.
     @retry_on_unauthorized_exception
-    def flush(self, sync_op, config: Mapping[Dict, Any], sink: ConfiguredValmiSink):
+    def flush_batch(self, sync_op, config: Mapping[Dict, Any], sink: ConfiguredValmiSink, buffer, original_records):
 
         self.get_access_token(config)
                 
@@ -280,81 +335,67 @@ class HubspotClient:
 
         # Do sanity checks on email ids
         if sink.destination_id == "email":
-            self.new_buffer = []
-            self.new_original_records = []
-            for idx, element in enumerate(self.buffer):
+            new_buffer = []
+            new_original_records = []
+            for idx, element in enumerate(buffer):
                 try:
                     validate_email(element["properties"][sink.destination_id], test_environment=True)
                 except EmailNotValidError as e:
-                    rejected_records.append(self.generate_rejected_message_from_record(self.original_records[idx].record, "INVALID_EMAIL", str(e), get_metric_type("fail")))
+                    rejected_records.append(self.generate_rejected_message_from_record(original_records[idx].record,
+                                                                                       "INVALID_EMAIL",
+                                                                                       str(e),
+                                                                                       get_metric_type("fail")))
                     metrics[get_metric_type("fail")] += 1
                     continue
-                self.new_buffer.append(element)
-                self.new_original_records.append(self.original_records[idx])
-            self.buffer = self.new_buffer
-            self.original_records = self.new_original_records
+                new_buffer.append(element)
+                new_original_records.append(original_records[idx])
+            buffer = new_buffer
+            original_records = new_original_records
 
         """
         Get existing elements from Hubspot and split it into updateRecords and CreateRecords
         """
-        absent_ids = self.object_map()[sink.sink.name]["read_object_fn"](sink)
-        # logger.debug(json.dumps({"inputs": self.buffer}))
-
-        create_objs = []
-        create_original_records = []
-        update_objs = []
-        update_original_records = []
+        absent_ids = self.object_map()[sink.sink.name]["read_object_fn"](sink, buffer)
+        # logger.debug(json.dumps({"inputs": buffer}))
 
-        for idx, element in enumerate(self.buffer):
-            for absent_obj in absent_ids:
-                id_key = self.get_id_from_buffer_obj(element, sink)
-                if id_key == absent_obj[0]:
-                    create_objs.append(element)
-                    create_original_records.append((self.original_records[idx], absent_obj,))
-                    break
-
-        for idx, element in enumerate(self.buffer):
-            update = True
-            for absent_obj in absent_ids:
-                id_key = self.get_id_from_buffer_obj(element, sink)
-                if id_key == absent_obj[0]:
-                    update = False
-            if update:
-                update_objs.append(element)
-                update_original_records.append(self.original_records[idx])
+        create_objs, create_original_records, update_objs, update_original_records = \
+            self.split_batch(sink, buffer, original_records, absent_ids)
 
         """
         Operate on the batch for different sync operations
         """
         if sync_op == DestinationSyncMode.upsert.value:
+            futures = []
             if len(create_original_records) > 0:
-                flushed, new_metrics, new_rejected_records = self.handle_create(create_objs,
-                                                                                create_original_records,
-                                                                                config,
-                                                                                sink)
-                metrics = self.merge_metric_dictionaries(metrics, new_metrics)
-                rejected_records.extend(new_rejected_records)
-
+                futures.append(self.executor.submit(self.handle_create,
+                                                    create_objs,
+                                                    create_original_records,
+                                                    config,
+                                                    sink))
             if len(update_original_records) > 0:
-                flushed, new_metrics, new_rejected_records = self.handle_update(update_objs,
-                                                                                update_original_records,
-                                                                                config,
-                                                                                sink)
+                futures.append(self.executor.submit(self.handle_update,
+                                                    update_objs,
+                                                    update_original_records,
+                                                    config,
+                                                    sink))
+
+            # results are merged in submission order, so rejected records keep their order
+            for future in futures:
+                flushed, new_metrics, new_rejected_records = future.result()
                 metrics = self.merge_metric_dictionaries(metrics, new_metrics)
                 rejected_records.extend(new_rejected_records)
         elif sync_op == DestinationSyncMode.update.value:
             for idx, (original_record, ignored_obj) in enumerate(create_original_records):
                 rejected_records.append(self.generate_rejected_message_from_record(original_record.record,
                                                                                    ignored_obj[1],
-                                                                                   ignored_obj[2]), get_metric_type("ignore"))
+                                                                                   ignored_obj[2],
+                                                                                   get_metric_type("ignore")))
             metrics[get_metric_type("ignore")] += len(create_original_records)
             if len(update_original_records) > 0:
                 flushed, new_metrics, new_rejected_records = self.handle_update(update_objs, update_original_records, config, sink)
                 metrics = self.merge_metric_dictionaries(metrics, new_metrics)
                 rejected_records.extend(new_rejected_records)
 
-        self.buffer.clear()
-        self.original_records.clear()
         return flushed, metrics, rejected_records
 
     def handle_update(self, update_objs, update_original_records, config: Mapping[Dict, Any], sink: ConfiguredValmiSink):
@@ -373,13 +414,17 @@ class HubspotClient:
         if (resp.status_code == 207):
             resp_json = resp.json()
             if resp_json["numErrors"] > 0:
+                indexes = self.index_by_key(update_objs, lambda element: element["id"])
                 for error in resp_json["errors"]:
                     if error["status"] == "error":
+                        error_msg = f'{error["category"]} - {error["message"]}'
                         for ctxt_id in error["context"]["ids"]:
-                            for idx, element in enumerate(update_objs):
-                                if element["id"] == ctxt_id:
-                                    rejected_records.append(
-                                        self.generate_rejected_message_from_record(update_original_records[idx].record, error["category"], f'{error["category"]} - {error["message"]}', get_metric_type("fail")))
+                            for idx in indexes.get(ctxt_id, []):
+                                rejected_records.append(
+                                    self.generate_rejected_message_from_record(update_original_records[idx].record,
+                                                                               error["category"],
+                                                                               error_msg,
+                                                                               get_metric_type("fail")))
                                     
         elif (resp.status_code == 401):
             raise RequestUnAuthorizedException("Unauthorized")
@@ -405,14 +450,18 @@ class HubspotClient:
         if (resp.status_code == 207):
             resp_json = resp.json()
             if resp_json["numErrors"] > 0:
+                indexes = self.index_by_key(create_objs, lambda element: element["properties"][sink.destination_id])
                 for error in resp_json["errors"]:
                     if error["status"] == "error":
+                        error_msg = f'{error["category"]} - {error["message"]}'
                         for ctxt_id in error["context"]["ids"]:
-                            for idx, element in enumerate(create_objs):
-                                if element["properties"][sink.destination_id] == ctxt_id:
-                                    rejected_records.append(
-                                        self.generate_rejected_message_from_record(create_original_records[idx].record, error["category"], f'{error["category"]} - {error["message"]}'))
-                                        
+                            for idx in indexes.get(ctxt_id, []):
+                                rejected_records.append(
+                                    self.generate_rejected_message_from_record(create_original_records[idx][0].record,
+                                                                               error["category"],
+                                                                               error_msg,
+                                                                               get_metric_type("fail")))
+
         elif (resp.status_code == 401):
             raise RequestUnAuthorizedException("Unauthorized")
         
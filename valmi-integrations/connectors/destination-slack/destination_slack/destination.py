@@ -25,7 +25,6 @@ SOFTWARE.
 
 
 import json
-import time
 from typing import Any, Dict, Iterable, Mapping
 
 from airbyte_cdk import AirbyteLogger
@@ -42,11 +41,16 @@ from valmi_connector_lib.valmi_protocol import (
 from valmi_connector_lib.destination_wrapper.destination_write_wrapper import (
     DestinationWriteWrapper, HandlerResponseData)
 from valmi_connector_lib.common.metrics import get_metric_type
+from valmi_connector_lib.common.rate_limiter import RateLimiter
 from valmi_connector_lib.valmi_destination import ValmiDestination
 from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
 from .slack_utils import map_data
 import jinja2
 
+# slack lets 1 message per second into a channel
+MESSAGES_PER_SECOND = 1
+
 
 class SlackWriter(DestinationWriteWrapper):
     def initialise_message_handling(self):
@@ -58,6 +62,7 @@ class SlackWriter(DestinationWriteWrapper):
         
         environment = jinja2.Environment()
         self.template = environment.from_string(self.configured_destination_catalog.sinks[0].template_fields["message"])
+        self.rate_limiter = RateLimiter(MESSAGES_PER_SECOND)
 
     def handle_message(
         self,
@@ -73,19 +78,30 @@ class SlackWriter(DestinationWriteWrapper):
 
         message = self.template.render(mapped_data)
 
-        response = self.client.chat_postMessage(
-            channel=self.configured_destination_catalog.sinks[0].sink.name, text=message
-        )
+        response = self.post_message(message)
 
         if not response["ok"]:
             raise Exception(response["message"]["error"])
 
         metrics[get_metric_type(sync_op)] = 1
 
-        # slack lets 1 message per second
-        time.sleep(1)
         return HandlerResponseData(flushed=True, metrics=metrics, emittable_records=rejected_records)
 
+    def post_message(self, message):
+        retries = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                return self.client.chat_postMessage(
+                    channel=self.configured_destination_catalog.sinks[0].sink.name, text=message
+                )
+            except SlackApiError as e:
+                # rate limited, wait as long as slack asks for
+                if e.response.status_code != 429 or retries >= self.run_time_args.max_retries:
+                    raise e
+                self.rate_limiter.update_from_headers(e.response.headers)
+                retries = retries + 1
+
     def finalise_message_handling(self):
         pass
 
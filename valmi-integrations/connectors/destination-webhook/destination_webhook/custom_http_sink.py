@@ -23,14 +23,16 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, Iterable, List, Mapping, Optional, Union
 
 import requests
+from requests.adapters import HTTPAdapter
 from valmi_connector_lib.valmi_protocol import ConfiguredValmiDestinationCatalog
 from valmi_connector_lib.common.run_time_args import RunTimeArgs
 
 from airbyte_cdk.sources.streams.http.http import HttpStream
-from requests import Request, Session
+from requests import PreparedRequest, Request
 
 from flatten_json import flatten
 
@@ -40,9 +42,16 @@ class UnsupportedMethodException(Exception):
 
 
 class CustomHttpSink(HttpStream):
-    def __init__(self, run_time_args: RunTimeArgs):
+    def __init__(self, run_time_args: RunTimeArgs, max_in_flight: int = 1):
         super().__init__(None)
         self.run_time_args = run_time_args
+        self.max_in_flight = max_in_flight
+
+        # one keep-alive connection per request in flight, reused for the whole sync
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight) if max_in_flight > 1 else None
 
     @property
     def max_retries(self) -> Union[int, None]:
@@ -56,37 +65,80 @@ class CustomHttpSink(HttpStream):
         record_counter: int,
         run_time_args: RunTimeArgs,
     ):
-        headers = (
-            {header.split(":")[0].strip(): header.split(":")[1].strip() for header in config["headers"]}
-            if "headers" in config
-            else {}
-        )
+        self.send_all([self.prepare(config, catalog, json_data, record_counter)], run_time_args=run_time_args)
+
+    def prepare(
+        self,
+        config: Mapping[str, Any],
+        catalog: ConfiguredValmiDestinationCatalog,
+        json_data,
+        record_counter: int,
+    ) -> PreparedRequest:
         mapped_data = self.map_data(catalog.sinks[0].mapping, json_data)
 
         if config["method"] == "GET":
             mapped_data["_message_id"] = record_counter
             mapped_data["_sync_mode"] = catalog.sinks[0].destination_sync_mode.value
 
-            s = Session()
-            req = Request("GET", config["url"], params=flatten(mapped_data), headers=headers)
-            prepped = s.prepare_request(req)
-            self._send_request(prepped, request_kwargs={"timeout": run_time_args.http_timeout})
+            req = Request("GET", config["url"], params=flatten(mapped_data), headers=self.get_headers(config))
+            return self._session.prepare_request(req)
 
         elif config["method"] == "POST":
-            payload = {
-                "_message_id": record_counter,
-                "_sync_mode": catalog.sinks[0].destination_sync_mode.value,
-                "_type": "object",
-                "payload": mapped_data,
-            }
-
-            s = Session()
-            req = Request("POST", config["url"], json=payload, headers=headers)
-            prepped = s.prepare_request(req)
-            self._send_request(prepped, request_kwargs={"timeout": run_time_args.http_timeout})
+            payload = self.get_payload(catalog, mapped_data, record_counter)
+
+            req = Request("POST", config["url"], json=payload, headers=self.get_headers(config))
+            return self._session.prepare_request(req)
         else:
             raise UnsupportedMethodException("Method not supported - not one of GET or POST")
 
+    def prepare_batch(
+        self,
+        config: Mapping[str, Any],
+        catalog: ConfiguredValmiDestinationCatalog,
+        records: List[tuple],
+    ) -> PreparedRequest:
+        # records are (json_data, record_counter) tuples, posted as one array
+        if config["method"] != "POST":
+            raise UnsupportedMethodException("Batching is only supported for POST")
+
+        payload = [
+            self.get_payload(catalog, self.map_data(catalog.sinks[0].mapping, json_data), record_counter)
+            for json_data, record_counter in records
+        ]
+        req = Request("POST", config["url"], json=payload, headers=self.get_headers(config))
+        return self._session.prepare_request(req)
+
+    def send_all(self, prepped_requests: List[PreparedRequest], run_time_args: RunTimeArgs):
+        # up to max_in_flight requests at a time, the first failure in request order is raised
+        request_kwargs = {"timeout": run_time_args.http_timeout}
+        if self.executor is None:
+            for prepped in prepped_requests:
+                self._send_request(prepped, request_kwargs=request_kwargs)
+            return
+
+        futures = [self.executor.submit(self._send_request, prepped, request_kwargs) for prepped in prepped_requests]
+        for future in futures:
+            future.result()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    def get_headers(self, config: Mapping[str, Any]) -> Dict[str, str]:
+        return (
+            {header.split(":")[0].strip(): header.split(":")[1].strip() for header in config["headers"]}
+            if "headers" in config
+            else {}
+        )
+
+    def get_payload(self, catalog: ConfiguredValmiDestinationCatalog, mapped_data, record_counter: int):
+        return {
+            "_message_id": record_counter,
+            "_sync_mode": catalog.sinks[0].destination_sync_mode.value,
+            "_type": "object",
+            "payload": mapped_data,
+        }
+
     def map_data(self, mapping: list[Dict[str, str]], data: Dict[str, Any]):
         mapped_data = {}
         if "_valmi_meta" in data:
@@ -24,6 +24,7 @@ SOFTWARE.
 """
 
 
+from collections import defaultdict
 from datetime import datetime
 import json
 from typing import Any, Dict, Iterable, Mapping
@@ -36,7 +37,7 @@ from airbyte_cdk.models import (
     AirbyteMessage,
 )
 from airbyte_cdk.models.airbyte_protocol import Status
-from .custom_http_sink import CustomHttpSink
+from .custom_http_sink import CustomHttpSink, UnsupportedMethodException
 from valmi_connector_lib.valmi_protocol import (
     ValmiDestinationCatalog,
     ConfiguredValmiDestinationCatalog,
@@ -57,7 +58,13 @@ from urllib.parse import urlparse
 
 class WebhookWriter(DestinationWriteWrapper):
     def initialise_message_handling(self):
-        self.http_handler = CustomHttpSink(run_time_args=self.run_time_args)
+        self.batch_size = int(self.config["batch_size"]) if "batch_size" in self.config else 1
+        # fail before any record is read, not when the first batch is flushed
+        if self.batch_size > 1 and self.config["method"] != "POST":
+            raise UnsupportedMethodException("Batching is only supported for POST")
+        self.max_in_flight = int(self.config["max_in_flight"]) if "max_in_flight" in self.config else 1
+        self.http_handler = CustomHttpSink(run_time_args=self.run_time_args, max_in_flight=self.max_in_flight)
+        self.buffer = []
 
     def handle_message(
         self,
@@ -65,29 +72,54 @@ class WebhookWriter(DestinationWriteWrapper):
         counter,
     ) -> HandlerResponseData:
         # self.logger.info(f"Handling message {msg}")
+        self.buffer.append((msg, counter))
 
-        self.http_handler.handle(
-            self.config,
-            self.configured_destination_catalog,
-            msg.record.data,
-            counter,
-            run_time_args=self.run_time_args,
-        )
+        # everything in flight is delivered before the chunk end, where the wrapper commits the state
+        if len(self.buffer) >= self.batch_size * self.max_in_flight or counter % self.run_time_args.chunk_size == 0:
+            return self.flush()
 
         sync_op = msg.record.data["_valmi_meta"]["_valmi_sync_op"]
-        out_records = [
-            ValmiFinalisedRecordMessage(
-                stream=msg.record.stream,
-                data=msg.record.data,
-                rejected=False,
-                metric_type=get_metric_type(sync_op),
-                emitted_at=int(datetime.now().timestamp()) * 1000,
+        return HandlerResponseData(flushed=False, metrics={get_metric_type(sync_op): 0})
+
+    def flush(self) -> HandlerResponseData:
+        if self.batch_size > 1:
+            prepped_requests = [
+                self.http_handler.prepare_batch(
+                    self.config,
+                    self.configured_destination_catalog,
+                    [(msg.record.data, counter) for msg, counter in self.buffer[i:i + self.batch_size]],
+                )
+                for i in range(0, len(self.buffer), self.batch_size)
+            ]
+        else:
+            prepped_requests = [
+                self.http_handler.prepare(self.config, self.configured_destination_catalog, msg.record.data, counter)
+                for msg, counter in self.buffer
+            ]
+        self.http_handler.send_all(prepped_requests, run_time_args=self.run_time_args)
+
+        # accounted in the order of the records, whatever the order the requests completed in
+        metrics = defaultdict(lambda: 0)
+        out_records = []
+        for msg, counter in self.buffer:
+            metric_type = get_metric_type(msg.record.data["_valmi_meta"]["_valmi_sync_op"])
+            metrics[metric_type] += 1
+            out_records.append(
+                ValmiFinalisedRecordMessage(
+                    stream=msg.record.stream,
+                    data=msg.record.data,
+                    rejected=False,
+                    metric_type=metric_type,
+                    emitted_at=int(datetime.now().timestamp()) * 1000,
+                )
             )
-        ]
-        return HandlerResponseData(flushed=True, emittable_records=out_records)
+        self.buffer = []
+        return HandlerResponseData(flushed=True, metrics=metrics, emittable_records=out_records)
 
     def finalise_message_handling(self):
-        pass
+        handler_response = self.flush()
+        self.http_handler.close()
+        return handler_response
 
 
 class DestinationWebhook(ValmiDestination):
@@ -149,6 +181,8 @@ class DestinationWebhook(ValmiDestination):
                     kvpair = header.split(":")
                     if len(kvpair) < 2 or len(kvpair[0].strip()) == 0 or len(kvpair[1].strip()) == 0:
                         raise Exception("invalid header - should be of form <key>: <val>")
+            if int(config.get("batch_size", 1)) > 1 and config["method"] != "POST":
+                raise Exception("invalid batch_size - batching is only supported for POST")
 
             # TODO: What checks make sense for a webhook? Currently just checking for port open
             url = config["url"]
@@ -208,6 +208,10 @@ class SourcePostgres(Source):
         last_row_num = (chunk_id - 1) * chunk_size
         logger.info("state %s", state)
         logger.info("chunk_id %s last_row_num %s", chunk_id, last_row_num)
+        if config.get("read_mode", "paged") == "streaming":
+            yield from self.stream_transit_snapshot(faldbt, catalog, sync_id, chunk_id, chunk_size, last_row_num)
+            return
+
         while True:
             columns = catalog.streams[0].stream.json_schema["properties"].keys()
             adapter_resp, agate_table = self.dbt_adapter.execute_sql(
@@ -250,6 +254,59 @@ class SourcePostgres(Source):
                 )
                 chunk_id += 1
 
+    def stream_transit_snapshot(
+        self, faldbt, catalog: ConfiguredValmiCatalog, sync_id, chunk_id, chunk_size, last_row_num
+    ) -> Generator[AirbyteMessage, None, None]:
+        # reads the whole transit snapshot through one server side cursor,
+        # emitting the same STATE checkpoints as the paged read after every chunk_size records
+        columns = catalog.streams[0].stream.json_schema["properties"].keys()
+        records_in_chunk = 0
+        for column_names, rows in self.dbt_adapter.stream_sql(
+            faldbt,
+            "SELECT _valmi_row_num, _valmi_sync_op, {1} \
+                FROM {{{{ ref('transit_snapshot_{0}') }}}} \
+                WHERE _valmi_row_num > {2} \
+                ORDER BY _valmi_row_num ASC;".format(
+                sync_id, ",".join([f'"{col}"' for col in columns]), last_row_num
+            ),
+            fetch_size=chunk_size,
+        ):
+            for row in rows:
+                data: Dict[str, Any] = {}
+                for i in range(len(row)):
+                    if column_names[i].startswith("_valmi"):
+                        add_event_meta(data, column_names[i], row[i])
+                    else:
+                        data[column_names[i]] = row[i]
+
+                yield AirbyteMessage(
+                    type=Type.RECORD,
+                    record=ValmiFinalisedRecordMessage(
+                        stream=catalog.streams[0].stream.name,
+                        data=data,
+                        emitted_at=int(datetime.now().timestamp()) * 1000,
+                        metric_type="success",
+                        rejected=False
+                    ),
+                )
+
+                records_in_chunk += 1
+                if records_in_chunk >= chunk_size:
+                    yield AirbyteMessage(
+                        type=Type.STATE,
+                        state=AirbyteStateMessage(type=AirbyteStateType.STREAM, data={"chunk_id": chunk_id}),
+                        emitted_at=int(datetime.now().timestamp()) * 1000,
+                    )
+                    chunk_id += 1
+                    records_in_chunk = 0
+
+        if records_in_chunk > 0:
+            yield AirbyteMessage(
+                type=Type.STATE,
+                state=AirbyteStateMessage(type=AirbyteStateType.STREAM, data={"chunk_id": chunk_id}),
+                emitted_at=int(datetime.now().timestamp()) * 1000,
+            )
+
     def read_catalog(self, catalog_path: str) -> ConfiguredValmiCatalog:
         return ConfiguredValmiCatalog.parse_obj(self._read_json_file(catalog_path))
 
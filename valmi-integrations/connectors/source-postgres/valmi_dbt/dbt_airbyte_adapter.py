@@ -187,7 +187,7 @@ class DbtAirbyteAdpater:
         with open(self.get_abs_path("valmi_dbt_source_transform/models/staging/schema.yml"), "w") as f:
             f.write(output)
 
-    def execute_sql(self, faldbt, sql: str):
+    def compile_sql(self, faldbt, sql: str) -> str:
         compiled_result = lib.compile_sql(
             faldbt.project_dir,
             faldbt.profiles_dir,
@@ -197,14 +197,41 @@ class DbtAirbyteAdpater:
         )
         # NOTE: changed in version 1.3.0 to `compiled_code`
         if hasattr(compiled_result, "compiled_code"):
-            sql = compiled_result.compiled_code
+            return compiled_result.compiled_code
         else:
-            sql = compiled_result.compiled_sql
+            return compiled_result.compiled_sql
+
+    def execute_sql(self, faldbt, sql: str):
+        sql = self.compile_sql(faldbt, sql)
 
         adapter: SQLAdapter = adapters_factory.get_adapter(faldbt._config)  # type: ignore
         with adapter.connection_named("faldbt"):
             return adapter.execute(sql, fetch=True)
 
+    def stream_sql(self, faldbt, sql: str, fetch_size: int):
+        """
+        Compiles the sql once and yields (column_names, rows) batches of at most fetch_size rows,
+        read from a single server side cursor instead of materializing the result as an agate table.
+        """
+        sql = self.compile_sql(faldbt, sql)
+
+        adapter: SQLAdapter = adapters_factory.get_adapter(faldbt._config)  # type: ignore
+        with adapter.connection_named("faldbt-stream"):
+            handle = adapter.connections.get_thread_connection().handle
+            # a named psycopg2 cursor is a DECLARE CURSOR on the server, rows are fetched in batches
+            cursor = handle.cursor(name="valmi_stream_cursor")
+            try:
+                cursor.execute(sql)
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    # description of a named cursor is only available after the first fetch
+                    yield [column[0] for column in cursor.description], rows
+            finally:
+                cursor.close()
+                handle.rollback()
+
     def execute_dbt(self, logger: AirbyteLogger):
         logger.info("Initiating dbt run")
 
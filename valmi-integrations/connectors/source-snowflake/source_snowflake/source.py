@@ -47,6 +47,7 @@ from airbyte_cdk.models import (
 from airbyte_cdk.sources import Source
 from valmi_dbt.dbt_airbyte_adapter import DbtAirbyteAdpater
 from valmi_connector_lib.valmi_protocol import add_event_meta
+from valmi_connector_lib.common.arrow_chunks import ArrowChunkWriter, arrow_chunks_supported
 from valmi_connector_lib.valmi_protocol import ValmiFinalisedRecordMessage, ValmiCatalog, \
     ValmiStream, ConfiguredValmiCatalog, DestinationSyncMode
 from fal import FalDbt
@@ -204,6 +205,20 @@ class SourceSnowflake(Source):
         # set the below two values from the checkpoint state
         chunk_id = 0
         last_row_num = -1
+        read_mode = config.get("read_mode", "paged")
+        if read_mode == "arrow" and not arrow_chunks_supported(os.environ["VALMI_INTERMEDIATE_STORE"]):
+            # the destination may not be able to read arrow chunks, the rows go through the json path instead
+            logger.info("Arrow chunks are not enabled in the intermediate store, reading in streaming mode")
+            read_mode = "streaming"
+        if read_mode == "streaming":
+            yield from self.stream_transit_snapshot(faldbt, catalog, sync_id, chunk_id, chunk_size, last_row_num)
+            return
+        if read_mode == "arrow":
+            yield from self.stream_arrow_transit_snapshot(
+                faldbt, config, catalog, sync_id, chunk_id, chunk_size, last_row_num
+            )
+            return
+
         while True:
             columns = catalog.streams[0].stream.json_schema["properties"].keys()
             adapter_resp, agate_table = self.dbt_adapter.execute_sql(
@@ -246,6 +261,96 @@ class SourceSnowflake(Source):
                 )
                 chunk_id += 1
 
+    def stream_transit_snapshot(
+        self, faldbt, catalog: ConfiguredValmiCatalog, sync_id, chunk_id, chunk_size, last_row_num
+    ) -> Generator[AirbyteMessage, None, None]:
+        # reads the whole transit snapshot through one server side cursor,
+        # emitting the same STATE checkpoints as the paged read after every chunk_size records
+        columns = catalog.streams[0].stream.json_schema["properties"].keys()
+        records_in_chunk = 0
+        for column_names, rows in self.dbt_adapter.stream_sql(
+            faldbt,
+            "SELECT _valmi_row_num, _valmi_sync_op, {1} \
+                FROM  {{{{ ref('transit_snapshot_{0}') }}}} \
+                WHERE _valmi_row_num > {2} \
+                ORDER BY _valmi_row_num ASC;".format(
+                self.dbt_adapter.sanitise_uuid(sync_id), ",".join([f'"{col}"' for col in columns]), last_row_num
+            ),
+            fetch_size=chunk_size,
+        ):
+            for row in rows:
+                data: Dict[str, Any] = {}
+                for i in range(len(row)):
+                    if column_names[i].lower().startswith("_valmi"):
+                        add_event_meta(data, column_names[i].lower(), row[i])
+                    else:
+                        data[column_names[i]] = row[i]
+
+                yield AirbyteMessage(
+                    type=Type.RECORD,
+                    record=ValmiFinalisedRecordMessage(
+                        stream=catalog.streams[0].stream.name,
+                        data=data,
+                        emitted_at=int(datetime.now().timestamp()) * 1000,
+                        metric_type="success",
+                        rejected=False
+                    ),
+                )
+
+                records_in_chunk += 1
+                if records_in_chunk >= chunk_size:
+                    yield AirbyteMessage(
+                        type=Type.STATE,
+                        state=AirbyteStateMessage(type=AirbyteStateType.STREAM, data={"chunk_id": chunk_id}),
+                        emitted_at=int(datetime.now().timestamp()) * 1000,
+                    )
+                    chunk_id += 1
+                    records_in_chunk = 0
+
+        if records_in_chunk > 0:
+            yield AirbyteMessage(
+                type=Type.STATE,
+                state=AirbyteStateMessage(type=AirbyteStateType.STREAM, data={"chunk_id": chunk_id}),
+                emitted_at=int(datetime.now().timestamp()) * 1000,
+            )
+
+    def stream_arrow_transit_snapshot(
+        self, faldbt, config: json, catalog: ConfiguredValmiCatalog, sync_id, chunk_id, chunk_size, last_row_num
+    ) -> Generator[AirbyteMessage, None, None]:
+        # the record batches are written straight into the intermediate store as arrow chunks,
+        # only the STATE messages handing the chunks over to the source wrapper go through stdout
+        chunk_writer = ArrowChunkWriter(
+            os.environ["VALMI_INTERMEDIATE_STORE"], config["run_time_args"]["run_id"], catalog.streams[0].stream.name
+        )
+        columns = catalog.streams[0].stream.json_schema["properties"].keys()
+        pending = None
+        for table in self.dbt_adapter.stream_arrow_sql(
+            faldbt,
+            "SELECT _valmi_row_num, _valmi_sync_op, {1} \
+                FROM  {{{{ ref('transit_snapshot_{0}') }}}} \
+                WHERE _valmi_row_num > {2} \
+                ORDER BY _valmi_row_num ASC;".format(
+                self.dbt_adapter.sanitise_uuid(sync_id), ",".join([f'"{col}"' for col in columns]), last_row_num
+            ),
+        ):
+            pending = table if pending is None else chunk_writer.concat_tables([pending, table])
+            while pending.num_rows >= chunk_size:
+                yield self.arrow_chunk_state_message(chunk_writer, chunk_id, pending.slice(0, chunk_size))
+                pending = pending.slice(chunk_size)
+                chunk_id += 1
+
+        if pending is not None and pending.num_rows > 0:
+            yield self.arrow_chunk_state_message(chunk_writer, chunk_id, pending)
+
+    def arrow_chunk_state_message(self, chunk_writer: ArrowChunkWriter, chunk_id, table) -> AirbyteMessage:
+        return AirbyteMessage(
+            type=Type.STATE,
+            state=AirbyteStateMessage(
+                type=AirbyteStateType.STREAM, data=chunk_writer.write_chunk(chunk_id, table.to_batches())
+            ),
+            emitted_at=int(datetime.now().timestamp()) * 1000,
+        )
+
     def read_catalog(self, catalog_path: str) -> ConfiguredValmiCatalog:
         return ConfiguredValmiCatalog.parse_obj(self._read_json_file(catalog_path))
 
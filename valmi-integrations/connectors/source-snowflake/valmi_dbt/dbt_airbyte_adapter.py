@@ -207,7 +207,7 @@ class DbtAirbyteAdpater:
         with open(self.get_abs_path("valmi_dbt_source_transform/models/staging/schema.yml"), "w") as f:
             f.write(output)
 
-    def execute_sql(self, faldbt, sql: str):
+    def compile_sql(self, faldbt, sql: str) -> str:
         compiled_result = lib.compile_sql(
             faldbt.project_dir,
             faldbt.profiles_dir,
@@ -217,14 +217,58 @@ class DbtAirbyteAdpater:
         )
         # NOTE: changed in version 1.3.0 to `compiled_code`
         if hasattr(compiled_result, "compiled_code"):
-            sql = compiled_result.compiled_code
+            return compiled_result.compiled_code
         else:
-            sql = compiled_result.compiled_sql
+            return compiled_result.compiled_sql
+
+    def execute_sql(self, faldbt, sql: str):
+        sql = self.compile_sql(faldbt, sql)
 
         adapter: SQLAdapter = adapters_factory.get_adapter(faldbt._config)  # type: ignore
         with adapter.connection_named("faldbt"):
             return adapter.execute(sql, fetch=True)
 
+    def stream_sql(self, faldbt, sql: str, fetch_size: int):
+        """
+        Compiles the sql once and yields (column_names, rows) batches of at most fetch_size rows,
+        read from a single server side cursor instead of materializing the result as an agate table.
+        """
+        sql = self.compile_sql(faldbt, sql)
+
+        adapter: SQLAdapter = adapters_factory.get_adapter(faldbt._config)  # type: ignore
+        with adapter.connection_named("faldbt-stream"):
+            handle = adapter.connections.get_thread_connection().handle
+            # the snowflake connector downloads the result chunks lazily, so fetchmany streams the result
+            cursor = handle.cursor()
+            try:
+                cursor.execute(sql)
+                column_names = [column[0] for column in cursor.description]
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    yield column_names, rows
+            finally:
+                cursor.close()
+
+    def stream_arrow_sql(self, faldbt, sql: str):
+        """
+        Compiles the sql once and yields the result as arrow tables, one per result chunk of snowflake,
+        without converting the rows into python objects.
+        """
+        sql = self.compile_sql(faldbt, sql)
+
+        adapter: SQLAdapter = adapters_factory.get_adapter(faldbt._config)  # type: ignore
+        with adapter.connection_named("faldbt-stream"):
+            handle = adapter.connections.get_thread_connection().handle
+            cursor = handle.cursor()
+            try:
+                cursor.execute(sql)
+                for table in cursor.fetch_arrow_batches():
+                    yield table
+            finally:
+                cursor.close()
+
     def execute_sql_no_compile(self, faldbt, sql: str):
         adapter: SQLAdapter = adapters_factory.get_adapter(faldbt._config)  # type: ignore
         with adapter.connection_named("faldbt"):